@@ -0,0 +1,45 @@
+import argparse
+from pathlib import Path
+
+from app.core.body_store import DatabaseBodyStore, FileBodyStore
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logging import get_logger, setup_logging
+from app.crud.entries import move_bodies
+
+"""Move the entry bodies between the database and a filesystem body store.
+
+Migrations keep the bodies they write in the database. With
+LETTERFEED_BODY_STORE=filesystem, run this from the backend directory after
+upgrading to move them into LETTERFEED_BODY_STORE_DIR, and move them back to the
+database before downgrading:
+
+    python -m app.commands.move_bodies --to filesystem
+    python -m app.commands.move_bodies --to database
+"""
+
+
+def main():
+    """Move the bodies and log how many were moved."""
+    parser = argparse.ArgumentParser(
+        description="Move entry bodies between the database and the filesystem."
+    )
+    parser.add_argument(
+        "--to",
+        choices=["database", "filesystem"],
+        required=True,
+        help="the body store to move the bodies into",
+    )
+    args = parser.parse_args()
+    setup_logging()
+    logger = get_logger(__name__)
+    stores = [DatabaseBodyStore(), FileBodyStore(Path(settings.body_store_dir))]
+    if args.to == "database":
+        stores.reverse()
+    with SessionLocal() as db:
+        moved = move_bodies(db, *stores)
+    logger.info(f"Moved {moved} bodies to the {args.to} body store")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from app.core.database import SessionLocal
+from app.core.logging import get_logger, setup_logging
+from app.crud.newsletters import repair_entry_stats
+
+"""Recompute the entry counters of all newsletters from their entries.
+
+The counters are kept up to date by the application and backfilled by the
+migration that adds them. Run this from the backend directory if entries were
+written to the database by other means:
+
+    python -m app.commands.repair_entry_stats
+"""
+
+
+def main():
+    """Repair the entry counters and log which newsletters were out of date."""
+    setup_logging()
+    logger = get_logger(__name__)
+    with SessionLocal() as db:
+        repaired = repair_entry_stats(db)
+    if repaired:
+        logger.info(f"Repaired newsletters: {', '.join(repaired)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+
+from app.core.database import SessionLocal
+from app.core.logging import get_logger, setup_logging
+from app.services.body_compression import train_body_dictionaries
+
+"""Train the zstd dictionaries that entry bodies are compressed with.
+
+Dictionaries are trained after every email check for newsletters that have
+enough entries and no dictionary yet. Run this from the backend directory to
+train them right away, or with --retrain to replace the existing ones, e.g.
+after a newsletter changed its layout:
+
+    python -m app.commands.train_body_dictionaries --retrain
+"""
+
+
+def main():
+    """Train dictionaries and log which newsletters got one."""
+    parser = argparse.ArgumentParser(
+        description="Train the zstd dictionaries of entry bodies."
+    )
+    parser.add_argument(
+        "--retrain",
+        action="store_true",
+        help="replace the dictionaries of newsletters that have one",
+    )
+    args = parser.parse_args()
+    setup_logging()
+    logger = get_logger(__name__)
+    with SessionLocal() as db:
+        trained = train_body_dictionaries(db, retrain=args.retrain)
+    logger.info(f"Trained dictionaries for {len(trained)} newsletters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import hashlib
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+import zstandard
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.entry_bodies import BodyDictionary, EntryBody
+
+"""Content-addressed storage of entry bodies, outside the entries table.
+
+Entries only keep the SHA-256 of their body, so identical bodies are stored once
+and queries over entries do not carry the bodies through SQLite's page cache.
+Bodies are compressed with zstd. The codec is stored with every body, and bodies
+that were stored uncompressed by earlier versions stay readable.
+
+Newsletters repeat most of their markup from one issue to the next, so bodies
+compress much better with a zstd dictionary trained on earlier issues of the same
+newsletter. Every store keeps the dictionaries of its bodies, and zstd frames
+carry the id of the dictionary they need, so any body can be read without knowing
+the newsletter it was compressed for.
+"""
+
+logger = get_logger(__name__)
+
+ZSTD_LEVEL = 9
+# Dictionary ids below 32768 are reserved for registered dictionaries.
+DICTIONARY_ID_MIN = 32768
+DICTIONARY_ID_MAX = 2**31 - 1
+# Stay well below SQLite's limit on the number of bound parameters.
+QUERY_CHUNK_SIZE = 500
+# Body files found by a put this recently are kept by discard, since the entries
+# that refer to them may not be committed yet.
+RECENT_FILE_SECONDS = 60 * 60
+
+# Dictionaries by id, shared by all threads. They never change once stored.
+_dictionaries: dict[int, "zstandard.ZstdCompressionDict"] = {}
+# Decompressors by dictionary id, which can be reused but not shared by threads.
+_local = threading.local()
+# Orders finding existing body files in put against deleting them in discard.
+_files_lock = threading.Lock()
+
+
+def body_hash(body: str) -> str:
+    """Return the key of a body in the body store."""
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def train_dictionary(samples: list[str], size: int):
+    """Train a zstd dictionary of up to size bytes on sample bodies.
+
+    The dictionary gets a random id from the range that is free for private use.
+    Raises zstandard.ZstdError if the samples are too few or too small.
+    """
+    return zstandard.train_dictionary(
+        size,
+        [sample.encode("utf-8") for sample in samples],
+        dict_id=DICTIONARY_ID_MIN
+        + secrets.randbelow(DICTIONARY_ID_MAX - DICTIONARY_ID_MIN),
+        level=ZSTD_LEVEL,
+    )
+
+
+def encode_body(body: str, dictionary=None) -> tuple[str, bytes]:
+    """Compress a body, with a zstd dictionary if given.
+
+    Returns the codec and the stored bytes.
+    """
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+    return "zstd", compressor.compress(body.encode("utf-8"))
+
+
+def _decompressor(dictionary_id: int, load_dictionary: Callable | None):
+    """Return this thread's decompressor for a dictionary id, 0 for none."""
+    decompressors = _local.__dict__.setdefault("decompressors", {})
+    if dictionary_id not in decompressors:
+        dictionary = _dictionaries.get(dictionary_id) if dictionary_id else None
+        if dictionary_id and dictionary is None:
+            if load_dictionary is None:
+                raise LookupError(f"Dictionary {dictionary_id} is not loaded")
+            dictionary = load_dictionary(dictionary_id)
+        decompressors[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return decompressors[dictionary_id]
+
+
+def decode_body(
+    codec: str, data: bytes, load_dictionary: Callable | None = None
+) -> str:
+    """Decompress a body stored with a codec.
+
+    load_dictionary is called with the id of the dictionary a body was compressed
+    with, if the dictionary is not loaded yet.
+    """
+    if codec == "zstd":
+        dictionary_id = zstandard.get_frame_parameters(data).dict_id
+        decompressor = _decompressor(dictionary_id, load_dictionary)
+        return decompressor.decompress(data).decode("utf-8")
+    if codec == "identity":
+        return data.decode("utf-8")
+    raise ValueError(f"Unsupported body codec: {codec}")
+
+
+def decode_bodies(stored: dict[str, tuple[str, bytes]]) -> dict[str, str]:
+    """Decompress bodies fetched from a store by hash.
+
+    Needs no database session, so bodies can be fetched in one thread and
+    decompressed in another. The fetch loads the dictionaries of the bodies.
+    """
+    return {key: decode_body(codec, data) for key, (codec, data) in stored.items()}
+
+
+def frame_dictionary_ids(stored: dict[str, tuple[str, bytes]]) -> set[int]:
+    """Return the ids of the dictionaries that fetched bodies were compressed with."""
+    dictionary_ids = {
+        zstandard.get_frame_parameters(data).dict_id
+        for codec, data in stored.values()
+        if codec == "zstd"
+    }
+    return dictionary_ids - {0}
+
+
+def _encode_all(bodies: dict[str, str], dictionary) -> Iterator[tuple[str, str, bytes]]:
+    for key, body in bodies.items():
+        codec, data = encode_body(body, dictionary)
+        yield key, codec, data
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    """Write a file so that readers never see it partly written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _chunks(hashes: Iterable[str]) -> Iterator[list[str]]:
+    hashes = list(hashes)
+    for start in range(0, len(hashes), QUERY_CHUNK_SIZE):
+        yield hashes[start : start + QUERY_CHUNK_SIZE]
+
+
+def _cached_dictionary(dictionary_id: int, read: Callable[[int], bytes | None]):
+    """Return a dictionary by id, reading it with read on first use."""
+    if dictionary_id not in _dictionaries:
+        data = read(dictionary_id)
+        if data is None:
+            raise LookupError(f"Dictionary {dictionary_id} is missing from the store")
+        _dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(data)
+    return _dictionaries[dictionary_id]
+
+
+class DatabaseBodyStore:
+    """Bodies in the entry_bodies table, written in the transaction of their entries.
+
+    Dictionaries are kept in the body_dictionaries table.
+    """
+
+    def put(
+        self,
+        db: Session,
+        bodies: dict[str, str],
+        dictionary_id: int | None = None,
+        replace: bool = False,
+    ) -> None:
+        """Add bodies by hash, compressed with a dictionary if given, without committing.
+
+        Bodies that are stored already are left as they are, or compressed again if
+        replace is set. They are found with a no-op update, which holds them until
+        the transaction ends, so that discard cannot delete a body that an entry
+        of this transaction is about to refer to.
+        """
+        dictionary = self.load_dictionary(db, dictionary_id) if dictionary_id else None
+        existing = set()
+        for chunk in _chunks(bodies):
+            existing.update(
+                db.scalars(
+                    update(EntryBody)
+                    .where(EntryBody.hash.in_(chunk))
+                    .values(hash=EntryBody.hash)
+                    .returning(EntryBody.hash)
+                    .execution_options(synchronize_session=False)
+                )
+            )
+        if not replace:
+            bodies = {key: body for key, body in bodies.items() if key not in existing}
+        rows = [
+            {"hash": key, "codec": codec, "data": data}
+            for key, codec, data in _encode_all(bodies, dictionary)
+        ]
+        logger.debug(f"Storing {len(rows)} bodies")
+        db.add_all(EntryBody(**row) for row in rows if row["hash"] not in existing)
+        changed = [row for row in rows if row["hash"] in existing]
+        if changed:
+            db.execute(update(EntryBody), changed)
+        # Sessions do not autoflush, and a later put must see these bodies.
+        db.flush()
+
+    def fetch(self, db: Session, hashes: Iterable[str]) -> dict[str, tuple[str, bytes]]:
+        """Return the codecs and stored bytes of the given hashes by hash.
+
+        The dictionaries the bodies need are loaded, for decode_bodies.
+        """
+        stored = {}
+        for chunk in _chunks(hashes):
+            rows = db.execute(
+                select(EntryBody.hash, EntryBody.codec, EntryBody.data).where(
+                    EntryBody.hash.in_(chunk)
+                )
+            )
+            stored.update((key, (codec, data)) for key, codec, data in rows)
+        for dictionary_id in frame_dictionary_ids(stored):
+            self.load_dictionary(db, dictionary_id)
+        return stored
+
+    def get(self, db: Session, hashes: Iterable[str]) -> dict[str, str]:
+        """Return the stored bodies of the given hashes by hash."""
+        return decode_bodies(self.fetch(db, hashes))
+
+    def put_stored(self, db: Session, stored: dict[str, tuple[str, bytes]]) -> None:
+        """Add bodies by hash as fetched from another store, without committing."""
+        existing = set()
+        for chunk in _chunks(stored):
+            existing.update(
+                db.scalars(select(EntryBody.hash).where(EntryBody.hash.in_(chunk)))
+            )
+        db.add_all(
+            EntryBody(hash=key, codec=codec, data=data)
+            for key, (codec, data) in stored.items()
+            if key not in existing
+        )
+        db.flush()
+
+    def delete(self, db: Session, hashes: Iterable[str]) -> None:
+        """Delete bodies by hash and commit."""
+        for chunk in _chunks(hashes):
+            db.execute(delete(EntryBody).where(EntryBody.hash.in_(chunk)))
+        db.commit()
+
+    def discard(self, db: Session, hashes: Iterable[str], referenced_by) -> None:
+        """Delete the bodies by hash that no row refers to in column referenced_by.
+
+        The references are checked by the delete statement itself, so a body that
+        a concurrent put has found is either kept or stored again, see put.
+        """
+        unreferenced = ~exists().where(referenced_by == EntryBody.hash)
+        for chunk in _chunks(hashes):
+            db.execute(delete(EntryBody).where(EntryBody.hash.in_(chunk), unreferenced))
+        db.commit()
+
+    def add_dictionary(self, db: Session, dictionary) -> None:
+        """Store a trained dictionary under its id, without committing."""
+        if db.get(BodyDictionary, dictionary.dict_id()) is None:
+            db.add(BodyDictionary(id=dictionary.dict_id(), data=dictionary.as_bytes()))
+            db.flush()
+
+    def load_dictionary(self, db: Session, dictionary_id: int):
+        """Return a stored dictionary by id."""
+
+        def read(dictionary_id: int) -> bytes | None:
+            return db.scalar(
+                select(BodyDictionary.data).where(BodyDictionary.id == dictionary_id)
+            )
+
+        return _cached_dictionary(dictionary_id, read)
+
+
+class FileBodyStore:
+    """Bodies in files below a directory, named after their hash and codec.
+
+    Files are written before the entries that refer to them are committed, so an
+    aborted write can leave unreferenced files behind, but never an entry without
+    its body. Dictionaries are kept in the dictionaries directory.
+    """
+
+    SUFFIXES = {"zstd": ".zst", "identity": ".html"}
+
+    def __init__(self, root: Path):
+        """Initialize the store with its root directory."""
+        self.root = root
+
+    def _paths(self, key: str) -> Iterator[tuple[str, Path]]:
+        """Yield the codecs and paths a body can be stored under."""
+        directory = self.root / key[:2]
+        for codec, suffix in self.SUFFIXES.items():
+            yield codec, directory / f"{key}{suffix}"
+
+    def _dictionary_path(self, dictionary_id: int) -> Path:
+        return self.root / "dictionaries" / f"{dictionary_id}.dict"
+
+    def put(
+        self,
+        db: Session | None,
+        bodies: dict[str, str],
+        dictionary_id: int | None = None,
+        replace: bool = False,
+    ) -> None:
+        """Write the files of bodies by hash, compressed with a dictionary if given.
+
+        Bodies that are stored already are left as they are, or compressed again if
+        replace is set.
+        """
+        dictionary = self.load_dictionary(db, dictionary_id) if dictionary_id else None
+        if not replace:
+            with _files_lock:
+                bodies = {
+                    key: body for key, body in bodies.items() if not self._touch(key)
+                }
+        for key, codec, data in _encode_all(bodies, dictionary):
+            _write_atomically(
+                self.root / key[:2] / f"{key}{self.SUFFIXES[codec]}", data
+            )
+            for other_codec, path in self._paths(key):
+                if other_codec != codec:
+                    path.unlink(missing_ok=True)
+
+    def fetch(
+        self, db: Session | None, hashes: Iterable[str]
+    ) -> dict[str, tuple[str, bytes]]:
+        """Return the codecs and stored bytes of the given hashes by hash.
+
+        The dictionaries the bodies need are loaded, for decode_bodies.
+        """
+        stored = {}
+        for key in hashes:
+            for codec, path in self._paths(key):
+                try:
+                    stored[key] = codec, path.read_bytes()
+                except FileNotFoundError:
+                    continue
+                break
+        for dictionary_id in frame_dictionary_ids(stored):
+            self.load_dictionary(db, dictionary_id)
+        return stored
+
+    def get(self, db: Session | None, hashes: Iterable[str]) -> dict[str, str]:
+        """Return the stored bodies of the given hashes by hash."""
+        return decode_bodies(self.fetch(db, hashes))
+
+    def put_stored(
+        self, db: Session | None, stored: dict[str, tuple[str, bytes]]
+    ) -> None:
+        """Write the files of bodies by hash as fetched from another store."""
+        for key, (codec, data) in stored.items():
+            _write_atomically(
+                self.root / key[:2] / f"{key}{self.SUFFIXES[codec]}", data
+            )
+
+    def _touch(self, key: str) -> bool:
+        """Mark the file of a body as recently used, if it exists."""
+        for _, path in self._paths(key):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            return True
+        return False
+
+    def delete(self, db: Session | None, hashes: Iterable[str]) -> None:
+        """Delete the files of bodies by hash."""
+        for key in hashes:
+            for _, path in self._paths(key):
+                path.unlink(missing_ok=True)
+
+    def discard(self, db: Session, hashes: Iterable[str], referenced_by) -> None:
+        """Delete the files of bodies by hash that no row refers to in referenced_by.
+
+        Entries are committed after their body files are found or written by put,
+        so files that a put found recently are kept, even if nothing refers to them
+        yet. This may leave an unreferenced file behind, but never an entry without
+        its body.
+        """
+        unreferenced = set(hashes)
+        for chunk in _chunks(unreferenced):
+            unreferenced.difference_update(
+                db.scalars(select(referenced_by).where(referenced_by.in_(chunk)))
+            )
+        recent = time.time() - RECENT_FILE_SECONDS
+        with _files_lock:
+            for key in unreferenced:
+                for _, path in self._paths(key):
+                    try:
+                        if path.stat().st_mtime < recent:
+                            path.unlink()
+                    except FileNotFoundError:
+                        continue
+
+    def add_dictionary(self, db: Session | None, dictionary) -> None:
+        """Store a trained dictionary under its id."""
+        _write_atomically(
+            self._dictionary_path(dictionary.dict_id()), dictionary.as_bytes()
+        )
+
+    def load_dictionary(self, db: Session | None, dictionary_id: int):
+        """Return a stored dictionary by id."""
+
+        def read(dictionary_id: int) -> bytes | None:
+            try:
+                return self._dictionary_path(dictionary_id).read_bytes()
+            except FileNotFoundError:
+                return None
+
+        return _cached_dictionary(dictionary_id, read)
+
+
+def get_body_store() -> DatabaseBodyStore | FileBodyStore:
+    """Return the body store selected in the settings."""
+    if settings.body_store == "filesystem":
+        return FileBodyStore(Path(settings.body_store_dir))
+    return DatabaseBodyStore()
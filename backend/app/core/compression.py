@@ -0,0 +1,71 @@
+import gzip
+import zlib
+from collections.abc import Callable
+
+import brotli
+
+"""Content-Encoding negotiation and compression of cached responses."""
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Supported content codings, in the order they are preferred on equal q-values.
+SUPPORTED_ENCODINGS = ("br", "gzip")
+
+# File name suffixes of precompressed files, as used by static file servers.
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    """Compress content with a supported content coding."""
+    if encoding == "gzip":
+        # A fixed mtime keeps the output identical for identical content.
+        return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+def compressor(
+    encoding: str,
+) -> tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Return compress and finish functions to compress a stream incrementally."""
+    if encoding == "gzip":
+        # wbits=31 writes a gzip header, with mtime 0 as in compress().
+        stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return stream.compress, stream.flush
+    if encoding == "br":
+        stream = brotli.Compressor(quality=BROTLI_QUALITY)
+        return stream.process, stream.finish
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    """Pick the preferred supported coding from an Accept-Encoding header.
+
+    Returns None if the client should get the identity coding.
+    """
+    if not accept_encoding:
+        return None
+    qvalues: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        q = qvalues.get(coding, qvalues.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
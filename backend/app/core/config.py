@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -20,6 +22,13 @@ class Settings(BaseSettings):
         "sqlite:////data/letterfeed.db",
         validation_alias=AliasChoices("DATABASE_URL", "LETTERFEED_DATABASE_URL"),
     )
+    # Applied to every SQLite connection, see https://sqlite.org/pragma.html
+    sqlite_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST"] = "WAL"
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_busy_timeout: int = 5000  # Milliseconds
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # Bytes
+    sqlite_cache_size: int = -64 * 1024  # Pages, or KiB if negative
+    sqlite_temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
     app_base_url: str = Field(
         "http://backend:8000",
         validation_alias=AliasChoices("APP_BASE_URL", "LETTERFEED_APP_BASE_URL"),
@@ -32,6 +41,29 @@ class Settings(BaseSettings):
     mark_as_read: bool = False
     email_check_interval: int = 15
     auto_add_new_senders: bool = False
+    imap_fetch_batch_size: int = 200
+    imap_pool_size: int = 4
+    imap_max_workers: int = 4
+    imap_folder_timeout: int = 300
+    extraction_workers: int = 2
+    extraction_cache_size: int = 1000
+    imap_idle: bool = False
+    imap_idle_timeout: int = 25 * 60  # Seconds, must stay below the 29 minute limit
+    body_store: Literal["database", "filesystem"] = "database"
+    body_store_dir: str = "/data/bodies"
+    body_dictionary_min_entries: int = 50  # 0 to never train dictionaries
+    body_dictionary_samples: int = 500
+    body_dictionary_size: int = 64 * 1024  # Bytes
+    feed_max_entries: int = 50
+    feed_export_dir: str | None = None
+    feed_render_workers: int = 4
+    feed_cache_size: int = 64 * 1024 * 1024  # Bytes
+    websub_hub_url: str | None = None
+    websub_hub: bool = False
+    websub_allow_private_callbacks: bool = False
+    websub_workers: int = 4
+    websub_timeout: int = 10
+    websub_lease_seconds: int = 10 * 24 * 60 * 60
     auth_username: str | None = None
     auth_password: str | None = None
     secret_key: str | None = Field(
@@ -1,16 +1,72 @@
-from sqlalchemy import create_engine
+from sqlalchemy import URL, Engine, create_engine, event, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
-from app.core.config import settings
+from app.core.config import Settings, settings
 from app.core.logging import get_logger
 
-"""Database connection and session management."""
+"""Database connection and session management.
+
+The feed endpoints read through an asyncio engine on the same database, so that
+polling feed readers do not hold the threads that the other endpoints run in.
+
+SQLite connections of both engines are tuned with PRAGMAs when they are opened.
+WAL mode lets feeds be read while the scheduler writes new entries, and the busy
+timeout makes writers wait for each other instead of failing.
+"""
 
 logger = get_logger(__name__)
 
+
+def sqlite_pragmas(config: Settings = settings) -> dict[str, str | int]:
+    """Return the PRAGMAs that every SQLite connection is opened with."""
+    return {
+        "journal_mode": config.sqlite_journal_mode,
+        "synchronous": config.sqlite_synchronous,
+        "busy_timeout": config.sqlite_busy_timeout,
+        "mmap_size": config.sqlite_mmap_size,
+        "cache_size": config.sqlite_cache_size,
+        "temp_store": config.sqlite_temp_store,
+    }
+
+
+def configure_sqlite(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    """Apply the PRAGMAs to every new connection of an SQLite engine.
+
+    For an async engine, pass its sync_engine. Other databases are left alone.
+    """
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
 engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+configure_sqlite(engine, sqlite_pragmas())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def async_database_url(database_url: str) -> URL:
+    """Return the database URL with the asyncio driver, aiosqlite for SQLite."""
+    url = make_url(database_url)
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+async_engine = create_async_engine(async_database_url(settings.database_url))
+configure_sqlite(async_engine.sync_engine, sqlite_pragmas())
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -0,0 +1,209 @@
+import datetime
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from app.core.compression import compress
+from app.core.config import settings
+from app.core.logging import get_logger
+
+"""In-memory cache of rendered feeds, invalidated whenever their content changes."""
+
+logger = get_logger(__name__)
+
+MASTER_FEED_KEY = "all"
+
+
+@dataclass
+class FeedValidators:
+    """HTTP validators of a feed, used for conditional GET."""
+
+    etag: str
+    last_modified: datetime.datetime | None
+
+
+@dataclass
+class CachedFeed:
+    """A rendered feed and the newsletter it belongs to, None for the master feed."""
+
+    newsletter_id: str | None
+    validators: FeedValidators
+    content: bytes
+    # Set on archive pages, which only hold entries received before this time.
+    archive_before: datetime.datetime | None = None
+    # Compressed variants of content by content coding, created on first use.
+    encoded: dict[str, bytes] = field(default_factory=dict, repr=False)
+    # Called with the feed and the size of every new variant, by the cache it is in.
+    on_encode: Callable[["CachedFeed", int], None] | None = field(
+        default=None, repr=False
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def size(self) -> int:
+        """Return the bytes held by the content and its compressed variants."""
+        return len(self.content) + sum(map(len, list(self.encoded.values())))
+
+    def encode(self, encoding: str | None) -> bytes:
+        """Return the content in a content coding, or as it is for None.
+
+        Cached feeds are never modified, only replaced, so each variant is
+        compressed once per version of the feed.
+        """
+        if encoding is None:
+            return self.content
+        with self._lock:
+            variant = self.encoded.get(encoding)
+            if variant is None:
+                variant = self.encoded[encoding] = compress(self.content, encoding)
+                logger.debug(
+                    f"Compressed feed with {encoding} from {len(self.content)} "
+                    f"to {len(variant)} bytes"
+                )
+                if self.on_encode is not None:
+                    self.on_encode(self, len(variant))
+        return variant
+
+
+class FeedCache:
+    """Rendered feed bytes per feed identifier.
+
+    Newsletter feeds are cached by newsletter ID. They can also be requested by
+    slug, which the cache maps to the ID once a feed was rendered for it, so every
+    feed is stored once. Each cached feed remembers its newsletter for
+    invalidation. Every invalidation bumps a generation counter,
+    and a feed rendered before an invalidation is not stored, so a render that raced
+    with a write can never put stale content into the cache.
+
+    The feeds and their compressed variants are kept within max_bytes, by dropping
+    the least recently used feeds.
+    """
+
+    def __init__(self, max_bytes: int):
+        """Create an empty cache."""
+        self._feeds: OrderedDict[str, CachedFeed] = OrderedDict()
+        self._keys: dict[int, str] = {}  # Keys of the cached feeds by id()
+        self._aliases: dict[str, str] = {}  # Newsletter IDs by slug
+        self._bytes = 0
+        self._max_bytes = max_bytes
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Return the current generation, to be passed to put() after rendering."""
+        return self._generation
+
+    @property
+    def size(self) -> int:
+        """Return the bytes held by the cached feeds."""
+        return self._bytes
+
+    def resolve(self, identifier: str) -> str:
+        """Return the newsletter ID of a slug, if known, or the identifier itself."""
+        return self._aliases.get(identifier, identifier)
+
+    def get(self, key: str) -> CachedFeed | None:
+        """Return the cached feed for a feed identifier, if any."""
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is not None:
+                self._feeds.move_to_end(key)
+            return feed
+
+    def put(
+        self,
+        key: str,
+        newsletter_id: str | None,
+        validators: FeedValidators,
+        content: bytes,
+        generation: int,
+        archive_before: datetime.datetime | None = None,
+        alias: str | None = None,
+    ) -> None:
+        """Cache a feed unless the cache was invalidated since generation.
+
+        alias is the slug that the feed was requested by, if any.
+        """
+        if len(content) > self._max_bytes:
+            return
+        feed = CachedFeed(
+            newsletter_id, validators, content, archive_before, on_encode=self._grow
+        )
+        with self._lock:
+            if generation != self._generation:
+                return
+            if alias is not None and newsletter_id is not None:
+                self._aliases[alias] = newsletter_id
+            self._remove(key)
+            self._feeds[key] = feed
+            self._keys[id(feed)] = key
+            self._bytes += feed.size
+            self._evict()
+
+    def _grow(self, feed: CachedFeed, size: int) -> None:
+        """Account for a new compressed variant of a feed."""
+        with self._lock:
+            key = self._keys.get(id(feed))
+            if key is not None and self._feeds[key] is feed:
+                self._bytes += size
+                self._evict()
+
+    def _remove(self, key: str) -> None:
+        feed = self._feeds.pop(key, None)
+        if feed is not None:
+            del self._keys[id(feed)]
+            self._bytes -= feed.size
+
+    def _evict(self) -> None:
+        while self._bytes > self._max_bytes:
+            key = next(iter(self._feeds))
+            logger.debug(f"Evicting cached feed {key}")
+            self._remove(key)
+
+    def invalidate_newsletter(
+        self, newsletter_id: str, received_at: datetime.datetime | None = None
+    ) -> None:
+        """Drop the feeds of a newsletter and the master feed.
+
+        received_at is the oldest timestamp of newly added entries. Archive pages
+        that only hold entries from before it are unaffected and stay cached.
+        """
+        logger.debug(f"Invalidating cached feeds of newsletter_id={newsletter_id}")
+        if received_at is not None:
+            received_at = received_at.replace(tzinfo=None)
+
+        def is_affected(feed: CachedFeed) -> bool:
+            if feed.newsletter_id not in (None, newsletter_id):
+                return False
+            return (
+                received_at is None
+                or feed.archive_before is None
+                or received_at < feed.archive_before
+            )
+
+        with self._lock:
+            self._generation += 1
+            # The slug may have changed, unless entries were added.
+            if received_at is None:
+                self._aliases = {
+                    alias: target
+                    for alias, target in self._aliases.items()
+                    if target != newsletter_id
+                }
+            for key, feed in list(self._feeds.items()):
+                if is_affected(feed):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        """Drop all cached feeds."""
+        with self._lock:
+            self._generation += 1
+            self._feeds.clear()
+            self._keys.clear()
+            self._aliases.clear()
+            self._bytes = 0
+
+
+feed_cache = FeedCache(settings.feed_cache_size)
@@ -0,0 +1,132 @@
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings as env_settings
+from app.core.database import SessionLocal
+from app.core.imap import has_capability, idle_wait, open_imap_connection
+from app.core.logging import get_logger
+from app.crud.settings import get_settings
+from app.services.email_processor import get_search_folders, process_folder_emails
+
+"""IMAP IDLE listeners that process new emails as soon as they arrive."""
+
+logger = get_logger(__name__)
+
+MIN_RECONNECT_DELAY = 5
+MAX_RECONNECT_DELAY = 300
+
+
+class ImapIdleListener:
+    """Keep an IDLE connection open on one folder and process new emails on EXISTS."""
+
+    def __init__(self, folder: str):
+        """Create a listener for the given folder; call start() to run it."""
+        self.folder = folder
+        self.idle_supported = True
+        self._stop_event = threading.Event()
+        self._mail = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"imap-idle-{folder}", daemon=True
+        )
+
+    def start(self):
+        """Start listening in a background thread."""
+        logger.info(f"Starting IMAP IDLE listener for folder '{self.folder}'")
+        self._thread.start()
+
+    def stop(self):
+        """Stop listening and close the IDLE connection."""
+        logger.info(f"Stopping IMAP IDLE listener for folder '{self.folder}'")
+        self._stop_event.set()
+        self._close()
+
+    def is_alive(self) -> bool:
+        """Check whether the listener thread is still running."""
+        return self._thread.is_alive()
+
+    def _close(self):
+        mail, self._mail = self._mail, None
+        if mail is not None:
+            try:
+                # shutdown() also interrupts a blocking read in the listener thread.
+                mail.shutdown()
+            except Exception:
+                pass
+
+    def _process_new_emails(self):
+        try:
+            with SessionLocal() as db:
+                process_folder_emails(db, self.folder)
+        except Exception as e:
+            logger.error(
+                f"Error processing emails in folder '{self.folder}' after IDLE: {e}",
+                exc_info=True,
+            )
+
+    def _run(self):
+        delay = MIN_RECONNECT_DELAY
+        while not self._stop_event.is_set():
+            try:
+                with SessionLocal() as db:
+                    settings = get_settings(db, with_password=True)
+                # IDLE blocks its connection, so listeners do not use the shared pool.
+                self._mail = open_imap_connection(
+                    settings.imap_server, settings.imap_username, settings.imap_password
+                )
+                status, _ = self._mail.select(self.folder)
+                if status != "OK":
+                    raise ConnectionError(f"could not select folder '{self.folder}'")
+                if not has_capability(self._mail, "IDLE"):
+                    self.idle_supported = False
+                    logger.warning(
+                        "IMAP server does not support IDLE, relying on interval polling."
+                    )
+                    return
+                delay = MIN_RECONNECT_DELAY
+
+                # Catch up on anything that arrived while we were not listening.
+                self._process_new_emails()
+                while not self._stop_event.is_set():
+                    if idle_wait(self._mail, env_settings.imap_idle_timeout):
+                        logger.info(f"New email in folder '{self.folder}'")
+                        self._process_new_emails()
+            except Exception as e:
+                if self._stop_event.is_set():
+                    break
+                logger.warning(
+                    f"IDLE connection for folder '{self.folder}' failed: {e}, "
+                    f"reconnecting in {delay} seconds."
+                )
+            finally:
+                self._close()
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+_listeners: dict[str, ImapIdleListener] = {}
+_listeners_lock = threading.Lock()
+
+
+def sync_idle_listeners(db: Session):
+    """Run an IDLE listener for every watched folder and stop obsolete ones."""
+    if not env_settings.imap_idle:
+        return
+    folders = set(get_search_folders(db))
+    with _listeners_lock:
+        for folder in list(_listeners):
+            listener = _listeners[folder]
+            crashed = not listener.is_alive() and listener.idle_supported
+            if folder not in folders or crashed:
+                _listeners.pop(folder).stop()
+        for folder in folders - set(_listeners):
+            _listeners[folder] = ImapIdleListener(folder)
+            _listeners[folder].start()
+
+
+def stop_idle_listeners():
+    """Stop all IDLE listeners."""
+    with _listeners_lock:
+        for listener in _listeners.values():
+            listener.stop()
+        _listeners.clear()
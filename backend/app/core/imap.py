@@ -1,19 +1,163 @@
 import imaplib
+import re
+import select
+import ssl
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 
+from app.core.config import settings as env_settings
 from app.core.logging import get_logger
 
 """IMAP utility functions for connecting to mail servers and fetching folders."""
 
 logger = get_logger(__name__)
 
+_FETCH_UID_RE = re.compile(rb"\bUID (\d+)")
+_EXISTS_RE = re.compile(rb"^\* \d+ EXISTS\r?\n?$")
+
+
+def open_imap_connection(
+    server: str, username: str, password: str
+) -> imaplib.IMAP4_SSL:
+    """Open a new TLS connection to the IMAP server and log in."""
+    logger.info(f"Connecting to IMAP server: {server}")
+    # Bounds every socket read, so a silent server cannot hang a folder forever.
+    mail = imaplib.IMAP4_SSL(server, timeout=env_settings.imap_folder_timeout)
+    try:
+        mail.login(username, password)
+    except Exception:
+        mail.shutdown()
+        raise
+    refresh_capabilities(mail)
+    return mail
+
+
+class ImapConnectionPool:
+    """Authenticated IMAP sessions that are reused across folders and requests.
+
+    A session is checked out exclusively and callers SELECT the folder they need.
+    Idle sessions are kept alive with NOOP by keepalive() and evicted once they
+    fail or have been idle for longer than the server would keep them open.
+    """
+
+    def __init__(
+        self,
+        max_idle_per_account: int,
+        validate_after: float = 60,
+        max_idle_time: float = 20 * 60,
+    ):
+        """Create an empty pool."""
+        self.max_idle_per_account = max_idle_per_account
+        self.validate_after = validate_after
+        self.max_idle_time = max_idle_time
+        self._idle: dict[tuple[str, str, str], list[tuple[imaplib.IMAP4, float]]] = {}
+        self._checked_out: dict[int, tuple[tuple[str, str, str], imaplib.IMAP4]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(
+        self, server: str, username: str, password: str, validate: bool = False
+    ) -> imaplib.IMAP4_SSL:
+        """Check out a session, reusing an idle one if possible.
+
+        Sessions that were idle for more than validate_after seconds, or all of them
+        if validate is set, are checked with NOOP before being handed out.
+        """
+        key = (server, username, password)
+        mail = None
+        while mail is None:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                mail, last_used = idle.pop()
+            stale = validate or time.monotonic() - last_used > self.validate_after
+            if stale and not self._is_alive(mail):
+                logger.info(f"Evicting broken IMAP connection to {server}")
+                self._close(mail)
+                mail = None
+        if mail is None:
+            mail = open_imap_connection(server, username, password)
+        with self._lock:
+            self._checked_out[id(mail)] = (key, mail)
+        return mail
+
+    def release(self, mail: imaplib.IMAP4, discard: bool = False):
+        """Return a checked out session to the pool, or close it if discard is set."""
+        with self._lock:
+            key, _ = self._checked_out.pop(id(mail), (None, None))
+            if key is not None and not discard:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle_per_account:
+                    idle.append((mail, time.monotonic()))
+                    return
+        self._close(mail)
+
+    @contextmanager
+    def connection(
+        self, server: str, username: str, password: str, validate: bool = False
+    ) -> Iterator[imaplib.IMAP4_SSL]:
+        """Check out a session for the duration of a with block.
+
+        The session is evicted if the block fails with a connection error.
+        """
+        mail = self.acquire(server, username, password, validate=validate)
+        discard = False
+        try:
+            yield mail
+        except (imaplib.IMAP4.abort, OSError):
+            discard = True
+            raise
+        finally:
+            self.release(mail, discard=discard)
+
+    def keepalive(self):
+        """Send NOOP on idle sessions and evict those that are broken or too old."""
+        with self._lock:
+            idle_sessions, self._idle = self._idle, {}
+        now = time.monotonic()
+        for key, sessions in idle_sessions.items():
+            for mail, last_used in sessions:
+                if now - last_used > self.max_idle_time or not self._is_alive(mail):
+                    logger.info(f"Evicting idle IMAP connection to {key[0]}")
+                    self._close(mail)
+                    continue
+                with self._lock:
+                    self._idle.setdefault(key, []).append((mail, last_used))
+
+    def close_all(self):
+        """Log out all idle sessions."""
+        with self._lock:
+            idle_sessions, self._idle = self._idle, {}
+        for sessions in idle_sessions.values():
+            for mail, _ in sessions:
+                self._close(mail)
+
+    @staticmethod
+    def _is_alive(mail: imaplib.IMAP4) -> bool:
+        try:
+            return mail.noop()[0] == "OK"
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(mail: imaplib.IMAP4):
+        try:
+            mail.logout()
+        except Exception:
+            pass
+
+
+imap_pool = ImapConnectionPool(max_idle_per_account=env_settings.imap_pool_size)
+
 
 def _test_imap_connection(server, username, password):
     """Test the IMAP connection with the given credentials."""
     logger.info(f"Testing IMAP connection to {server} for user {username}")
     try:
-        mail = imaplib.IMAP4_SSL(server)
-        mail.login(username, password)
-        mail.logout()
+        with imap_pool.connection(server, username, password, validate=True):
+            pass
         logger.info("IMAP connection successful")
         return True, "Connection successful"
     except Exception as e:
@@ -25,10 +169,8 @@ def get_folders(server, username, password):
     """Fetch a list of IMAP folders from the mail server."""
     logger.info(f"Fetching IMAP folders from {server} for user {username}")
     try:
-        mail = imaplib.IMAP4_SSL(server)
-        mail.login(username, password)
-        status, folders = mail.list()
-        mail.logout()
+        with imap_pool.connection(server, username, password) as mail:
+            status, folders = mail.list()
         if status == "OK":
             folder_list = [
                 folder.decode().split(' "/" ')[1].strip('"') for folder in folders
@@ -40,3 +182,146 @@ def get_folders(server, username, password):
     except Exception as e:
         logger.error(f"Error fetching IMAP folders: {e}")
         return []
+
+
+def parse_fetch_response(data: list) -> dict[int, bytes]:
+    """Map UIDs to message literals in the response of a multi-message UID FETCH."""
+    messages = {}
+    pending = None
+    for item in data:
+        if isinstance(item, tuple):
+            match = _FETCH_UID_RE.search(item[0])
+            if match:
+                messages[int(match.group(1))] = item[1]
+                pending = None
+            else:
+                # Some servers send the UID after the literal, e.g. b" UID 42)".
+                pending = item[1]
+        elif pending is not None and isinstance(item, bytes):
+            match = _FETCH_UID_RE.search(item)
+            if match:
+                messages[int(match.group(1))] = pending
+            pending = None
+    return messages
+
+
+def format_uid_set(uids: list[int]) -> str:
+    """Format UIDs as a compact IMAP sequence set, e.g. [1, 2, 3, 7] -> "1:3,7"."""
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(
+        str(start) if start == end else f"{start}:{end}" for start, end in ranges
+    )
+
+
+def fetch_in_chunks(
+    mail: imaplib.IMAP4, uids: list[int], items: str, chunk_size: int
+) -> Iterator[dict[int, bytes]]:
+    """Fetch messages by UID with one UID FETCH per chunk of at most chunk_size UIDs.
+
+    Yields a mapping of UID to the fetched literal for every chunk. UIDs that the
+    server did not return (e.g. because they were expunged) are missing from it.
+    A chunk that cannot be fetched raises, so callers never skip it silently.
+    """
+    chunk_size = max(chunk_size, 1)
+    for start in range(0, len(uids), chunk_size):
+        chunk = uids[start : start + chunk_size]
+        message_set = format_uid_set(chunk)
+        status, data = mail.uid("FETCH", message_set, items)
+        if status != "OK":
+            raise imaplib.IMAP4.error(
+                f"Failed to fetch {items} for uids={message_set}, status: {status}"
+            )
+        yield parse_fetch_response(data)
+
+
+def refresh_capabilities(mail: imaplib.IMAP4) -> None:
+    """Update mail.capabilities with the capabilities advertised after LOGIN.
+
+    Many servers only announce extensions such as MOVE or UIDPLUS once the client
+    is authenticated. The LOGIN response usually carries them already, so a
+    separate CAPABILITY round trip is only needed if it did not.
+    """
+    try:
+        _, data = mail.response("CAPABILITY")
+        if not data or data[-1] is None:
+            status, data = mail.capability()
+            if status != "OK":
+                return
+        mail.capabilities = tuple(data[-1].decode().upper().split())
+    except (TypeError, ValueError, AttributeError, imaplib.IMAP4.error):
+        logger.debug("Could not refresh IMAP capabilities", exc_info=True)
+
+
+def has_capability(mail: imaplib.IMAP4, capability: str) -> bool:
+    """Check whether the server advertises the given capability."""
+    return capability.upper() in tuple(getattr(mail, "capabilities", ()))
+
+
+def _has_buffered_response(mail: imaplib.IMAP4) -> bool:
+    """Check whether response bytes were received already, without waiting.
+
+    readline reads ahead, so lines that arrived in the same packet as an earlier
+    one wait in mail.file, and TLS can hold decrypted bytes that select does not
+    see on the socket.
+    """
+    sock = mail.sock
+    if isinstance(sock, ssl.SSLSocket) and sock.pending():
+        return True
+    timeout = sock.gettimeout()
+    sock.settimeout(0)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+
+def idle_wait(mail: imaplib.IMAP4, timeout: float) -> bool:
+    """Wait in IDLE (RFC 2177) until the server reports new mail or timeout passes.
+
+    Returns True if an EXISTS response arrived. IDLE is always ended with DONE
+    before returning, so the connection can be used for other commands afterwards.
+    Servers drop idle clients after 30 minutes, so timeout must stay below that.
+    """
+    tag = b"LFIDLE%d" % int(time.monotonic() * 1000)
+    mail.send(tag + b" IDLE\r\n")
+
+    new_mail = False
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed while starting IDLE")
+        if line.startswith(b"+"):
+            break
+        if line.startswith(tag + b" "):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='replace')}")
+        new_mail = new_mail or bool(_EXISTS_RE.match(line))
+
+    deadline = time.monotonic() + timeout
+    while not new_mail:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not _has_buffered_response(mail):
+            readable, _, _ = select.select([mail.sock], [], [], remaining)
+            if not readable:
+                break
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed during IDLE")
+        new_mail = bool(_EXISTS_RE.match(line))
+
+    mail.send(b"DONE\r\n")
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+        if line.startswith(tag + b" "):
+            return new_mail
+        new_mail = new_mail or bool(_EXISTS_RE.match(line))
@@ -0,0 +1,77 @@
+import multiprocessing
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import settings as env_settings
+from app.core.logging import get_logger
+
+"""Process pool for CPU-heavy work that would otherwise hold the GIL.
+
+Readability extraction and sanitizing run here, so they neither block the IMAP
+workers nor slow down request handling in the web process.
+"""
+
+logger = get_logger(__name__)
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor | None:
+    """Return the shared process pool, starting it on first use."""
+    global _executor
+    if env_settings.extraction_workers < 1:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            logger.info(
+                f"Starting process pool with {env_settings.extraction_workers} workers"
+            )
+            # Forking a process that runs scheduler and IMAP threads is not safe.
+            _executor = ProcessPoolExecutor(
+                max_workers=env_settings.extraction_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _run_inline(fn: Callable, *args) -> Future:
+    """Run fn in the calling thread and wrap its outcome in a future."""
+    future: Future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def submit_to_process_pool(fn: Callable, *args) -> Future:
+    """Submit fn(*args) to the process pool.
+
+    fn must be a picklable module-level function. It runs inline when the pool is
+    disabled, and the pool is restarted once if a worker process died.
+    """
+    global _executor
+    executor = _get_executor()
+    if executor is None:
+        return _run_inline(fn, *args)
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Process pool is broken, restarting it")
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        return _get_executor().submit(fn, *args)
+
+
+def shutdown_process_pool():
+    """Stop the process pool and its worker processes."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -3,14 +3,20 @@ from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from app.core.database import SessionLocal
+from app.core.idle import sync_idle_listeners
+from app.core.imap import imap_pool
 from app.core.logging import get_logger
+from app.crud.entries import render_missing_fragments
 from app.crud.settings import get_settings
+from app.services.body_compression import train_body_dictionaries
 from app.services.email_processor import process_emails
 
 """Scheduler for background tasks like email processing."""
 
 logger = get_logger(__name__)
 
+IMAP_KEEPALIVE_INTERVAL = 5  # Minutes between NOOPs on pooled IMAP connections
+
 
 def job():
     """Process emails as a scheduled job."""
@@ -19,12 +25,27 @@ def job():
     try:
         process_emails(db)
         logger.info("Scheduler job finished: process_emails")
+        # Interval polling stays as a fallback; keep IDLE listeners on the right folders.
+        sync_idle_listeners(db)
+        # Newsletters may have just reached enough entries to train a dictionary.
+        train_body_dictionaries(db)
     except Exception as e:
         logger.error(f"Error in scheduled job process_emails: {e}", exc_info=True)
     finally:
         db.close()
 
 
+def render_fragments_job():
+    """Render the feed fragments of entries stored before fragments existed."""
+    db = SessionLocal()
+    try:
+        render_missing_fragments(db)
+    except Exception as e:
+        logger.error(f"Error in job render_missing_fragments: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
 scheduler = BackgroundScheduler()
 
 
@@ -43,6 +64,13 @@ def start_scheduler_with_interval():
             id="email_check_job",
             replace_existing=True,
         )
+        scheduler.add_job(
+            imap_pool.keepalive,
+            "interval",
+            minutes=IMAP_KEEPALIVE_INTERVAL,
+            id="imap_keepalive_job",
+            replace_existing=True,
+        )
         if not scheduler.running:
             scheduler.add_job(
                 job,
@@ -51,6 +79,14 @@ def start_scheduler_with_interval():
                 id="initial_email_check",
                 replace_existing=True,
             )
+            # Once per start, to backfill entries written by earlier versions.
+            scheduler.add_job(
+                render_fragments_job,
+                "date",
+                run_date=datetime.now(),
+                id="render_missing_fragments",
+                replace_existing=True,
+            )
             scheduler.start()
             logger.info("Scheduler started.")
         else:
@@ -1,20 +1,66 @@
+import datetime
+
 from nanoid import generate
+from sqlalchemy import case, func, null, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 
+from app.core.body_store import (
+    DatabaseBodyStore,
+    FileBodyStore,
+    body_hash,
+    decode_bodies,
+    frame_dictionary_ids,
+    get_body_store,
+)
+from app.core.feed_cache import feed_cache
 from app.core.logging import get_logger
 from app.models.entries import Entry
+from app.models.newsletters import Newsletter
 from app.schemas.entries import EntryCreate
+from app.services.atom_writer import render_entry_fragments
 
 logger = get_logger(__name__)
 
+MESSAGE_ID_QUERY_CHUNK_SIZE = 500
+FRAGMENT_UPDATE_BATCH_SIZE = 500
+
+
+def _before(query, cursor: Entry | None):
+    """Restrict a query to entries that are older than the cursor entry.
+
+    Entries are ordered by received_at and then by id, so the cursor is unique even
+    when several entries share a timestamp.
+    """
+    if cursor is None:
+        return query
+    # A row value comparison lets the database seek the received_at indexes.
+    return query.filter(
+        tuple_(Entry.received_at, Entry.id) < (cursor.received_at, cursor.id)
+    )
+
 
-def get_all_entries(db: Session, skip: int = 0, limit: int | None = None):
-    """Retrieve all entries from all newsletters, sorted by received date."""
+def get_entry(db: Session, entry_id: str):
+    """Retrieve an entry by its ID."""
+    logger.debug(f"Querying for entry with id={entry_id}")
+    return db.get(Entry, entry_id)
+
+
+def get_all_entries(
+    db: Session,
+    skip: int = 0,
+    limit: int | None = None,
+    before: Entry | None = None,
+):
+    """Retrieve all entries from all newsletters, sorted by received date.
+
+    If before is given, only entries older than that entry are returned.
+    """
     logger.debug(f"Querying all entries with skip={skip}, limit={limit}")
     query = (
-        db.query(Entry)
+        _before(db.query(Entry), before)
         .options(joinedload(Entry.newsletter))
-        .order_by(Entry.received_at.desc())
+        .order_by(Entry.received_at.desc(), Entry.id.desc())
         .offset(skip)
     )
     if limit is not None:
@@ -23,15 +69,22 @@ def get_all_entries(db: Session, skip: int = 0, limit: int | None = None):
 
 
 def get_entries_by_newsletter(
-    db: Session, newsletter_id: str, skip: int = 0, limit: int | None = None
+    db: Session,
+    newsletter_id: str,
+    skip: int = 0,
+    limit: int | None = None,
+    before: Entry | None = None,
 ):
-    """Retrieve entries for a specific newsletter."""
+    """Retrieve entries for a specific newsletter.
+
+    If before is given, only entries older than that entry are returned.
+    """
     logger.debug(
         f"Querying entries for newsletter_id={newsletter_id}, skip={skip}, limit={limit}"
     )
     query = (
-        db.query(Entry)
-        .order_by(Entry.received_at.desc())
+        _before(db.query(Entry), before)
+        .order_by(Entry.received_at.desc(), Entry.id.desc())
         .filter(Entry.newsletter_id == newsletter_id)
         .offset(skip)
     )
@@ -42,20 +95,421 @@ def get_entries_by_newsletter(
     return query.all()
 
 
+def _at_or_after(query, key):
+    """Restrict a query to entries that are not older than the key entry."""
+    if key is None:
+        return query
+    return query.filter(
+        tuple_(Entry.received_at, Entry.id) >= (key.received_at, key.id)
+    )
+
+
+def get_entry_keys(
+    db: Session,
+    newsletter_id: str | None = None,
+    limit: int | None = None,
+    before: Entry | None = None,
+):
+    """Retrieve the id and received_at of entries, newest first, without their bodies."""
+    logger.debug(
+        f"Querying entry keys for newsletter_id={newsletter_id}, limit={limit}"
+    )
+    query = _before(db.query(Entry.id, Entry.received_at), before).order_by(
+        Entry.received_at.desc(), Entry.id.desc()
+    )
+    if newsletter_id is not None:
+        query = query.filter(Entry.newsletter_id == newsletter_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def feed_rows_statement(
+    newsletter_id: str | None = None,
+    since=None,
+    before: Entry | None = None,
+    master: bool = False,
+    with_fragments: bool = True,
+    newest_first: bool = False,
+):
+    """Build the query for the feed columns of entries and their newsletter name.
+
+    Rows are ordered oldest first, or newest first with newest_first. With
+    with_fragments, rows hold the pre-rendered Atom fragment of the newsletter
+    feed, or of the master feed if master is set. For entries stored before
+    fragments existed, the fragment is None and the row carries what is needed to
+    render it instead. Otherwise, rows always carry the body hash, to load the body
+    from the body store with load_row_bodies.
+
+    Entries are restricted to the range from the since key up to the before cursor.
+    """
+    if with_fragments:
+        fragment = Entry.master_atom_fragment if master else Entry.atom_fragment
+        # Bodies are only needed when there is no fragment yet.
+        body = case((fragment.is_(None), Entry.body_hash))
+    else:
+        fragment, body = null(), Entry.body_hash
+    statement = select(
+        Entry.id,
+        fragment.label("fragment"),
+        Entry.subject,
+        body.label("body_hash"),
+        Entry.received_at,
+        Newsletter.name,
+    ).outerjoin(Newsletter, Entry.newsletter_id == Newsletter.id)
+    statement = _at_or_after(_before(statement, before), since)
+    if newsletter_id is not None:
+        statement = statement.filter(Entry.newsletter_id == newsletter_id)
+    if newest_first:
+        return statement.order_by(Entry.received_at.desc(), Entry.id.desc())
+    return statement.order_by(Entry.received_at, Entry.id)
+
+
+def iter_feed_rows(
+    db: Session,
+    newsletter_id: str | None = None,
+    since=None,
+    before: Entry | None = None,
+    master: bool = False,
+    with_fragments: bool = True,
+    newest_first: bool = False,
+    batch_size: int = 100,
+):
+    """Stream the rows of feed_rows_statement from a database cursor.
+
+    Rows are fetched in batches of batch_size.
+    """
+    logger.debug(f"Streaming feed rows for newsletter_id={newsletter_id}")
+    statement = feed_rows_statement(
+        newsletter_id, since, before, master, with_fragments, newest_first
+    )
+    yield from db.execute(
+        statement.execution_options(stream_results=True, yield_per=batch_size)
+    )
+
+
+async def stream_feed_rows(
+    db: AsyncSession,
+    newsletter_id: str | None = None,
+    since=None,
+    before: Entry | None = None,
+    master: bool = False,
+    with_fragments: bool = True,
+    newest_first: bool = False,
+    batch_size: int = 100,
+):
+    """Stream the rows of feed_rows_statement in lists of up to batch_size rows.
+
+    The async counterpart of iter_feed_rows, for the feed endpoints.
+    """
+    logger.debug(f"Streaming feed rows for newsletter_id={newsletter_id}")
+    statement = feed_rows_statement(
+        newsletter_id, since, before, master, with_fragments, newest_first
+    )
+    result = await db.stream(statement.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
+
+
+def fetch_row_bodies(db: Session | None, rows) -> dict[str, tuple[str, bytes]]:
+    """Fetch the stored bodies that feed rows without a fragment need, by hash.
+
+    The bodies are still compressed, see decode_bodies. The session is only used
+    by the database body store.
+    """
+    hashes = {row.body_hash for row in rows if row.fragment is None and row.body_hash}
+    if not hashes:
+        return {}
+    return get_body_store().fetch(db, hashes)
+
+
+def load_row_bodies(db: Session | None, rows) -> dict[str, str]:
+    """Load the bodies that feed rows without a fragment need, by hash."""
+    return decode_bodies(fetch_row_bodies(db, rows))
+
+
+def get_entry_stats(
+    db: Session, newsletter_id: str | None = None, before: Entry | None = None
+):
+    """Return the number of entries and the newest received_at, optionally per newsletter."""
+    logger.debug(f"Querying entry stats for newsletter_id={newsletter_id}")
+    query = _before(db.query(func.count(Entry.id), func.max(Entry.received_at)), before)
+    if newsletter_id is not None:
+        query = query.filter(Entry.newsletter_id == newsletter_id)
+    count, newest = query.one()
+    return count, newest
+
+
 def get_entry_by_message_id(db: Session, message_id: str):
     """Retrieve an entry by its message_id."""
     logger.debug(f"Querying for entry with message_id={message_id}")
     return db.query(Entry).filter(Entry.message_id == message_id).first()
 
 
+def get_existing_message_ids(db: Session, message_ids: list[str]) -> set[str]:
+    """Return which of the given message_ids already belong to an entry."""
+    logger.debug(f"Querying for {len(message_ids)} message_ids")
+    existing = set()
+    # Stay well below SQLite's limit on the number of bound parameters.
+    for start in range(0, len(message_ids), MESSAGE_ID_QUERY_CHUNK_SIZE):
+        chunk = message_ids[start : start + MESSAGE_ID_QUERY_CHUNK_SIZE]
+        existing.update(
+            message_id
+            for (message_id,) in db.query(Entry.message_id).filter(
+                Entry.message_id.in_(chunk)
+            )
+        )
+    return existing
+
+
+def _new_entry(entry: EntryCreate, newsletter_id: str, newsletter_name: str | None):
+    """Build an entry together with its pre-rendered Atom fragments.
+
+    The body is not stored yet, see _store_bodies.
+    """
+    db_entry = Entry(
+        id=generate(),
+        **entry.model_dump(exclude={"body"}),
+        newsletter_id=newsletter_id,
+        body_hash=body_hash(entry.body),
+    )
+    # The entry knows its body without reading it back from the store.
+    db_entry._body = (db_entry.body_hash, entry.body)
+    # The fragments need the timestamp that would otherwise be set on insert, as
+    # SQLite will return it: naive, in UTC.
+    if db_entry.received_at is None:
+        db_entry.received_at = datetime.datetime.now(datetime.UTC)
+    if db_entry.received_at.tzinfo is not None:
+        db_entry.received_at = db_entry.received_at.astimezone(datetime.UTC).replace(
+            tzinfo=None
+        )
+    db_entry.atom_fragment, db_entry.master_atom_fragment = render_entry_fragments(
+        db_entry.id,
+        db_entry.subject,
+        db_entry.body,
+        db_entry.received_at,
+        newsletter_name,
+    )
+    return db_entry
+
+
+def _store_bodies(db: Session, db_entries: list[Entry]) -> None:
+    """Put the bodies of new entries into the body store, once per distinct body.
+
+    Bodies are compressed with the dictionary of their newsletter, if it has one.
+    """
+    dictionary_ids = dict(
+        db.query(Newsletter.id, Newsletter.body_dictionary_id).filter(
+            Newsletter.id.in_({e.newsletter_id for e in db_entries})
+        )
+    )
+    by_dictionary: dict[int | None, dict[str, str]] = {}
+    for db_entry in db_entries:
+        bodies = by_dictionary.setdefault(
+            dictionary_ids.get(db_entry.newsletter_id), {}
+        )
+        bodies[db_entry.body_hash] = db_entry.body
+    store = get_body_store()
+    for dictionary_id, bodies in by_dictionary.items():
+        store.put(db, bodies, dictionary_id)
+
+
+def discard_unreferenced_bodies(db: Session, hashes: set[str]) -> None:
+    """Delete bodies from the body store that no entry refers to anymore.
+
+    Called after the entries are deleted and committed. The store checks the
+    references as it deletes, so bodies that new entries share are kept.
+    """
+    if hashes:
+        logger.debug(f"Discarding up to {len(hashes)} unreferenced bodies")
+        get_body_store().discard(db, hashes, Entry.body_hash)
+
+
+def move_bodies(
+    db: Session,
+    source: DatabaseBodyStore | FileBodyStore,
+    target: DatabaseBodyStore | FileBodyStore,
+) -> int:
+    """Move the bodies of all entries from one body store to another.
+
+    Bodies are copied as they are stored, together with their dictionaries, and
+    deleted from the source a batch at a time. Returns the number of bodies moved.
+    """
+    last_hash, count = "", 0
+    while True:
+        hashes = [
+            key
+            for (key,) in db.query(Entry.body_hash)
+            .filter(Entry.body_hash > last_hash)
+            .distinct()
+            .order_by(Entry.body_hash)
+            .limit(MESSAGE_ID_QUERY_CHUNK_SIZE)
+        ]
+        if not hashes:
+            return count
+        stored = source.fetch(db, hashes)
+        for dictionary_id in frame_dictionary_ids(stored):
+            target.add_dictionary(db, source.load_dictionary(db, dictionary_id))
+        target.put_stored(db, stored)
+        db.commit()
+        source.delete(db, stored)
+        count += len(stored)
+        last_hash = hashes[-1]
+
+
+def _get_newsletter_names(db: Session, newsletter_ids: set[str]) -> dict[str, str]:
+    return dict(
+        db.query(Newsletter.id, Newsletter.name).filter(
+            Newsletter.id.in_(newsletter_ids)
+        )
+    )
+
+
+def _add_entry_stats(
+    db: Session, newsletter_id: str, count: int, newest: datetime.datetime
+) -> None:
+    """Add new entries to the counters of their newsletter, without committing."""
+    last = Newsletter.last_received_at
+    db.execute(
+        update(Newsletter)
+        .where(Newsletter.id == newsletter_id)
+        .values(
+            entry_count=Newsletter.entry_count + count,
+            last_received_at=case(
+                (or_(last.is_(None), last < newest), newest), else_=last
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
 def create_entry(db: Session, entry: EntryCreate, newsletter_id: str):
     """Create a new entry for a newsletter."""
     logger.info(
         f"Creating new entry for newsletter_id={newsletter_id} with subject '{entry.subject}'"
     )
-    db_entry = Entry(id=generate(), **entry.model_dump(), newsletter_id=newsletter_id)
+    names = _get_newsletter_names(db, {newsletter_id})
+    db_entry = _new_entry(entry, newsletter_id, names.get(newsletter_id))
+    _store_bodies(db, [db_entry])
     db.add(db_entry)
+    _add_entry_stats(db, newsletter_id, 1, db_entry.received_at)
     db.commit()
     db.refresh(db_entry)
+    feed_cache.invalidate_newsletter(newsletter_id, db_entry.received_at)
     logger.info(f"Successfully created entry with id={db_entry.id}")
     return db_entry
+
+
+def create_entries(db: Session, entries: list[tuple[EntryCreate, str]]):
+    """Create several entries, given with their newsletter_id, in a single commit."""
+    logger.info(f"Creating {len(entries)} new entries")
+    names = _get_newsletter_names(db, {newsletter_id for _, newsletter_id in entries})
+    db_entries = [
+        _new_entry(entry, newsletter_id, names.get(newsletter_id))
+        for entry, newsletter_id in entries
+    ]
+    # The number, oldest and newest received_at of the new entries per newsletter.
+    stats: dict[str, tuple[int, datetime.datetime, datetime.datetime]] = {}
+    for db_entry in db_entries:
+        received_at = db_entry.received_at.replace(tzinfo=None)
+        count, oldest, newest = stats.get(
+            db_entry.newsletter_id, (0, received_at, received_at)
+        )
+        stats[db_entry.newsletter_id] = (
+            count + 1,
+            min(oldest, received_at),
+            max(newest, received_at),
+        )
+    _store_bodies(db, db_entries)
+    db.add_all(db_entries)
+    for newsletter_id, (count, _, newest) in stats.items():
+        _add_entry_stats(db, newsletter_id, count, newest)
+    db.commit()
+    for newsletter_id, (_, oldest, _) in stats.items():
+        feed_cache.invalidate_newsletter(newsletter_id, oldest)
+    logger.info(f"Successfully created {len(db_entries)} entries")
+    return db_entries
+
+
+def _fragment_updates(db: Session, rows, newsletter_names: dict) -> list[dict]:
+    """Render the Atom fragments of entry rows, as updates by entry id."""
+    bodies = get_body_store().get(db, {row.body_hash for row in rows if row.body_hash})
+    updates = []
+    for row in rows:
+        fragment, master_fragment = render_entry_fragments(
+            row.id,
+            row.subject,
+            bodies.get(row.body_hash),
+            row.received_at,
+            newsletter_names.get(row.newsletter_id),
+        )
+        updates.append(
+            {
+                "id": row.id,
+                "atom_fragment": fragment,
+                "master_atom_fragment": master_fragment,
+            }
+        )
+    return updates
+
+
+_FRAGMENT_COLUMNS = (
+    Entry.id,
+    Entry.newsletter_id,
+    Entry.subject,
+    Entry.body_hash,
+    Entry.received_at,
+)
+
+
+def render_master_fragments(db: Session, newsletter_id: str, newsletter_name: str):
+    """Re-render the master feed fragments of a newsletter's entries after a rename.
+
+    The changes are not committed, so that they go with the rename itself.
+    """
+    logger.info(f"Re-rendering master feed fragments for newsletter_id={newsletter_id}")
+    last_id = ""
+    while True:
+        rows = (
+            db.query(*_FRAGMENT_COLUMNS)
+            .filter(Entry.newsletter_id == newsletter_id, Entry.id > last_id)
+            .order_by(Entry.id)
+            .limit(FRAGMENT_UPDATE_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            return
+        db.execute(
+            update(Entry), _fragment_updates(db, rows, {newsletter_id: newsletter_name})
+        )
+        last_id = rows[-1].id
+
+
+def render_missing_fragments(db: Session) -> int:
+    """Render the Atom fragments of entries stored before fragments existed.
+
+    Every batch is committed on its own. Returns the number of entries rendered.
+    """
+    newsletter_names = dict(db.query(Newsletter.id, Newsletter.name))
+    last_id, count = "", 0
+    while True:
+        rows = (
+            db.query(*_FRAGMENT_COLUMNS)
+            .filter(
+                Entry.id > last_id,
+                or_(
+                    Entry.atom_fragment.is_(None), Entry.master_atom_fragment.is_(None)
+                ),
+            )
+            .order_by(Entry.id)
+            .limit(FRAGMENT_UPDATE_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            if count:
+                logger.info(f"Rendered the feed fragments of {count} entries")
+            return count
+        db.execute(update(Entry), _fragment_updates(db, rows, newsletter_names))
+        db.commit()
+        count += len(rows)
+        last_id = rows[-1].id
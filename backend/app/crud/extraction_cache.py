@@ -0,0 +1,67 @@
+import datetime
+
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.models.extraction_cache import ExtractionCacheEntry
+
+logger = get_logger(__name__)
+
+
+def _find(db: Session, key: str) -> ExtractionCacheEntry | None:
+    """Return a cached extraction, including one saved in this transaction."""
+    for obj in db.new:
+        if isinstance(obj, ExtractionCacheEntry) and obj.key == key:
+            return obj
+    return db.get(ExtractionCacheEntry, key)
+
+
+def get_cached_extraction(db: Session, key: str):
+    """Retrieve a cached extraction and mark it as recently used.
+
+    The mark is not committed, it goes with the caller's transaction.
+    """
+    logger.debug(f"Querying extraction cache for key={key}")
+    cached = _find(db, key)
+    if cached:
+        cached.last_used_at = datetime.datetime.now()
+    return cached
+
+
+def save_cached_extraction(db: Session, key: str, title: str, body: str):
+    """Cache an extraction, without committing.
+
+    Like the marks of get_cached_extraction, it is only written when the caller
+    commits, so the write lock of the database is not held in the meantime.
+    """
+    logger.debug(f"Saving extraction cache entry for key={key}")
+    if _find(db, key) is None:
+        db.add(
+            ExtractionCacheEntry(
+                key=key,
+                title=title,
+                body=body,
+                last_used_at=datetime.datetime.now(),
+            )
+        )
+
+
+def evict_cached_extractions(db: Session, max_entries: int) -> int:
+    """Evict the least recently used extractions beyond max_entries and commit.
+
+    Returns the number of evicted extractions.
+    """
+    excess = db.query(ExtractionCacheEntry).count() - max_entries
+    if excess <= 0:
+        return 0
+    logger.debug(f"Evicting {excess} extraction cache entries")
+    oldest = (
+        db.query(ExtractionCacheEntry.key)
+        .order_by(ExtractionCacheEntry.last_used_at)
+        .limit(excess)
+    )
+    db.query(ExtractionCacheEntry).filter(
+        ExtractionCacheEntry.key.in_(oldest.scalar_subquery())
+    ).delete(synchronize_session=False)
+    db.commit()
+    return excess
@@ -0,0 +1,71 @@
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.models.imap_folders import ImapFolderState
+
+logger = get_logger(__name__)
+
+# Every reset bumps the generation. A processing run reads it before loading the
+# newsletters and saves its checkpoints only if no reset happened in the meantime.
+_reset_lock = threading.Lock()
+_reset_generation = 0
+
+
+def get_folder_state(db: Session, account: str, folder: str):
+    """Retrieve the sync checkpoint for a folder of an IMAP account."""
+    logger.debug(f"Querying folder state for account={account}, folder={folder}")
+    return (
+        db.query(ImapFolderState)
+        .filter(ImapFolderState.account == account, ImapFolderState.folder == folder)
+        .first()
+    )
+
+
+def get_reset_generation() -> int:
+    """Return the generation of the sync checkpoints, bumped by every reset."""
+    return _reset_generation
+
+
+def save_folder_state(
+    db: Session,
+    account: str,
+    folder: str,
+    uidvalidity: int,
+    last_uid: int,
+    generation: int | None = None,
+):
+    """Create or update the sync checkpoint for a folder of an IMAP account.
+
+    If a generation is given and the checkpoints were reset since it was read,
+    nothing is saved and None is returned.
+    """
+    with _reset_lock:
+        if generation is not None and generation != _reset_generation:
+            logger.info(
+                f"Folder states were reset, not saving the state of folder={folder}"
+            )
+            return None
+        logger.debug(
+            f"Saving folder state for account={account}, folder={folder}: "
+            f"uidvalidity={uidvalidity}, last_uid={last_uid}"
+        )
+        db_state = get_folder_state(db, account, folder)
+        if not db_state:
+            db_state = ImapFolderState(account=account, folder=folder)
+            db.add(db_state)
+        db_state.uidvalidity = uidvalidity
+        db_state.last_uid = last_uid
+        db.commit()
+        return db_state
+
+
+def reset_folder_states(db: Session):
+    """Delete all sync checkpoints so that the next run rescans every folder."""
+    global _reset_generation
+    logger.info("Resetting all IMAP folder sync states")
+    with _reset_lock:
+        _reset_generation += 1
+        db.query(ImapFolderState).delete()
+        db.commit()
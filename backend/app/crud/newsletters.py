@@ -1,8 +1,10 @@
 from nanoid import generate
 from sqlalchemy import func, or_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
+from app.core.feed_cache import feed_cache
 from app.core.logging import get_logger
+from app.crud.entries import discard_unreferenced_bodies, render_master_fragments
 from app.models.entries import Entry
 from app.models.newsletters import Newsletter, Sender
 from app.schemas.newsletters import NewsletterCreate, NewsletterUpdate
@@ -13,18 +15,11 @@ logger = get_logger(__name__)
 def get_newsletter_by_identifier(db: Session, identifier: str):
     """Retrieve a single newsletter by its ID or slug."""
     logger.debug(f"Querying for newsletter with identifier={identifier}")
-    result = (
-        db.query(Newsletter, func.count(Entry.id))
-        .outerjoin(Entry, Newsletter.id == Entry.newsletter_id)
+    return (
+        db.query(Newsletter)
         .filter(or_(Newsletter.id == identifier, Newsletter.slug == identifier))
-        .group_by(Newsletter.id)
         .first()
     )
-    if result:
-        newsletter, count = result
-        newsletter.entries_count = count
-        return newsletter
-    return None
 
 
 def get_newsletter_by_slug(db: Session, slug: str):
@@ -35,22 +30,58 @@ def get_newsletter_by_slug(db: Session, slug: str):
 def get_newsletters(db: Session, skip: int = 0, limit: int = 100):
     """Retrieve a list of newsletters."""
     logger.debug(f"Querying for newsletters with skip={skip}, limit={limit}")
-    results = (
-        db.query(Newsletter, func.count(Entry.id))
-        .outerjoin(Entry, Newsletter.id == Entry.newsletter_id)
-        .group_by(Newsletter.id)
+    return (
+        db.query(Newsletter)
+        .options(selectinload(Newsletter.senders))
         .order_by(Newsletter.id)
         .offset(skip)
         .limit(limit)
         .all()
     )
 
-    newsletters_with_count = []
-    for newsletter, count in results:
-        newsletter.entries_count = count
-        newsletters_with_count.append(newsletter)
 
-    return newsletters_with_count
+def get_newsletters_by_ids(db: Session, newsletter_ids: list[str]):
+    """Retrieve the newsletters with the given IDs."""
+    if not newsletter_ids:
+        return []
+    return (
+        db.query(Newsletter)
+        .filter(Newsletter.id.in_(newsletter_ids))
+        .order_by(Newsletter.id)
+        .all()
+    )
+
+
+def get_all_newsletters(db: Session):
+    """Retrieve every newsletter with its senders."""
+    logger.debug("Querying for all newsletters")
+    return (
+        db.query(Newsletter)
+        .options(selectinload(Newsletter.senders))
+        .order_by(Newsletter.id)
+        .all()
+    )
+
+
+def get_newsletter_names(db: Session):
+    """Retrieve the ID and name of every newsletter."""
+    return [
+        tuple(row)
+        for row in db.query(Newsletter.id, Newsletter.name).order_by(Newsletter.id)
+    ]
+
+
+def get_newsletter_stats(db: Session):
+    """Retrieve the ID, name, entry_count and last_received_at of every newsletter."""
+    return [
+        tuple(row)
+        for row in db.query(
+            Newsletter.id,
+            Newsletter.name,
+            Newsletter.entry_count,
+            Newsletter.last_received_at,
+        ).order_by(Newsletter.id)
+    ]
 
 
 def create_newsletter(db: Session, newsletter: NewsletterCreate):
@@ -80,7 +111,6 @@ def create_newsletter(db: Session, newsletter: NewsletterCreate):
     db.refresh(db_newsletter)
 
     logger.info(f"Successfully created newsletter with id={db_newsletter.id}")
-    db_newsletter.entries_count = 0
     return db_newsletter
 
 
@@ -98,6 +128,7 @@ def update_newsletter(
         if existing_newsletter and existing_newsletter.id != newsletter_id:
             return "conflict"  # Indicates a conflict
 
+    old_name = db_newsletter.name
     update_data = newsletter_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         if key == "sender_emails":
@@ -121,8 +152,13 @@ def update_newsletter(
             )
             db.add(db_sender)
 
+    # Entry titles of the master feed contain the newsletter name.
+    if db_newsletter.name != old_name:
+        render_master_fragments(db, db_newsletter.id, db_newsletter.name)
+
     db.commit()
     db.refresh(db_newsletter)
+    feed_cache.invalidate_newsletter(db_newsletter.id)
 
     logger.info(f"Successfully updated newsletter with id={db_newsletter.id}")
     return get_newsletter_by_identifier(db, newsletter_id)
@@ -135,7 +171,47 @@ def delete_newsletter(db: Session, newsletter_id: str):
     if not db_newsletter:
         return None
 
+    body_hashes = {
+        key
+        for (key,) in db.query(Entry.body_hash).filter(
+            Entry.newsletter_id == db_newsletter.id, Entry.body_hash.isnot(None)
+        )
+    }
     db.delete(db_newsletter)
     db.commit()
+    discard_unreferenced_bodies(db, body_hashes)
+    feed_cache.invalidate_newsletter(db_newsletter.id)
     logger.info(f"Successfully deleted newsletter with id={newsletter_id}")
     return db_newsletter
+
+
+def repair_entry_stats(db: Session) -> list[str]:
+    """Recompute the entry counters of every newsletter from its entries.
+
+    Returns the IDs of the newsletters whose counters were out of date, which are
+    corrected and have their cached feeds invalidated.
+    """
+    logger.info("Recomputing entry counters of all newsletters")
+    stats = {
+        newsletter_id: (count, newest)
+        for newsletter_id, count, newest in db.query(
+            Entry.newsletter_id, func.count(Entry.id), func.max(Entry.received_at)
+        ).group_by(Entry.newsletter_id)
+    }
+    repaired = []
+    for newsletter in db.query(Newsletter).order_by(Newsletter.id):
+        count, newest = stats.get(newsletter.id, (0, None))
+        if (newsletter.entry_count, newsletter.last_received_at) != (count, newest):
+            logger.warning(
+                f"Entry counters of newsletter_id={newsletter.id} were "
+                f"{newsletter.entry_count}, {newsletter.last_received_at} instead of "
+                f"{count}, {newest}"
+            )
+            newsletter.entry_count = count
+            newsletter.last_received_at = newest
+            repaired.append(newsletter.id)
+    db.commit()
+    for newsletter_id in repaired:
+        feed_cache.invalidate_newsletter(newsletter_id)
+    logger.info(f"Repaired entry counters of {len(repaired)} newsletters")
+    return repaired
@@ -0,0 +1,66 @@
+import datetime
+
+from nanoid import generate
+from sqlalchemy.orm import Session
+
+from app.core.logging import get_logger
+from app.models.websub import WebSubSubscription
+
+logger = get_logger(__name__)
+
+
+def get_active_subscriptions(db: Session, topics: list[str]):
+    """Retrieve the subscriptions to any of the topics whose lease has not expired."""
+    logger.debug(f"Querying WebSub subscriptions for {len(topics)} topics")
+    return (
+        db.query(WebSubSubscription)
+        .filter(
+            WebSubSubscription.topic.in_(topics),
+            WebSubSubscription.expires_at > datetime.datetime.now(),
+        )
+        .all()
+    )
+
+
+def save_subscription(
+    db: Session, topic: str, callback: str, secret: str | None, lease_seconds: int
+):
+    """Create a subscription, or renew it with a new lease and secret."""
+    logger.info(f"Saving WebSub subscription of {callback} to {topic}")
+    expires_at = datetime.datetime.now() + datetime.timedelta(seconds=lease_seconds)
+    subscription = (
+        db.query(WebSubSubscription)
+        .filter(
+            WebSubSubscription.topic == topic,
+            WebSubSubscription.callback == callback,
+        )
+        .first()
+    )
+    if subscription is None:
+        subscription = WebSubSubscription(id=generate(), topic=topic, callback=callback)
+        db.add(subscription)
+    subscription.secret = secret
+    subscription.expires_at = expires_at
+    db.commit()
+    return subscription
+
+
+def delete_subscription(db: Session, topic: str, callback: str):
+    """Delete a subscription, if it exists."""
+    logger.info(f"Deleting WebSub subscription of {callback} to {topic}")
+    db.query(WebSubSubscription).filter(
+        WebSubSubscription.topic == topic,
+        WebSubSubscription.callback == callback,
+    ).delete()
+    db.commit()
+
+
+def delete_expired_subscriptions(db: Session) -> int:
+    """Delete the subscriptions whose lease has expired and return how many."""
+    deleted = (
+        db.query(WebSubSubscription)
+        .filter(WebSubSubscription.expires_at <= datetime.datetime.now())
+        .delete()
+    )
+    db.commit()
+    return deleted
@@ -5,11 +5,15 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.auth import protected_route
 from app.core.config import settings
-from app.core.database import Base, SessionLocal, engine
+from app.core.database import Base, SessionLocal, async_engine, engine
+from app.core.idle import stop_idle_listeners, sync_idle_listeners
+from app.core.imap import imap_pool
 from app.core.logging import get_logger, setup_logging
+from app.core.process_pool import shutdown_process_pool
 from app.core.scheduler import scheduler, start_scheduler_with_interval
 from app.crud.settings import create_initial_settings
-from app.routers import auth, feeds, health, imap, newsletters
+from app.routers import auth, feeds, health, imap, newsletters, websub
+from app.services.websub import shutdown_websub
 
 
 @asynccontextmanager
@@ -26,10 +30,17 @@ async def lifespan(app: FastAPI):
         create_initial_settings(db)
 
     start_scheduler_with_interval()
+    with SessionLocal() as db:
+        sync_idle_listeners(db)
     yield
+    stop_idle_listeners()
     if scheduler.running:
         logger.info("Shutting down scheduler...")
         scheduler.shutdown()
+    imap_pool.close_all()
+    shutdown_process_pool()
+    shutdown_websub()
+    await async_engine.dispose()
     logger.info("...Letterfeed backend shut down.")
 
 
@@ -58,3 +69,4 @@ app.include_router(auth.router)
 app.include_router(imap.router, dependencies=[Depends(protected_route)])
 app.include_router(newsletters.router, dependencies=[Depends(protected_route)])
 app.include_router(feeds.router)
+app.include_router(websub.router)
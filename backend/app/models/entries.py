@@ -1,8 +1,9 @@
 import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String, Text
+from sqlalchemy.orm import object_session, relationship
 
+from app.core.body_store import get_body_store
 from app.core.database import Base
 
 
@@ -14,8 +15,38 @@ class Entry(Base):
     id = Column(String, primary_key=True, index=True)
     newsletter_id = Column(String, ForeignKey("newsletters.id"))
     subject = Column(String)
-    body = Column(Text)
+    # The body is kept in the body store, which is only read when it is needed.
+    body_hash = Column(String, index=True, nullable=True)
     received_at = Column(DateTime(timezone=True), default=datetime.datetime.now)
     message_id = Column(String, unique=True, index=True, nullable=False)
+    # Pre-rendered Atom <entry> elements of the newsletter and the master feed.
+    atom_fragment = Column(Text, nullable=True)
+    master_atom_fragment = Column(Text, nullable=True)
 
     newsletter = relationship("Newsletter", back_populates="entries")
+
+    # Entries are listed newest first, by received_at and then id, per newsletter
+    # and across all of them. The indexes serve that order and keyset paging
+    # without a scan and sort of the table.
+    __table_args__ = (
+        Index(
+            "ix_entries_newsletter_id_received_at",
+            newsletter_id,
+            received_at.desc(),
+            id.desc(),
+        ),
+        Index("ix_entries_received_at", received_at.desc(), id.desc()),
+    )
+
+    @property
+    def body(self) -> str | None:
+        """Return the body, loaded from the body store on first access."""
+        if self.body_hash is None:
+            return None
+        loaded = self.__dict__.get("_body")
+        if loaded is None or loaded[0] != self.body_hash:
+            bodies = get_body_store().get(object_session(self), [self.body_hash])
+            if self.body_hash not in bodies:
+                raise LookupError(f"Body of entry {self.id} is missing from the store")
+            loaded = self._body = (self.body_hash, bodies[self.body_hash])
+        return loaded[1]
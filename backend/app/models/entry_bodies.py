@@ -0,0 +1,26 @@
+import datetime
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+
+from app.core.database import Base
+
+
+class EntryBody(Base):
+    """Represents a compressed entry body, keyed by the SHA-256 of its content."""
+
+    __tablename__ = "entry_bodies"
+
+    hash = Column(String, primary_key=True)
+    codec = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+class BodyDictionary(Base):
+    """Represents a zstd dictionary, trained on the bodies of a newsletter."""
+
+    __tablename__ = "body_dictionaries"
+
+    # The dictionary id, which zstd writes into every frame compressed with it.
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=datetime.datetime.now)
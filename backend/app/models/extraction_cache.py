@@ -0,0 +1,18 @@
+import datetime
+
+from sqlalchemy import Column, DateTime, String, Text
+
+from app.core.database import Base
+
+
+class ExtractionCacheEntry(Base):
+    """Represents the memoized content extraction of a newsletter body."""
+
+    __tablename__ = "extraction_cache"
+
+    key = Column(String, primary_key=True)
+    title = Column(String)
+    body = Column(Text)
+    last_used_at = Column(
+        DateTime(timezone=True), default=datetime.datetime.now, index=True
+    )
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+
+from app.core.database import Base
+
+
+class ImapFolderState(Base):
+    """Represents the UID sync checkpoint of an IMAP folder."""
+
+    __tablename__ = "imap_folder_states"
+
+    account = Column(String, primary_key=True)
+    folder = Column(String, primary_key=True)
+    uidvalidity = Column(Integer, nullable=False)
+    last_uid = Column(Integer, nullable=False, default=0)
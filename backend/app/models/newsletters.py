@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -16,6 +16,12 @@ class Newsletter(Base):
     move_to_folder = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     extract_content = Column(Boolean, default=False)
+    # Kept up to date with the entries in the same transaction by the entry CRUD
+    # functions, so that listings and feed validators need no aggregate queries.
+    entry_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_received_at = Column(DateTime(timezone=True), nullable=True)
+    # The zstd dictionary that new bodies are compressed with, once one is trained.
+    body_dictionary_id = Column(Integer, nullable=True)
 
     senders = relationship(
         "Sender", back_populates="newsletter", cascade="all, delete-orphan"
@@ -24,6 +30,11 @@ class Newsletter(Base):
         "Entry", back_populates="newsletter", cascade="all, delete-orphan"
     )
 
+    @property
+    def entries_count(self) -> int:
+        """Return the number of entries, under the name the API has always used."""
+        return self.entry_count
+
 
 class Sender(Base):
     """Represents an email sender associated with a newsletter."""
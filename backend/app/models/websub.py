@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, String, UniqueConstraint
+
+from app.core.database import Base
+
+
+class WebSubSubscription(Base):
+    """Represents a subscription to a feed on the built-in WebSub hub."""
+
+    __tablename__ = "websub_subscriptions"
+    __table_args__ = (UniqueConstraint("topic", "callback"),)
+
+    id = Column(String, primary_key=True, index=True)
+    topic = Column(String, index=True, nullable=False)
+    callback = Column(String, nullable=False)
+    secret = Column(String, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -1,30 +1,112 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
-from sqlalchemy.orm import Session
+import datetime
+import email.utils
+from collections.abc import AsyncIterator
 
-from app.core.database import get_db
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.compression import choose_encoding
+from app.core.feed_cache import CachedFeed, FeedValidators
 from app.core.logging import get_logger
-from app.services.feed_generator import generate_feed, generate_master_feed
+from app.services.feed_generator import (
+    FEED_FORMATS,
+    FeedPageNotFoundError,
+    render_feed_async,
+    render_master_feed_async,
+    run_render,
+)
 
 logger = get_logger(__name__)
 router = APIRouter()
 
 
-@router.get("/feeds/all")
-def get_master_feed(db: Session = Depends(get_db)):
-    """Generate a master Atom feed for all newsletters."""
-    logger.info("Generating master feed for all newsletters")
-    feed = generate_master_feed(db)
+def _client_is_fresh(request: Request, validators: FeedValidators) -> bool:
+    """Evaluate If-None-Match and If-Modified-Since against a feed's validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as the ETags only identify the feed's content.
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or validators.etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or validators.last_modified is None:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return validators.last_modified.replace(microsecond=0) <= since
+
+
+async def _feed_response(
+    request: Request,
+    validators: FeedValidators,
+    feed: CachedFeed | AsyncIterator[bytes] | None,
+    feed_format: str = "atom",
+) -> Response:
+    """Build a feed response, or a 304 if the client's copy is still fresh.
+
+    Cached feeds are sent in the content coding the client prefers, with the
+    compressed variant kept alongside the cached feed, and compressed in a render
+    thread the first time. Freshly rendered feeds are streamed uncompressed. The
+    ETag is weak, so it is shared by all codings.
+    """
+    headers = {"ETag": validators.etag, "Vary": "Accept-Encoding"}
+    if validators.last_modified is not None:
+        headers["Last-Modified"] = email.utils.format_datetime(
+            validators.last_modified.astimezone(datetime.UTC), usegmt=True
+        )
+    if feed is None or _client_is_fresh(request, validators):
+        return Response(status_code=304, headers=headers)
+    media_type = FEED_FORMATS[feed_format].media_type
+    if not isinstance(feed, CachedFeed):
+        return StreamingResponse(feed, media_type=media_type, headers=headers)
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    if encoding is None or encoding in feed.encoded:
+        content = feed.encode(encoding)
+    else:
+        content = await run_render(feed.encode, encoding)
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+async def _master_feed(request: Request, before: str | None, feed_format: str):
+    logger.info(f"Generating {feed_format} master feed for all newsletters")
+    try:
+        validators, feed = await render_master_feed_async(
+            before,
+            lambda validators: _client_is_fresh(request, validators),
+            feed_format,
+        )
+    except FeedPageNotFoundError:
+        raise HTTPException(status_code=404, detail="Archive page not found")
     logger.info("Successfully generated master feed")
-    return Response(content=feed, media_type="application/atom+xml")
+    return await _feed_response(request, validators, feed, feed_format)
 
 
-@router.get("/feeds/{feed_identifier}")
-def get_newsletter_feed(feed_identifier: str, db: Session = Depends(get_db)):
-    """Generate an Atom feed for a specific newsletter."""
-    logger.info(f"Generating feed for newsletter with identifier={feed_identifier}")
-    feed = generate_feed(db, feed_identifier)
-    if not feed:
+async def _newsletter_feed(
+    request: Request, feed_identifier: str, before: str | None, feed_format: str
+):
+    logger.info(
+        f"Generating {feed_format} feed for newsletter with identifier={feed_identifier}"
+    )
+    try:
+        result = await render_feed_async(
+            feed_identifier,
+            before,
+            lambda validators: _client_is_fresh(request, validators),
+            feed_format,
+        )
+    except FeedPageNotFoundError:
+        raise HTTPException(status_code=404, detail="Archive page not found")
+    if not result:
         logger.warning(
             f"Newsletter with identifier={feed_identifier} not found, cannot generate feed."
         )
@@ -33,4 +115,57 @@ def get_newsletter_feed(feed_identifier: str, db: Session = Depends(get_db)):
     logger.info(
         f"Successfully generated feed for newsletter with identifier={feed_identifier}"
     )
-    return Response(content=feed, media_type="application/atom+xml")
+    return await _feed_response(request, *result, feed_format)
+
+
+# Feeds are served from the feed cache, which opens a database session only on a
+# miss, so these routes do not depend on get_db. They are async and read through
+# the async engine, so that feed readers do not occupy the threadpool that the
+# other endpoints run in. The routes with a format suffix come first, so that it
+# is not taken for part of the identifier.
+@router.get("/feeds/all.rss")
+async def get_master_rss_feed(request: Request, before: str | None = None):
+    """Generate a master RSS 2.0 feed for all newsletters."""
+    return await _master_feed(request, before, "rss")
+
+
+@router.get("/feeds/all.json")
+async def get_master_json_feed(request: Request, before: str | None = None):
+    """Generate a master JSON Feed for all newsletters."""
+    return await _master_feed(request, before, "json")
+
+
+@router.get("/feeds/all")
+async def get_master_feed(request: Request, before: str | None = None):
+    """Generate a master Atom feed for all newsletters.
+
+    before selects the archive page with the entries older than that entry.
+    """
+    return await _master_feed(request, before, "atom")
+
+
+@router.get("/feeds/{feed_identifier}.rss")
+async def get_newsletter_rss_feed(
+    feed_identifier: str, request: Request, before: str | None = None
+):
+    """Generate an RSS 2.0 feed for a specific newsletter."""
+    return await _newsletter_feed(request, feed_identifier, before, "rss")
+
+
+@router.get("/feeds/{feed_identifier}.json")
+async def get_newsletter_json_feed(
+    feed_identifier: str, request: Request, before: str | None = None
+):
+    """Generate a JSON Feed for a specific newsletter."""
+    return await _newsletter_feed(request, feed_identifier, before, "json")
+
+
+@router.get("/feeds/{feed_identifier}")
+async def get_newsletter_feed(
+    feed_identifier: str, request: Request, before: str | None = None
+):
+    """Generate an Atom feed for a specific newsletter.
+
+    before selects the archive page with the entries older than that entry.
+    """
+    return await _newsletter_feed(request, feed_identifier, before, "atom")
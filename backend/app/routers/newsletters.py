@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.logging import get_logger
 from app.crud.entries import create_entry
+from app.crud.imap_folders import reset_folder_states
 from app.crud.newsletters import (
     create_newsletter,
     delete_newsletter,
@@ -15,6 +16,7 @@ from app.crud.newsletters import (
 )
 from app.schemas.entries import Entry, EntryCreate
 from app.schemas.newsletters import Newsletter, NewsletterCreate, NewsletterUpdate
+from app.services.websub import publish
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -29,6 +31,8 @@ def create_new_newsletter(newsletter: NewsletterCreate, db: Session = Depends(ge
     db_newsletter = create_newsletter(db=db, newsletter=newsletter)
     if db_newsletter is None:
         raise HTTPException(status_code=409, detail="Slug already in use")
+    # Mail from the new senders may already sit below the folder checkpoints.
+    reset_folder_states(db)
     return db_newsletter
 
 
@@ -65,6 +69,8 @@ def update_existing_newsletter(
         raise HTTPException(status_code=404, detail="Newsletter not found")
     if db_newsletter == "conflict":
         raise HTTPException(status_code=409, detail="Slug already in use")
+    # Senders or search folders may have changed, so rescan from the beginning.
+    reset_folder_states(db)
     return db_newsletter
 
 
@@ -91,4 +97,6 @@ def create_newsletter_entry(
             f"Newsletter with id={newsletter_id} not found, cannot create entry"
         )
         raise HTTPException(status_code=404, detail="Newsletter not found")
-    return create_entry(db=db, entry=entry, newsletter_id=newsletter_id)
+    db_entry = create_entry(db=db, entry=entry, newsletter_id=db_newsletter.id)
+    publish([db_newsletter.id])
+    return db_entry
@@ -0,0 +1,72 @@
+from urllib.parse import urlparse
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.websub import (
+    is_public_address,
+    parse_topic,
+    request_subscription,
+)
+
+logger = get_logger(__name__)
+router = APIRouter()
+
+
+def _is_private_ip(url: str) -> bool:
+    """Check whether a URL names a non-public IP address as its host.
+
+    Host names are checked when the callback is requested, after resolving them.
+    """
+    try:
+        return not is_public_address(urlparse(url).hostname or "")
+    except ValueError:
+        return False
+
+
+def _parse_lease_seconds(value: str | None) -> int | None:
+    """Parse hub.lease_seconds, None if it is missing.
+
+    Raises ValueError unless it is a positive integer.
+    """
+    if not value:
+        return None
+    lease_seconds = int(value)
+    if lease_seconds <= 0:
+        raise ValueError(f"Lease of {lease_seconds} seconds is not positive")
+    return lease_seconds
+
+
+@router.post("/websub", status_code=202)
+async def websub_hub(request: Request):
+    """Accept subscription requests for the built-in WebSub hub.
+
+    The subscriber's intent is verified in the background, as the WebSub
+    specification requires, so the request is only acknowledged here. The hub is
+    off unless websub_hub is set.
+    """
+    if not settings.websub_hub:
+        raise HTTPException(status_code=404, detail="Not Found")
+    form = await request.form()
+    mode = form.get("hub.mode")
+    topic = form.get("hub.topic", "")
+    callback = form.get("hub.callback", "")
+    if mode not in ("subscribe", "unsubscribe"):
+        raise HTTPException(status_code=400, detail="Unsupported hub.mode")
+    if parse_topic(topic) is None:
+        raise HTTPException(status_code=400, detail="Unknown hub.topic")
+    if urlparse(callback).scheme not in ("http", "https"):
+        raise HTTPException(status_code=400, detail="Invalid hub.callback")
+    if not settings.websub_allow_private_callbacks and _is_private_ip(callback):
+        raise HTTPException(status_code=400, detail="Non-public hub.callback")
+    try:
+        lease_seconds = _parse_lease_seconds(form.get("hub.lease_seconds"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid hub.lease_seconds")
+
+    logger.info(f"Received WebSub {mode} request of {callback} to {topic}")
+    request_subscription(
+        mode, topic, callback, lease_seconds, form.get("hub.secret") or None
+    )
+    return Response(status_code=202)
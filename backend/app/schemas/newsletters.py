@@ -1,3 +1,4 @@
+import datetime
 from typing import List
 
 from pydantic import BaseModel, ConfigDict, EmailStr, field_validator
@@ -60,5 +61,6 @@ class Newsletter(NewsletterBase):
     is_active: bool
     senders: List[Sender] = []
     entries_count: int
+    last_received_at: datetime.datetime | None = None
 
     model_config = ConfigDict(from_attributes=True)
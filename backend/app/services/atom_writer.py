@@ -0,0 +1,173 @@
+import datetime
+import re
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+"""Streaming Atom writer.
+
+Feeds are written fragment by fragment, so their size does not affect peak memory
+and the first bytes go out before the last entry is read. The output has the same
+structure and formatting as feedgen's atom_str(pretty=True).
+"""
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+FEED_HISTORY_NS = "http://purl.org/syndication/history/1.0"
+ATOM_FOOTER = "</feed>\n"
+
+# Characters that are not allowed in XML 1.0 documents.
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+_TEXT_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;"})
+_ATTRIBUTE_ESCAPES = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "\n": "&#10;",
+        "\t": "&#9;",
+        "\r": "&#13;",
+    }
+)
+
+
+@dataclass
+class AtomFeed:
+    """Feed-level metadata of an Atom document."""
+
+    id: str
+    title: str
+    subtitle: str
+    icon: str
+    logo: str
+    # (href, rel) pairs, in document order.
+    links: list[tuple[str, str]] = field(default_factory=list)
+    # Marks an RFC 5005 archive document.
+    archive: bool = False
+    updated: datetime.datetime | None = None
+
+
+@dataclass
+class AtomEntry:
+    """An Atom entry with HTML content."""
+
+    id: str
+    title: str
+    content: str
+    published: datetime.datetime
+
+
+def escape_text(value: str) -> str:
+    """Escape XML character data, dropping characters XML cannot carry."""
+    return _INVALID_XML_CHARS.sub("", value).translate(_TEXT_ESCAPES)
+
+
+def escape_attribute(value: str) -> str:
+    """Escape a double-quoted XML attribute value."""
+    return _INVALID_XML_CHARS.sub("", value).translate(_ATTRIBUTE_ESCAPES)
+
+
+def format_timestamp(value: datetime.datetime) -> str:
+    """Format an RFC 3339 timestamp, taking naive values to be UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.UTC)
+    return value.isoformat()
+
+
+def write_atom_header(feed: AtomFeed) -> str:
+    """Return everything of the document up to the first entry."""
+    namespaces = f'xmlns="{ATOM_NS}"'
+    if feed.archive:
+        namespaces = f'xmlns:fh="{FEED_HISTORY_NS}" {namespaces}'
+    updated = feed.updated or datetime.datetime.now(datetime.UTC)
+    parts = [
+        "<?xml version='1.0' encoding='UTF-8'?>\n",
+        f"<feed {namespaces}>\n",
+        f"  <id>{escape_text(feed.id)}</id>\n",
+        f"  <title>{escape_text(feed.title)}</title>\n",
+        f"  <updated>{format_timestamp(updated)}</updated>\n",
+    ]
+    parts.extend(
+        f'  <link href="{escape_attribute(href)}" rel="{escape_attribute(rel)}"/>\n'
+        for href, rel in feed.links
+    )
+    parts += [
+        "  <generator>LetterFeed</generator>\n",
+        f"  <icon>{escape_text(feed.icon)}</icon>\n",
+        f"  <logo>{escape_text(feed.logo)}</logo>\n",
+        f"  <subtitle>{escape_text(feed.subtitle)}</subtitle>\n",
+    ]
+    if feed.archive:
+        parts.append("  <fh:archive/>\n")
+    return "".join(parts)
+
+
+def write_atom_entry(entry: AtomEntry) -> str:
+    """Return the serialized Atom entry."""
+    published = format_timestamp(entry.published)
+    return (
+        "  <entry>\n"
+        f"    <id>{escape_text(entry.id)}</id>\n"
+        f"    <title>{escape_text(entry.title)}</title>\n"
+        f"    <updated>{published}</updated>\n"
+        f'    <content type="html">{escape_text(entry.content)}</content>\n'
+        f"    <published>{published}</published>\n"
+        "  </entry>\n"
+    )
+
+
+def feed_entry(
+    entry_id: str,
+    subject: str,
+    body: str,
+    received_at: datetime.datetime,
+    newsletter_name: str | None,
+    master: bool = False,
+) -> AtomEntry:
+    """Return the feed entry of a newsletter entry, titled for the master feed if set."""
+    return AtomEntry(
+        id=f"urn:letterfeed:entry:{entry_id}",
+        title=f"[{newsletter_name}] {subject}" if master else subject,
+        content=body,
+        published=received_at,
+    )
+
+
+def render_entry_fragments(
+    entry_id: str,
+    subject: str,
+    body: str,
+    received_at: datetime.datetime,
+    newsletter_name: str | None,
+) -> tuple[str, str]:
+    """Return the Atom entry of a newsletter entry in its own feed and the master feed."""
+    return tuple(
+        write_atom_entry(
+            feed_entry(entry_id, subject, body, received_at, newsletter_name, master)
+        )
+        for master in (False, True)
+    )
+
+
+def iter_document(
+    header: str,
+    fragments: Iterable[str],
+    footer: str,
+    batch_size: int = 64 * 1024,
+    separator: str = "",
+) -> Iterator[bytes]:
+    """Yield a UTF-8 encoded document in chunks of about batch_size bytes.
+
+    separator is written between consecutive fragments.
+    """
+    buffer = [header]
+    size = len(header)
+    for index, fragment in enumerate(fragments):
+        if separator and index:
+            buffer.append(separator)
+        buffer.append(fragment)
+        size += len(fragment)
+        if size >= batch_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    buffer.append(footer)
+    yield "".join(buffer).encode("utf-8")
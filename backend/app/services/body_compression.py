@@ -0,0 +1,102 @@
+import zstandard
+from sqlalchemy.orm import Session
+
+from app.core.body_store import get_body_store, train_dictionary
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.entries import Entry
+from app.models.newsletters import Newsletter
+
+"""Training of per-newsletter zstd dictionaries for the entry bodies.
+
+A dictionary is trained once a newsletter has enough entries. Its new bodies are
+then compressed with it, and its stored bodies are compressed again with it, a
+batch at a time. Earlier dictionaries stay in the store, since bodies shared with
+other newsletters may still need them.
+"""
+
+logger = get_logger(__name__)
+
+RECOMPRESS_BATCH_SIZE = 500
+
+
+def recompress_bodies(
+    db: Session, newsletter_id: str, dictionary_id: int | None
+) -> int:
+    """Compress the stored bodies of a newsletter again, with a dictionary if given.
+
+    Every batch is committed on its own. Returns the number of bodies.
+    """
+    store = get_body_store()
+    last_id, count = "", 0
+    while True:
+        rows = (
+            db.query(Entry.id, Entry.body_hash)
+            .filter(Entry.newsletter_id == newsletter_id, Entry.id > last_id)
+            .order_by(Entry.id)
+            .limit(RECOMPRESS_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            return count
+        bodies = store.get(db, {row.body_hash for row in rows if row.body_hash})
+        store.put(db, bodies, dictionary_id, replace=True)
+        db.commit()
+        count += len(bodies)
+        last_id = rows[-1].id
+
+
+def train_body_dictionary(db: Session, newsletter_id: str) -> int | None:
+    """Train a dictionary on the most recent bodies of a newsletter and use it.
+
+    Returns the id of the dictionary, or None if the bodies were not enough to
+    train one.
+    """
+    store = get_body_store()
+    hashes = {
+        key
+        for (key,) in db.query(Entry.body_hash)
+        .filter(Entry.newsletter_id == newsletter_id, Entry.body_hash.isnot(None))
+        .order_by(Entry.received_at.desc())
+        .limit(settings.body_dictionary_samples)
+    }
+    samples = list(store.get(db, hashes).values())
+    try:
+        dictionary = train_dictionary(samples, settings.body_dictionary_size)
+    except zstandard.ZstdError as e:
+        logger.warning(
+            f"Could not train a dictionary for newsletter_id={newsletter_id} "
+            f"on {len(samples)} bodies: {e}"
+        )
+        return None
+    dictionary_id = dictionary.dict_id()
+    store.add_dictionary(db, dictionary)
+    db.query(Newsletter).filter(Newsletter.id == newsletter_id).update(
+        {Newsletter.body_dictionary_id: dictionary_id}
+    )
+    db.commit()
+    count = recompress_bodies(db, newsletter_id, dictionary_id)
+    logger.info(
+        f"Trained dictionary {dictionary_id} for newsletter_id={newsletter_id} "
+        f"on {len(samples)} bodies and compressed {count} bodies with it"
+    )
+    return dictionary_id
+
+
+def train_body_dictionaries(db: Session, retrain: bool = False) -> list[str]:
+    """Train dictionaries for newsletters with enough entries.
+
+    Only newsletters without a dictionary are trained, unless retrain is set.
+    Returns the ids of the newsletters that got a new dictionary.
+    """
+    min_entries = settings.body_dictionary_min_entries
+    if min_entries <= 0:
+        return []
+    query = db.query(Newsletter.id).filter(Newsletter.entry_count >= min_entries)
+    if not retrain:
+        query = query.filter(Newsletter.body_dictionary_id.is_(None))
+    return [
+        newsletter_id
+        for (newsletter_id,) in query.all()
+        if train_body_dictionary(db, newsletter_id) is not None
+    ]
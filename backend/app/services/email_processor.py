@@ -1,25 +1,62 @@
 import email
 import imaplib
-import quopri
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from email.header import decode_header, make_header
 from email.message import Message
 
-import nh3
-from bs4 import BeautifulSoup
-from readability import Document
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.core.config import settings as env_settings
+from app.core.database import SessionLocal
+from app.core.imap import (
+    fetch_in_chunks,
+    format_uid_set,
+    has_capability,
+    imap_pool,
+)
 from app.core.logging import get_logger
-from app.crud.entries import create_entry, get_entry_by_message_id
-from app.crud.newsletters import create_newsletter, get_newsletters
+from app.core.process_pool import submit_to_process_pool
+from app.crud.entries import create_entries, get_existing_message_ids
+from app.crud.extraction_cache import (
+    evict_cached_extractions,
+    get_cached_extraction,
+    save_cached_extraction,
+)
+from app.crud.imap_folders import (
+    get_folder_state,
+    get_reset_generation,
+    save_folder_state,
+)
+from app.crud.newsletters import (
+    create_newsletter,
+    get_newsletters,
+    get_newsletters_by_ids,
+)
 from app.crud.settings import get_settings
 from app.models.newsletters import Newsletter
 from app.schemas.entries import EntryCreate
 from app.schemas.newsletters import NewsletterCreate
 from app.schemas.settings import Settings
+from app.services.feed_export import export_feeds
+from app.services.html_extraction import (
+    extract_and_clean_html,
+    extraction_cache_key,
+)
+from app.services.websub import publish
 
 logger = get_logger(__name__)
 
+HEADER_FETCH_ITEMS = "(BODY.PEEK[HEADER.FIELDS (FROM MESSAGE-ID SUBJECT DATE)])"
+BODY_FETCH_ITEMS = "(BODY.PEEK[])"
+
+# Serializes runs on the same folder, e.g. a scheduled run and an IDLE notification.
+_folder_locks: dict[str, threading.Lock] = {}
+_folder_locks_guard = threading.Lock()
+
 
 def _is_configured(settings: Settings | None) -> bool:
     """Check if IMAP settings are configured."""
@@ -37,32 +74,119 @@ def _is_configured(settings: Settings | None) -> bool:
 def _connect_to_imap(
     settings: Settings, search_folder: str
 ) -> imaplib.IMAP4_SSL | None:
-    """Connect to the IMAP server and select the mailbox."""
+    """Check out a pooled IMAP session and select the mailbox.
+
+    The session must be handed back with imap_pool.release().
+    """
     try:
-        logger.info(f"Connecting to IMAP server: {settings.imap_server}")
-        mail = imaplib.IMAP4_SSL(settings.imap_server)
-        mail.login(settings.imap_username, settings.imap_password)
-        status, messages = mail.select(search_folder)
-        if status != "OK":
-            logger.error(
-                f"Failed to select mailbox: {search_folder}, status: {status}, messages: {messages}"
-            )
-            mail.logout()
-            return None
-        logger.info(f"Selected mailbox: {search_folder}")
-        return mail
+        mail = imap_pool.acquire(
+            settings.imap_server, settings.imap_username, settings.imap_password
+        )
     except Exception as e:
         logger.error(f"Failed to connect to IMAP server: {e}", exc_info=True)
         return None
+    try:
+        status, messages = mail.select(search_folder)
+    except Exception as e:
+        logger.error(f"Failed to select mailbox {search_folder}: {e}", exc_info=True)
+        imap_pool.release(mail, discard=True)
+        return None
+    if status != "OK":
+        logger.error(
+            f"Failed to select mailbox: {search_folder}, status: {status}, messages: {messages}"
+        )
+        imap_pool.release(mail)
+        return None
+    logger.info(f"Selected mailbox: {search_folder}")
+    return mail
+
+
+@dataclass
+class FolderResult:
+    """Summary of a single folder run."""
+
+    folder: str
+    new_entries: int = 0
+    duration: float = 0.0
+    error: str | None = None
+    timed_out: bool = False
+
+
+@dataclass
+class _PendingActions:
+    """IMAP flag and move operations collected while processing a folder."""
+
+    mark_as_read: set[int] = field(default_factory=set)
+    moves: dict[str, set[int]] = field(default_factory=dict)
+
+
+def _chunked(uids: set[int], size: int) -> list[list[int]]:
+    """Split UIDs into sorted chunks of at most size UIDs."""
+    ordered = sorted(uids)
+    size = max(size, 1)
+    return [ordered[i : i + size] for i in range(0, len(ordered), size)]
+
+
+def _apply_pending_actions(
+    mail: imaplib.IMAP4_SSL, actions: _PendingActions, search_folder: str
+) -> None:
+    """Apply the collected flag and move operations with as few commands as possible.
+
+    Moves use UID MOVE (RFC 6851) if the server supports it. Otherwise messages are
+    copied and flagged as deleted, and with UIDPLUS only those UIDs are expunged.
+    """
+    batch_size = env_settings.imap_fetch_batch_size
+    for chunk in _chunked(actions.mark_as_read, batch_size):
+        uid_set = format_uid_set(chunk)
+        logger.debug(f"Marking emails with uids={uid_set} as read")
+        mail.uid("STORE", uid_set, "+FLAGS", "\\Seen")
+
+    if not actions.moves:
+        return
+
+    use_move = has_capability(mail, "MOVE")
+    use_uid_expunge = has_capability(mail, "UIDPLUS")
+    for move_folder, uids in actions.moves.items():
+        for chunk in _chunked(uids, batch_size):
+            uid_set = format_uid_set(chunk)
+            logger.debug(f"Moving emails with uids={uid_set} to {move_folder}")
+            if use_move:
+                mail.uid("MOVE", uid_set, move_folder)
+                continue
+            mail.uid("COPY", uid_set, move_folder)
+            mail.uid("STORE", uid_set, "+FLAGS", "\\Deleted")
+            if use_uid_expunge:
+                mail.uid("EXPUNGE", uid_set)
+
+    if not use_move and not use_uid_expunge:
+        # Without UIDPLUS there is no way to expunge only our own messages.
+        logger.info(f"Expunging deleted emails from '{search_folder}'")
+        mail.expunge()
+
+
+def _get_account_key(settings: Settings) -> str:
+    """Return the key under which folder sync states of the account are stored."""
+    return f"{settings.imap_username}@{settings.imap_server}"
+
+
+def _get_select_response_code(mail: imaplib.IMAP4_SSL, code: str) -> int | None:
+    """Return a numeric response code (e.g. UIDVALIDITY) reported by the last SELECT."""
+    try:
+        _, data = mail.response(code)
+        return int(data[0])
+    except (TypeError, ValueError, IndexError):
+        return None
 
 
-def _fetch_unread_email_ids(mail: imaplib.IMAP4_SSL) -> list[str]:
-    """Fetch IDs of unread emails."""
-    status, messages = mail.search(None, "(UNSEEN)")
+def _fetch_new_email_uids(mail: imaplib.IMAP4_SSL, last_uid: int) -> list[int]:
+    """Fetch UIDs of unread emails, limited to those above last_uid if it is set."""
+    criteria = f"(UNSEEN UID {last_uid + 1}:*)" if last_uid else "(UNSEEN)"
+    status, messages = mail.uid("SEARCH", None, criteria)
     if status != "OK":
         logger.error(f"Failed to search for unseen emails, status: {status}")
         return []
-    return messages[0].split()
+    # "n:*" always matches the highest UID in the mailbox, even if it is below n.
+    return sorted(uid for uid in map(int, messages[0].split()) if uid > last_uid)
 
 
 def _get_email_body(msg: Message) -> str:
@@ -94,52 +218,41 @@ def _get_email_body(msg: Message) -> str:
     return html_body or text_body
 
 
-def _extract_and_clean_html(raw_html_content: str) -> dict[str, str]:
-    """Decode, extract, and sanitize newsletter HTML."""
-    try:
-        decoded_bytes = quopri.decodestring(raw_html_content.encode("utf-8"))
-        clean_html_str = decoded_bytes.decode("utf-8", "ignore")
-    except Exception:
-        # If quopri fails, assume it's already decoded.
-        clean_html_str = raw_html_content
-
-    doc = Document(clean_html_str)
-    extracted_body = doc.summary(html_partial=True)
-
-    ALLOWED_TAGS = {
-        "p",
-        "strong",
-        "em",
-        "u",
-        "h3",
-        "h4",
-        "ul",
-        "ol",
-        "li",
-        "a",
-        "img",
-        "br",
-        "div",
-        "span",
-        "figure",
-        "figcaption",
-    }
-    ALLOWED_ATTRIBUTES = {
-        "a": {"href", "title"},
-        "img": {"src", "alt", "width", "height"},
-        "*": {"style"},
-    }
-    cleaned_body = nh3.clean(
-        extracted_body, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES
-    )
+@dataclass
+class _PendingExtraction:
+    """A content extraction that was found in the cache or submitted to the pool."""
+
+    cache_key: str
+    future: Future
+    cached: bool = False
+
+
+def _submit_extraction(db: Session, raw_html_content: str) -> _PendingExtraction:
+    """Look up newsletter HTML in the extraction cache or submit it to the pool."""
+    key = extraction_cache_key(raw_html_content)
+    if env_settings.extraction_cache_size > 0:
+        cached = get_cached_extraction(db, key)
+        if cached:
+            future: Future = Future()
+            future.set_result({"title": cached.title, "body": cached.body})
+            return _PendingExtraction(key, future, cached=True)
+    future = submit_to_process_pool(extract_and_clean_html, raw_html_content)
+    return _PendingExtraction(key, future)
 
-    title = doc.title()
-    if not title or title == "no-title":
-        soup = BeautifulSoup(cleaned_body, "html.parser")
-        first_headline = soup.find(["h1", "h2", "h3"])
-        title = first_headline.get_text(strip=True) if first_headline else "Newsletter"
 
-    return {"title": title, "body": cleaned_body}
+def _collect_extraction(db: Session, pending: _PendingExtraction) -> dict[str, str]:
+    """Wait for an extraction and cache its result."""
+    result = pending.future.result()
+    if not pending.cached and env_settings.extraction_cache_size > 0:
+        # Committed with the entry, the cache is trimmed once per run.
+        save_cached_extraction(db, pending.cache_key, result["title"], result["body"])
+        pending.cached = True
+    return result
+
+
+def _extract_and_clean_html(db: Session, raw_html_content: str) -> dict[str, str]:
+    """Decode, extract, and sanitize newsletter HTML, reusing cached results."""
+    return _collect_extraction(db, _submit_extraction(db, raw_html_content))
 
 
 def _auto_add_newsletter(
@@ -160,42 +273,99 @@ def _auto_add_newsletter(
     return create_newsletter(db, new_newsletter_schema)
 
 
-def _process_single_email(
-    num: str,
+def _fetch_email_headers(
+    mail: imaplib.IMAP4_SSL, uids: list[int]
+) -> dict[int, Message]:
+    """Fetch the headers needed for filtering of several emails in batches."""
+    headers = {}
+    for chunk in fetch_in_chunks(
+        mail, uids, HEADER_FETCH_ITEMS, env_settings.imap_fetch_batch_size
+    ):
+        for uid, header_bytes in chunk.items():
+            headers[uid] = email.message_from_bytes(header_bytes)
+    return headers
+
+
+def _select_newsletter_emails(
+    uids: list[int],
     mail: imaplib.IMAP4_SSL,
     db: Session,
     sender_map: dict[str, Newsletter],
     settings: Settings,
-) -> None:
-    """Process a single email message."""
-    status, data = mail.fetch(num, "(BODY.PEEK[])")
-    if status != "OK":
-        logger.warning(f"Failed to fetch email with id={num}")
-        return
+) -> tuple[list[tuple[int, Newsletter]], set[int]]:
+    """Select the emails that belong to a newsletter and have not been processed yet.
+
+    Only the headers are downloaded here, so the bodies of unrelated or already
+    processed emails never leave the server. Returns the selected emails and the
+    UIDs whose headers could not be fetched.
+    """
+    headers = _fetch_email_headers(mail, uids)
+    unfetched = set()
+    seen_message_ids = get_existing_message_ids(
+        db, [msg["Message-ID"] for msg in headers.values() if msg["Message-ID"]]
+    )
+    selected = []
+    for uid in uids:
+        msg = headers.get(uid)
+        if msg is None:
+            logger.warning(f"Failed to fetch headers of email with uid={uid}")
+            unfetched.add(uid)
+            continue
 
-    msg = email.message_from_bytes(data[0][1])
-    sender = email.utils.parseaddr(msg["From"])[1]
-    message_id = msg.get("Message-ID")
+        sender = email.utils.parseaddr(msg["From"])[1]
+        message_id = msg.get("Message-ID")
 
-    if not message_id:
-        logger.warning(
-            f"Email from {sender} with subject '{msg['Subject']}' has no Message-ID, skipping."
-        )
-        return
+        if not message_id:
+            logger.warning(
+                f"Email from {sender} with subject '{msg['Subject']}' has no Message-ID, skipping."
+            )
+            continue
 
-    if get_entry_by_message_id(db, message_id):
-        logger.info(f"Email with Message-ID {message_id} already processed, skipping.")
-        return
+        if message_id in seen_message_ids:
+            logger.info(
+                f"Email with Message-ID {message_id} already processed, skipping."
+            )
+            continue
 
-    logger.debug(f"Processing email from {sender} with subject '{msg['Subject']}'")
+        newsletter = sender_map.get(sender)
+        if not newsletter and settings.auto_add_new_senders:
+            newsletter = _auto_add_newsletter(db, sender, msg, settings)
+            sender_map[sender] = newsletter
 
-    newsletter = sender_map.get(sender)
-    if not newsletter and settings.auto_add_new_senders:
-        newsletter = _auto_add_newsletter(db, sender, msg, settings)
-        sender_map[sender] = newsletter
+        if not newsletter:
+            continue
 
-    if not newsletter:
-        return
+        seen_message_ids.add(message_id)
+        selected.append((uid, newsletter))
+    return selected, unfetched
+
+
+@dataclass
+class _PreparedEntry:
+    """An entry built from a fetched email, waiting to be stored."""
+
+    uid: int
+    newsletter: Newsletter
+    sender: str
+    entry: EntryCreate
+
+
+def _prepare_entry(
+    uid: int,
+    raw_email: bytes,
+    db: Session,
+    newsletter: Newsletter,
+    extraction: _PendingExtraction | None = None,
+) -> _PreparedEntry:
+    """Build the entry for a fetched email message that belongs to the given newsletter.
+
+    extraction is the pending result of an already submitted content extraction.
+    """
+    msg = email.message_from_bytes(raw_email)
+    sender = email.utils.parseaddr(msg["From"])[1]
+    message_id = msg.get("Message-ID")
+
+    logger.debug(f"Processing email from {sender} with subject '{msg['Subject']}'")
 
     subject = str(make_header(decode_header(msg["Subject"])))
     body = _get_email_body(msg)
@@ -203,7 +373,10 @@ def _process_single_email(
     received_at = email.utils.parsedate_to_datetime(date_str) if date_str else None
 
     if newsletter.extract_content:
-        cleaned_data = _extract_and_clean_html(body)
+        if extraction is not None:
+            cleaned_data = _collect_extraction(db, extraction)
+        else:
+            cleaned_data = _extract_and_clean_html(db, body)
         # The subject from the email itself is often better than what readability extracts
         # so we only override the body.
         body = cleaned_data["body"]
@@ -211,40 +384,276 @@ def _process_single_email(
     entry_schema = EntryCreate(
         subject=subject, body=body, message_id=message_id, received_at=received_at
     )
-    new_entry = create_entry(db, entry_schema, newsletter.id)
+    return _PreparedEntry(uid, newsletter, sender, entry_schema)
 
-    if not new_entry:
-        logger.error(
-            f"Failed to create entry for newsletter '{newsletter.name}' from sender {sender}, email will not be marked as read or moved."
-        )
-        return
 
+def _record_actions(
+    prepared: _PreparedEntry, settings: Settings, actions: _PendingActions
+) -> None:
+    """Record the flag and move operations for an email whose entry was stored."""
     logger.info(
-        f"Created new entry for newsletter '{newsletter.name}' from sender {sender}"
+        f"Created new entry for newsletter '{prepared.newsletter.name}' from sender {prepared.sender}"
     )
 
     if settings.mark_as_read:
-        logger.debug(f"Marking email with id={num} as read")
-        mail.store(num, "+FLAGS", "\\Seen")
+        actions.mark_as_read.add(prepared.uid)
 
-    move_folder = newsletter.move_to_folder or settings.move_to_folder
+    move_folder = prepared.newsletter.move_to_folder or settings.move_to_folder
     if move_folder:
-        logger.debug(f"Moving email with id={num} to {move_folder}")
-        mail.copy(num, move_folder)
-        mail.store(num, "+FLAGS", "\\Deleted")
+        actions.moves.setdefault(move_folder, set()).add(prepared.uid)
 
 
-def process_emails(db: Session) -> None:
-    """Process unread emails, add them as entries, and manage newsletters."""
-    logger.info("Starting email processing...")
-    settings = get_settings(db, with_password=True)
-    if not _is_configured(settings):
-        return
+def _store_entries(
+    db: Session,
+    batch: list[_PreparedEntry],
+    settings: Settings,
+    actions: _PendingActions,
+) -> int:
+    """Store a batch of entries with a single commit and return how many were stored.
+
+    Flags and moves are only recorded for emails whose entry has been committed, so
+    an email that could not be stored stays untouched in its folder. If the batch
+    conflicts with entries stored concurrently, e.g. by an IDLE listener, it is
+    stored again without them. Other integrity errors are raised.
+    """
+    stored = batch
+    while stored:
+        try:
+            create_entries(db, [(p.entry, p.newsletter.id) for p in stored])
+            break
+        except IntegrityError:
+            db.rollback()
+            existing = get_existing_message_ids(
+                db, [prepared.entry.message_id for prepared in stored]
+            )
+            if not existing:
+                raise
+            for message_id in existing:
+                logger.info(
+                    f"Email with Message-ID {message_id} was stored concurrently, skipping."
+                )
+            stored = [p for p in stored if p.entry.message_id not in existing]
+    if not stored:
+        return 0
+
+    for prepared in stored:
+        _record_actions(prepared, settings, actions)
+    publish(list({prepared.newsletter.id for prepared in stored}))
+    return len(stored)
+
+
+def _submit_extractions(
+    db: Session,
+    raw_emails: dict[int, bytes],
+    newsletter_by_uid: dict[int, Newsletter],
+) -> dict[int, _PendingExtraction]:
+    """Submit the bodies of emails whose newsletter extracts content.
+
+    Identical bodies, e.g. the same issue sent to several aliases, are extracted once.
+    """
+    extractions = {}
+    pending_by_body: dict[str, _PendingExtraction] = {}
+    for uid, raw_email in raw_emails.items():
+        if newsletter_by_uid[uid].extract_content:
+            body = _get_email_body(email.message_from_bytes(raw_email))
+            if body not in pending_by_body:
+                pending_by_body[body] = _submit_extraction(db, body)
+            extractions[uid] = pending_by_body[body]
+    return extractions
+
+
+def _get_folder_lock(search_folder: str) -> threading.Lock:
+    """Return the lock that guards processing of the given folder."""
+    with _folder_locks_guard:
+        return _folder_locks.setdefault(search_folder, threading.Lock())
+
+
+def _process_folder(
+    db: Session,
+    settings: Settings,
+    search_folder: str,
+    newsletters_in_folder: list[Newsletter],
+    generation: int,
+) -> FolderResult:
+    """Process new emails in a single folder, resuming from its UID checkpoint.
+
+    The checkpoint is not saved if the folder states were reset after generation
+    was read, since the newsletters may have changed since they were loaded.
+    """
+    started = time.monotonic()
+    lock = _get_folder_lock(search_folder)
+    # A run that hung in an earlier cycle may still hold the lock.
+    if not lock.acquire(timeout=env_settings.imap_folder_timeout):
+        logger.warning(f"Folder '{search_folder}' is still being processed, skipping.")
+        return FolderResult(search_folder, error="folder is busy", timed_out=True)
+    try:
+        result = _process_folder_locked(
+            db, settings, search_folder, newsletters_in_folder, generation
+        )
+    finally:
+        lock.release()
+    result.duration = time.monotonic() - started
+    return result
+
 
+def _process_folder_locked(
+    db: Session,
+    settings: Settings,
+    search_folder: str,
+    newsletters_in_folder: list[Newsletter],
+    generation: int,
+) -> FolderResult:
+    """Process new emails in a folder while holding its lock."""
+    logger.info(
+        f"Processing folder '{search_folder}' for {len(newsletters_in_folder)} newsletters."
+    )
+    sender_map = {
+        sender.email: nl for nl in newsletters_in_folder for sender in nl.senders
+    }
+
+    result = FolderResult(search_folder)
+    mail = _connect_to_imap(settings, search_folder)
+    if not mail:
+        logger.warning(f"Skipping folder '{search_folder}' due to connection issue.")
+        result.error = "could not connect or select the folder"
+        return result
+
+    # Only UIDs above the checkpoint are searched, unless the server reports a new
+    # UIDVALIDITY, in which case all UIDs may have changed and we rescan the folder.
+    account = _get_account_key(settings)
+    uidvalidity = _get_select_response_code(mail, "UIDVALIDITY")
+    uidnext = _get_select_response_code(mail, "UIDNEXT")
+    folder_state = get_folder_state(db, account, search_folder)
+    last_uid = 0
+    if folder_state and folder_state.uidvalidity == uidvalidity:
+        last_uid = folder_state.last_uid
+    elif folder_state:
+        logger.info(
+            f"UIDVALIDITY of folder '{search_folder}' changed from "
+            f"{folder_state.uidvalidity} to {uidvalidity}, performing a full rescan."
+        )
+    checkpoint = last_uid
+    actions = _PendingActions()
+    connection_broken = False
+    # UIDs whose headers or body could not be fetched, to be tried again next time.
+    unfetched: set[int] = set()
+    newsletter_by_uid: dict[int, Newsletter] = {}
+    fetched: set[int] = set()
+
+    try:
+        email_uids = _fetch_new_email_uids(mail, last_uid)
+        logger.info(
+            f"Found {len(email_uids)} new unseen emails in folder '{search_folder}'."
+        )
+        selected_emails, unfetched = _select_newsletter_emails(
+            email_uids, mail, db, sender_map, settings
+        )
+        logger.info(
+            f"Selected {len(selected_emails)} newsletter emails in folder '{search_folder}'."
+        )
+        newsletter_by_uid = dict(selected_emails)
+        for chunk in fetch_in_chunks(
+            mail,
+            list(newsletter_by_uid),
+            BODY_FETCH_ITEMS,
+            env_settings.imap_fetch_batch_size,
+        ):
+            fetched.update(chunk)
+            # Extract the whole chunk in parallel while entries are prepared in order.
+            extractions = _submit_extractions(db, chunk, newsletter_by_uid)
+            batch: list[_PreparedEntry] = []
+            try:
+                for uid in sorted(chunk):
+                    batch.append(
+                        _prepare_entry(
+                            uid,
+                            chunk[uid],
+                            db,
+                            newsletter_by_uid[uid],
+                            extractions.get(uid),
+                        )
+                    )
+            except Exception:
+                # Entries prepared before a failure are still stored, but a failure
+                # to store them must not hide the error that is reported.
+                try:
+                    result.new_entries += _store_entries(db, batch, settings, actions)
+                    if batch:
+                        checkpoint = max(checkpoint, batch[-1].uid)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(
+                        f"Failed to store the entries prepared in folder "
+                        f"'{search_folder}' before an error: {e}",
+                        exc_info=True,
+                    )
+                raise
+            result.new_entries += _store_entries(db, batch, settings, actions)
+            if batch:
+                # Emails below this UID were either stored or filtered out.
+                checkpoint = max(checkpoint, batch[-1].uid)
+        if email_uids:
+            checkpoint = max(checkpoint, email_uids[-1])
+        # Everything below UIDNEXT existed at SELECT time and has been searched.
+        if uidnext:
+            checkpoint = max(checkpoint, uidnext - 1)
+
+    except Exception as e:
+        connection_broken = isinstance(e, (imaplib.IMAP4.abort, OSError))
+        result.error = str(e)
+        logger.error(
+            f"Error processing emails in folder '{search_folder}': {e}",
+            exc_info=True,
+        )
+    finally:
+        # Entries created before a failure still get their emails flagged and moved.
+        try:
+            if not connection_broken:
+                _apply_pending_actions(mail, actions, search_folder)
+        except Exception as e:
+            connection_broken = isinstance(e, (imaplib.IMAP4.abort, OSError))
+            logger.error(
+                f"Failed to flag or move emails in folder '{search_folder}': {e}",
+                exc_info=True,
+            )
+        # Chunks are fetched in UID order, so bodies missing below the checkpoint
+        # were requested but not returned.
+        unfetched.update(
+            uid for uid in newsletter_by_uid if uid <= checkpoint and uid not in fetched
+        )
+        if unfetched and checkpoint >= min(unfetched):
+            logger.warning(
+                f"Keeping the checkpoint of folder '{search_folder}' below "
+                f"uid={min(unfetched)}, which could not be fetched."
+            )
+            checkpoint = min(unfetched) - 1
+        # Persist progress even after a failure, so processed UIDs are not fetched again.
+        state_changed = (
+            not folder_state
+            or folder_state.uidvalidity != uidvalidity
+            or checkpoint != last_uid
+        )
+        if uidvalidity is not None and state_changed:
+            try:
+                save_folder_state(
+                    db, account, search_folder, uidvalidity, checkpoint, generation
+                )
+            except Exception as e:
+                logger.error(
+                    f"Failed to save sync state of folder '{search_folder}': {e}",
+                    exc_info=True,
+                )
+        imap_pool.release(mail, discard=connection_broken)
+    return result
+
+
+def _group_newsletters_by_folder(
+    db: Session, settings: Settings
+) -> dict[str, list[Newsletter]]:
+    """Group all newsletters by the folder in which their emails are searched."""
     all_newsletters = get_newsletters(db)
     logger.info(f"Processing emails for {len(all_newsletters)} newsletters.")
 
-    # Group newsletters by search folder
     folder_groups: dict[str, list[Newsletter]] = {}
     for nl in all_newsletters:
         folder = nl.search_folder or settings.search_folder
@@ -256,46 +665,165 @@ def process_emails(db: Session) -> None:
     if settings.auto_add_new_senders and settings.search_folder not in folder_groups:
         folder_groups[settings.search_folder] = []
 
-    for search_folder, newsletters_in_folder in folder_groups.items():
-        logger.info(
-            f"Processing folder '{search_folder}' for {len(newsletters_in_folder)} newsletters."
+    return folder_groups
+
+
+def get_search_folders(db: Session) -> list[str]:
+    """Return the folders that are searched for newsletter emails."""
+    settings = get_settings(db, with_password=True)
+    if not _is_configured(settings):
+        return []
+    return list(_group_newsletters_by_folder(db, settings))
+
+
+def process_folder_emails(db: Session, search_folder: str) -> None:
+    """Process new emails in a single folder, e.g. after an IDLE notification."""
+    settings = get_settings(db, with_password=True)
+    if not _is_configured(settings):
+        return
+
+    generation = get_reset_generation()
+    folder_groups = _group_newsletters_by_folder(db, settings)
+    if search_folder not in folder_groups:
+        logger.info(f"Folder '{search_folder}' is not watched, skipping.")
+        return
+    _process_folder(
+        db, settings, search_folder, folder_groups[search_folder], generation
+    )
+    _export_feeds(db)
+
+
+def _process_folder_in_worker(
+    settings: Settings, search_folder: str, newsletter_ids: list[str], generation: int
+) -> FolderResult:
+    """Process a folder in a worker thread with its own database session."""
+    try:
+        with SessionLocal() as db:
+            newsletters = get_newsletters_by_ids(db, newsletter_ids)
+            return _process_folder(db, settings, search_folder, newsletters, generation)
+    except Exception as e:
+        logger.error(f"Error processing folder '{search_folder}': {e}", exc_info=True)
+        return FolderResult(search_folder, error=str(e))
+
+
+def _process_folders_concurrently(
+    settings: Settings, folder_groups: dict[str, list[Newsletter]], generation: int
+) -> list[FolderResult]:
+    """Process folder groups on a bounded pool of worker threads.
+
+    Each worker checks out its own IMAP session. Folders still running after
+    imap_folder_timeout seconds are reported as timed out and left to finish in
+    the background, where their folder lock keeps the next cycle from overlapping.
+    """
+    timeout = env_settings.imap_folder_timeout
+    started: dict[str, float] = {}
+
+    def run(search_folder: str, newsletter_ids: list[str]) -> FolderResult:
+        started[search_folder] = time.monotonic()
+        return _process_folder_in_worker(
+            settings, search_folder, newsletter_ids, generation
         )
-        sender_map = {
-            sender.email: nl for nl in newsletters_in_folder for sender in nl.senders
-        }
 
-        mail = _connect_to_imap(settings, search_folder)
-        if not mail:
-            logger.warning(
-                f"Skipping folder '{search_folder}' due to connection issue."
+    executor = ThreadPoolExecutor(
+        max_workers=min(env_settings.imap_max_workers, len(folder_groups)),
+        thread_name_prefix="imap-folder",
+    )
+    futures = {
+        executor.submit(run, folder, [nl.id for nl in newsletters]): folder
+        for folder, newsletters in folder_groups.items()
+    }
+    results: dict[str, FolderResult] = {}
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            for future in list(pending):
+                folder = futures[future]
+                if folder in started and now - started[folder] > timeout:
+                    logger.error(
+                        f"Processing folder '{folder}' timed out after {timeout}s."
+                    )
+                    pending.discard(future)
+                    results[folder] = FolderResult(
+                        folder,
+                        duration=now - started[folder],
+                        error=f"timed out after {timeout}s",
+                        timed_out=True,
+                    )
+            deadline = min(
+                (
+                    started[futures[f]] + timeout
+                    for f in pending
+                    if futures[f] in started
+                ),
+                default=now + 1,
             )
-            continue
+            done, pending = wait(
+                pending,
+                timeout=max(deadline - now, 0) + 0.01,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                results[futures[future]] = future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [results[folder] for folder in folder_groups]
 
-        try:
-            email_ids = _fetch_unread_email_ids(mail)
-            logger.info(
-                f"Found {len(email_ids)} unseen emails in folder '{search_folder}'."
+
+def _export_feeds(db: Session) -> None:
+    """Export the feeds that changed, without failing the processing run."""
+    try:
+        export_feeds(db)
+    except Exception as e:
+        logger.error(f"Error exporting static feeds: {e}", exc_info=True)
+
+
+def _log_summary(results: list[FolderResult]) -> None:
+    """Log the outcome of every folder and a total for the cycle."""
+    for result in results:
+        if result.error:
+            logger.warning(
+                f"Folder '{result.folder}' failed after {result.duration:.1f}s: "
+                f"{result.error}"
             )
-            for num in email_ids:
-                _process_single_email(num, mail, db, sender_map, settings)
-
-            # Expunge logic needs to be carefully considered.
-            # If any newsletter in this folder group has a move_to_folder, we expunge.
-            # This is an approximation. A more robust solution might require per-email expunge.
-            should_expunge = any(
-                nl.move_to_folder or settings.move_to_folder
-                for nl in newsletters_in_folder
+        else:
+            logger.info(
+                f"Folder '{result.folder}': {result.new_entries} new entries "
+                f"in {result.duration:.1f}s."
             )
-            if should_expunge:
-                logger.info(f"Expunging deleted emails from '{search_folder}'")
-                mail.expunge()
+    failed = sum(1 for result in results if result.error)
+    logger.info(
+        f"Processed {len(results)} folders with "
+        f"{sum(result.new_entries for result in results)} new entries, "
+        f"{failed} failed."
+    )
 
-        except Exception as e:
-            logger.error(
-                f"Error processing emails in folder '{search_folder}': {e}",
-                exc_info=True,
+
+def process_emails(db: Session) -> list[FolderResult]:
+    """Process unread emails, add them as entries, and manage newsletters.
+
+    Folder groups are processed in parallel, and a summary per folder is returned.
+    """
+    logger.info("Starting email processing...")
+    settings = get_settings(db, with_password=True)
+    if not _is_configured(settings):
+        return []
+
+    generation = get_reset_generation()
+    folder_groups = _group_newsletters_by_folder(db, settings)
+    if len(folder_groups) > 1 and env_settings.imap_max_workers > 1:
+        results = _process_folders_concurrently(settings, folder_groups, generation)
+    else:
+        results = [
+            _process_folder(
+                db, settings, search_folder, newsletters_in_folder, generation
             )
-        finally:
-            mail.logout()
+            for search_folder, newsletters_in_folder in folder_groups.items()
+        ]
 
+    _log_summary(results)
+    if env_settings.extraction_cache_size > 0:
+        evict_cached_extractions(db, env_settings.extraction_cache_size)
+    _export_feeds(db)
     logger.info("Email processing finished successfully.")
+    return results
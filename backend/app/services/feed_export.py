@@ -0,0 +1,199 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import ExitStack
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from app.core.compression import ENCODING_SUFFIXES, SUPPORTED_ENCODINGS, compressor
+from app.core.config import settings
+from app.core.feed_cache import MASTER_FEED_KEY
+from app.core.logging import get_logger
+from app.crud.newsletters import get_all_newsletters
+from app.services.feed_generator import (
+    FEED_FORMATS,
+    get_feed_validators,
+    get_master_feed_validators,
+    iter_master_feed,
+    iter_newsletter_feed,
+)
+
+"""Static export of feeds, to be served by a static file server or a CDN.
+
+Feeds are written to <feed_export_dir>/feeds/<identifier>, plus .rss and .json
+variants, matching the URLs of the feed endpoints, each with precompressed .gz and
+.br files next to it. Only feeds whose ETag changed since they were last exported
+are rewritten, and every file is replaced atomically. The ETags of the exported
+feeds are kept in <feed_export_dir>/.etags.json, so a restart does not rewrite them.
+
+Archive pages are not exported, requests with a before parameter still need to be
+passed on to the backend.
+"""
+
+logger = get_logger(__name__)
+
+ETAGS_FILE = ".etags.json"
+
+_export_lock = threading.Lock()
+
+
+def _temp_file(directory: Path, name: str):
+    """Open a temporary file that can be renamed to name in directory."""
+    fd, path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    # mkstemp creates files only the owner can read.
+    os.chmod(path, 0o644)
+    return os.fdopen(fd, "wb"), Path(path)
+
+
+def _write_feed(directory: Path, names: list[str], chunks: Iterable[bytes]) -> None:
+    """Write a feed and its compressed variants under every name, atomically.
+
+    The feed is streamed into all variants at once, so it is generated only once
+    and never held in memory.
+    """
+    suffixes = [""] + [ENCODING_SUFFIXES[encoding] for encoding in SUPPORTED_ENCODINGS]
+    temp_paths: list[Path] = []
+    try:
+        with ExitStack() as stack:
+            files = {}
+            for suffix in suffixes:
+                file, temp_path = _temp_file(directory, names[0] + suffix)
+                temp_paths.append(temp_path)
+                files[suffix] = stack.enter_context(file)
+            compressors = {
+                ENCODING_SUFFIXES[encoding]: compressor(encoding)
+                for encoding in SUPPORTED_ENCODINGS
+            }
+            for chunk in chunks:
+                files[""].write(chunk)
+                for suffix, (compress, _) in compressors.items():
+                    files[suffix].write(compress(chunk))
+            for suffix, (_, finish) in compressors.items():
+                files[suffix].write(finish())
+
+        renames = [
+            (temp_path, directory / f"{names[0]}{suffix}")
+            for suffix, temp_path in zip(suffixes, temp_paths)
+        ]
+        # Aliases get copies rather than links, which not every target supports.
+        for name in names[1:]:
+            for suffix, source in zip(suffixes, list(temp_paths)):
+                file, temp_path = _temp_file(directory, name + suffix)
+                file.close()
+                temp_paths.append(temp_path)
+                shutil.copyfile(source, temp_path)
+                renames.append((temp_path, directory / f"{name}{suffix}"))
+        for temp_path, path in renames:
+            os.replace(temp_path, path)
+    finally:
+        for temp_path in temp_paths:
+            temp_path.unlink(missing_ok=True)
+
+
+def _load_etags(path: Path) -> dict[str, str]:
+    """Load the ETags of the exported feeds by file name."""
+    try:
+        etags = json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable feed export state {path}: {e}")
+        return {}
+    return etags if isinstance(etags, dict) else {}
+
+
+def _save_etags(path: Path, etags: dict[str, str]) -> None:
+    """Replace the ETags of the exported feeds atomically."""
+    file, temp_path = _temp_file(path.parent, path.name)
+    try:
+        with file:
+            file.write(json.dumps(etags, sort_keys=True).encode())
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def _remove_stale_files(directory: Path, identifiers: set[str]) -> None:
+    """Remove the files of feeds that no longer exist, e.g. after a slug change."""
+    suffixes = tuple(ENCODING_SUFFIXES.values())
+    for path in directory.iterdir():
+        if path.name.startswith("."):
+            continue
+        name = path.name
+        if name.endswith(suffixes):
+            name = name.rsplit(".", 1)[0]
+        if name not in identifiers:
+            logger.info(f"Removing stale exported feed {path}")
+            path.unlink(missing_ok=True)
+
+
+def export_feeds(db: Session) -> list[str]:
+    """Write every changed feed to the export directory, if one is configured.
+
+    Returns the identifiers of the feeds that were written.
+    """
+    if not settings.feed_export_dir:
+        return []
+    directory = Path(settings.feed_export_dir) / "feeds"
+    directory.mkdir(parents=True, exist_ok=True)
+    etags_path = directory.parent / ETAGS_FILE
+
+    with _export_lock:
+        exported = _load_etags(etags_path)
+        previous = dict(exported)
+        written: list[str] = []
+
+        def export(key: str, names: list[str], etag: str, chunks: Iterator[bytes]):
+            # Files removed by hand are written again.
+            if exported.get(key) == etag and all(
+                (directory / name).exists() for name in names
+            ):
+                return
+            logger.info(f"Exporting feed {key} to {directory}")
+            _write_feed(directory, names, chunks)
+            exported[key] = etag
+            written.extend(names)
+
+        identifiers = set()
+        try:
+            for feed_format, fmt in FEED_FORMATS.items():
+                name = f"{MASTER_FEED_KEY}{fmt.suffix}"
+                identifiers.add(name)
+                validators = get_master_feed_validators(db, feed_format=feed_format)
+                export(
+                    name,
+                    [name],
+                    validators.etag,
+                    iter_master_feed(db, None, feed_format),
+                )
+
+            for newsletter in get_all_newsletters(db):
+                names = [newsletter.id] + ([newsletter.slug] if newsletter.slug else [])
+                for feed_format, fmt in FEED_FORMATS.items():
+                    suffixed = [f"{name}{fmt.suffix}" for name in names]
+                    identifiers.update(suffixed)
+                    # The ETag covers the slug, so a new slug is exported as well.
+                    validators = get_feed_validators(
+                        db, newsletter, feed_format=feed_format
+                    )
+                    export(
+                        f"{newsletter.id}{fmt.suffix}",
+                        suffixed,
+                        validators.etag,
+                        iter_newsletter_feed(db, newsletter, None, feed_format),
+                    )
+
+            for key in set(exported) - identifiers:
+                del exported[key]
+            _remove_stale_files(directory, identifiers)
+        finally:
+            # Feeds exported before a failure are not written again.
+            if exported != previous:
+                _save_etags(etags_path, exported)
+
+    logger.info(f"Exported {len(written)} feeds to {directory}")
+    return written
@@ -1,93 +1,715 @@
-from typing import List
+import datetime
+import hashlib
+import itertools
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from dataclasses import dataclass
+from urllib.parse import urlencode
 
-from dateutil import tz
-from feedgen.feed import FeedGenerator
+from anyio import CapacityLimiter, to_thread
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.body_store import DatabaseBodyStore, decode_bodies, get_body_store
 from app.core.config import settings
-from app.crud.entries import get_all_entries, get_entries_by_newsletter
-from app.crud.newsletters import get_newsletter_by_identifier
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.core.feed_cache import (
+    MASTER_FEED_KEY,
+    CachedFeed,
+    FeedValidators,
+    feed_cache,
+)
+from app.crud.entries import (
+    fetch_row_bodies,
+    get_entry,
+    get_entry_keys,
+    get_entry_stats,
+    iter_feed_rows,
+    load_row_bodies,
+    stream_feed_rows,
+)
+from app.crud.newsletters import (
+    get_newsletter_by_identifier,
+    get_newsletter_names,
+    get_newsletter_stats,
+)
 from app.models.entries import Entry
+from app.models.newsletters import Newsletter
+from app.services.atom_writer import (
+    ATOM_FOOTER,
+    AtomEntry,
+    AtomFeed,
+    feed_entry,
+    iter_document,
+    write_atom_entry,
+    write_atom_header,
+)
+from app.services.json_feed_writer import (
+    JSON_FEED_FOOTER,
+    JSON_FEED_SEPARATOR,
+    write_json_feed_header,
+    write_json_feed_item,
+)
+from app.services.rss_writer import RSS_FOOTER, write_rss_header, write_rss_item
 
+# Feeds larger than this are streamed to the client without being cached.
+FEED_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Rows whose bodies are loaded from the body store together.
+BODY_BATCH_SIZE = 100
 
-def _create_feed_generator(
-    feed_id: str, title: str, feed_url: str, description: str
-) -> FeedGenerator:
-    """Initialize and configures a FeedGenerator instance."""
-    logo_url = f"{settings.app_base_url}/logo.png"
-    icon_url = f"{settings.app_base_url}/favicon.ico"
+# Limits the threads that feeds are rendered in, created on first use.
+_render_limiter: CapacityLimiter | None = None
 
-    fg = FeedGenerator()
-    fg.id(feed_id)
-    fg.title(title)
-    fg.logo(logo_url)
-    fg.icon(icon_url)
-    fg.link(href=feed_url, rel="self")
-    fg.link(href=f"{settings.app_base_url}/", rel="alternate")
-    fg.description(description)
-    return fg
 
+@dataclass(frozen=True)
+class FeedFormat:
+    """A feed document format and how its documents are written."""
 
-def _add_entries_to_feed(
-    fg: FeedGenerator, entries: List[Entry], is_master_feed: bool = False
-):
-    """Add a list of entries to a FeedGenerator instance."""
-    for entry in entries:
-        fe = fg.add_entry()
-        fe.id(f"urn:letterfeed:entry:{entry.id}")
-        fe.title(
-            f"[{entry.newsletter.name}] {entry.subject}"
-            if is_master_feed
-            else entry.subject
+    name: str
+    # Appended to the feed URL, e.g. /feeds/all.json.
+    suffix: str
+    media_type: str
+    write_header: Callable[[AtomFeed], str]
+    write_item: Callable[[AtomEntry], str]
+    # Written between consecutive items.
+    separator: str
+    footer: str
+    newest_first: bool
+
+    def iter_document(
+        self, feed: AtomFeed, fragments: Iterable[str]
+    ) -> Iterator[bytes]:
+        """Yield the UTF-8 encoded document with the serialized items in chunks."""
+        return iter_document(
+            self.write_header(feed), fragments, self.footer, separator=self.separator
         )
-        fe.content(entry.body, type="html")
 
-        if entry.received_at.tzinfo is None:
-            timezone_aware_received_at = entry.received_at.replace(tzinfo=tz.tzutc())
-            fe.published(timezone_aware_received_at)
-            fe.updated(timezone_aware_received_at)
+
+FEED_FORMATS = {
+    feed_format.name: feed_format
+    for feed_format in (
+        # Atom feeds have always listed the oldest entry first.
+        FeedFormat(
+            name="atom",
+            suffix="",
+            media_type="application/atom+xml",
+            write_header=write_atom_header,
+            write_item=write_atom_entry,
+            separator="",
+            footer=ATOM_FOOTER,
+            newest_first=False,
+        ),
+        FeedFormat(
+            name="rss",
+            suffix=".rss",
+            media_type="application/rss+xml",
+            write_header=write_rss_header,
+            write_item=write_rss_item,
+            separator="",
+            footer=RSS_FOOTER,
+            newest_first=True,
+        ),
+        FeedFormat(
+            name="json",
+            suffix=".json",
+            media_type="application/feed+json",
+            write_header=write_json_feed_header,
+            write_item=write_json_feed_item,
+            separator=JSON_FEED_SEPARATOR,
+            footer=JSON_FEED_FOOTER,
+            newest_first=True,
+        ),
+    )
+}
+
+
+@dataclass
+class _FeedPage:
+    """A feed document to be written, with the range of entries it holds."""
+
+    feed: AtomFeed
+    # The URL of the newest page, which the archive page URLs are based on.
+    feed_url: str
+    newsletter_id: str | None
+    before: Entry | None
+    master: bool
+    format: FeedFormat
+    # Archive pages that the feed does not link to are not cached.
+    cacheable: bool = True
+
+
+class FeedPageNotFoundError(LookupError):
+    """Raised when an archive page cursor does not refer to an entry of the feed."""
+
+
+def hub_url() -> str | None:
+    """Return the URL of the WebSub hub advertised in the feeds, if any."""
+    if settings.websub_hub:
+        return f"{settings.app_base_url}/websub"
+    return settings.websub_hub_url or None
+
+
+def _create_feed(feed_id: str, title: str, feed_url: str, description: str) -> AtomFeed:
+    """Create the metadata of a feed document."""
+    links = [(feed_url, "self"), (f"{settings.app_base_url}/", "alternate")]
+    hub = hub_url()
+    if hub is not None:
+        links.append((hub, "hub"))
+    return AtomFeed(
+        id=feed_id,
+        title=title,
+        subtitle=description,
+        icon=f"{settings.app_base_url}/favicon.ico",
+        logo=f"{settings.app_base_url}/logo.png",
+        links=links,
+    )
+
+
+def _page_url(feed_url: str, before: Entry) -> str:
+    """Return the URL of the archive page with the entries older than before."""
+    return f"{feed_url}?{urlencode({'before': before.id})}"
+
+
+def _get_cursor(
+    db: Session, before: str | None, newsletter_id: str | None = None
+) -> Entry | None:
+    """Look up the entry that an archive page starts below."""
+    if before is None:
+        return None
+    cursor = get_entry(db, before)
+    if cursor is None or newsletter_id not in (None, cursor.newsletter_id):
+        raise FeedPageNotFoundError(before)
+    return cursor
+
+
+def _max_entries() -> int | None:
+    return settings.feed_max_entries if settings.feed_max_entries > 0 else None
+
+
+def _is_page_boundary(db: Session, before: Entry, newsletter_id: str | None) -> bool:
+    """Check whether an archive page starts where the feed links to it.
+
+    Any entry of a feed is accepted as a cursor, so only these pages are cached,
+    and clients cannot fill the cache with a page per entry.
+    """
+    max_entries = _max_entries()
+    if max_entries is None:
+        return False
+    total, _ = get_entry_stats(db, newsletter_id)
+    older, _ = get_entry_stats(db, newsletter_id, before=before)
+    return (total - older) % max_entries == 0
+
+
+def _bound_page(db: Session, page: _FeedPage) -> tuple[object, bool]:
+    """Add the RFC 5005 paging and archive links to a page and find its entries.
+
+    Only the keys of the page are loaded, to find its oldest entry and whether an
+    older page exists. Returns the key of the oldest entry, None if pages are not
+    limited, and whether the page is empty.
+    """
+    max_entries = _max_entries()
+    if page.before is not None:
+        page.feed.links.append((page.feed_url, "current"))
+        page.feed.archive = True
+    if max_entries is None:
+        return None, False
+    keys = get_entry_keys(
+        db, page.newsletter_id, limit=max_entries + 1, before=page.before
+    )
+    entries = keys[:max_entries]
+    if len(keys) > max_entries:
+        older_url = _page_url(page.feed_url, entries[-1])
+        page.feed.links += [(older_url, "next"), (older_url, "prev-archive")]
+    if not entries:
+        return None, True
+    return entries[-1], False
+
+
+def _row_filters(page: _FeedPage, since) -> dict:
+    """Return the arguments of the feed rows query of a page."""
+    return dict(
+        newsletter_id=page.newsletter_id,
+        since=since,
+        before=page.before,
+        master=page.master,
+        # Only Atom entries are stored pre-rendered.
+        with_fragments=page.format.name == "atom",
+        newest_first=page.format.newest_first,
+    )
+
+
+def _fragments(
+    rows: Iterable, page: _FeedPage, bodies: dict[str, str]
+) -> Iterator[str]:
+    """Serialize feed rows, using their pre-rendered fragments where possible.
+
+    Rows without a fragment are rendered with their body from bodies, by hash.
+    """
+    for row in rows:
+        if row.fragment is not None:
+            yield row.fragment
         else:
-            fe.published(entry.received_at)
-            fe.updated(entry.received_at)
+            yield page.format.write_item(
+                feed_entry(
+                    row.id,
+                    row.subject,
+                    bodies.get(row.body_hash),
+                    row.received_at,
+                    row.name,
+                    page.master,
+                )
+            )
+
+
+def _iter_page(db: Session, page: _FeedPage) -> Iterator[bytes]:
+    """Stream a page of entries from a database cursor."""
+    since, empty = _bound_page(db, page)
+    rows = [] if empty else iter_feed_rows(db, **_row_filters(page, since))
+    yield from page.format.iter_document(page.feed, _batch_fragments(db, rows, page))
+
+
+def _batch_fragments(db: Session, rows: Iterable, page: _FeedPage) -> Iterator[str]:
+    """Serialize feed rows, loading the bodies they need a batch at a time."""
+    for batch in itertools.batched(rows, BODY_BATCH_SIZE):
+        yield from _fragments(batch, page, load_row_bodies(db, batch))
+
+
+def _render_rows(
+    rows: list, page: _FeedPage, separator: str, stored: dict[str, tuple[str, bytes]]
+) -> bytes:
+    """Decompress the bodies of a batch of feed rows and serialize the batch.
+
+    The batch is prefixed with separator.
+    """
+    fragments = page.format.separator.join(
+        _fragments(rows, page, decode_bodies(stored))
+    )
+    return (separator + fragments).encode("utf-8")
 
 
-def generate_feed(db: Session, feed_identifier: str):
-    """Generate an Atom feed for a given newsletter."""
+async def _afetch_row_bodies(
+    db: AsyncSession, rows: list
+) -> dict[str, tuple[str, bytes]]:
+    """Fetch the stored bodies that a batch of feed rows needs, by hash."""
+    if isinstance(get_body_store(), DatabaseBodyStore):
+        return await db.run_sync(fetch_row_bodies, rows)
+    # Files are read in a render thread, to keep the event loop free.
+    return await run_render(fetch_row_bodies, None, rows)
+
+
+async def _aiter_page(db: AsyncSession, page: _FeedPage) -> AsyncIterator[bytes]:
+    """Stream a page of entries with an async session.
+
+    Rows are fetched in batches without blocking the event loop, and each batch is
+    serialized in a render thread.
+    """
+    since, empty = await db.run_sync(_bound_page, page)
+    fmt = page.format
+    yield fmt.write_header(page.feed).encode("utf-8")
+    if not empty:
+        separator = ""
+        async for rows in stream_feed_rows(db, **_row_filters(page, since)):
+            stored = await _afetch_row_bodies(db, rows)
+            yield await run_render(_render_rows, rows, page, separator, stored)
+            separator = fmt.separator
+    yield fmt.footer.encode("utf-8")
+
+
+async def run_render(fn: Callable, *args):
+    """Run CPU-bound feed work, such as rendering or compression, in a thread.
+
+    Render threads have their own limit, so busy feeds never take the threads that
+    the sync endpoints run in.
+    """
+    global _render_limiter
+    if _render_limiter is None:
+        _render_limiter = CapacityLimiter(max(settings.feed_render_workers, 1))
+    return await to_thread.run_sync(fn, *args, limiter=_render_limiter)
+
+
+def generate_feed(
+    db: Session,
+    feed_identifier: str,
+    before: str | None = None,
+    feed_format: str = "atom",
+):
+    """Generate a feed for a given newsletter, as Atom unless feed_format says otherwise.
+
+    The feed holds the newest entries, or those older than the entry with the ID
+    before for an archive page.
+    """
     newsletter = get_newsletter_by_identifier(db, feed_identifier)
     if not newsletter:
         return None
+    cursor = _get_cursor(db, before, newsletter.id)
+    return b"".join(iter_newsletter_feed(db, newsletter, cursor, feed_format))
 
-    entries = get_entries_by_newsletter(db, newsletter.id)
 
-    feed_url = f"{settings.app_base_url}/feeds/{newsletter.slug or newsletter.id}"
+def iter_newsletter_feed(
+    db: Session,
+    newsletter: Newsletter,
+    before: Entry | None = None,
+    feed_format: str = "atom",
+) -> Iterator[bytes]:
+    """Stream the feed of a newsletter that has already been loaded."""
+    return _iter_page(db, _newsletter_page(newsletter, before, feed_format))
+
+
+def _newsletter_page(
+    newsletter: Newsletter, before: Entry | None, feed_format: str
+) -> _FeedPage:
+    fmt = FEED_FORMATS[feed_format]
+    feed_url = (
+        f"{settings.app_base_url}/feeds/{newsletter.slug or newsletter.id}{fmt.suffix}"
+    )
     sender_emails = ", ".join([s.email for s in newsletter.senders])
     description = f"A feed of newsletters from {sender_emails}"
 
-    fg = _create_feed_generator(
+    feed = _create_feed(
         feed_id=f"urn:letterfeed:newsletter:{newsletter.id}",
         title=newsletter.name,
-        feed_url=feed_url,
+        feed_url=_page_url(feed_url, before) if before else feed_url,
         description=description,
     )
+    return _FeedPage(feed, feed_url, newsletter.id, before, False, fmt)
 
-    _add_entries_to_feed(fg, entries)
 
-    return fg.atom_str(pretty=True)
+def generate_master_feed(
+    db: Session, before: str | None = None, feed_format: str = "atom"
+):
+    """Generate a master feed for all newsletters."""
+    cursor = _get_cursor(db, before)
+    return b"".join(iter_master_feed(db, cursor, feed_format))
+
 
+def iter_master_feed(
+    db: Session, before: Entry | None = None, feed_format: str = "atom"
+) -> Iterator[bytes]:
+    """Stream the master feed."""
+    return _iter_page(db, _master_page(before, feed_format))
 
-def generate_master_feed(db: Session):
-    """Generate a master Atom feed for all newsletters."""
-    entries = get_all_entries(db)
 
-    feed_url = f"{settings.app_base_url}/feeds/all"
+def _master_page(before: Entry | None, feed_format: str) -> _FeedPage:
+    fmt = FEED_FORMATS[feed_format]
+    feed_url = f"{settings.app_base_url}/feeds/all{fmt.suffix}"
 
-    fg = _create_feed_generator(
+    feed = _create_feed(
         feed_id="urn:letterfeed:master",
         title="LetterFeed: All Newsletters",
-        feed_url=feed_url,
+        feed_url=_page_url(feed_url, before) if before else feed_url,
         description="A master feed of all your newsletters.",
     )
+    return _FeedPage(feed, feed_url, None, before, True, fmt)
+
+
+def _make_validators(state: list, newest) -> FeedValidators:
+    """Derive the validators of a feed from everything its content depends on."""
+    if newest is not None and newest.tzinfo is None:
+        newest = newest.replace(tzinfo=datetime.UTC)
+    state = [
+        settings.app_base_url,
+        settings.feed_max_entries,
+        hub_url(),
+        *state,
+        newest,
+    ]
+    digest = hashlib.sha256(repr(state).encode())
+    return FeedValidators(etag=f'W/"{digest.hexdigest()[:32]}"', last_modified=newest)
+
+
+def get_feed_validators(
+    db: Session,
+    newsletter: Newsletter,
+    before: Entry | None = None,
+    feed_format: str = "atom",
+) -> FeedValidators:
+    """Compute the validators of a newsletter feed.
+
+    The newest page uses the entry counters of the newsletter, archive pages need
+    an aggregate query.
+    """
+    if before is None:
+        count, newest = newsletter.entry_count, newsletter.last_received_at
+    else:
+        count, newest = get_entry_stats(db, newsletter.id, before=before)
+    senders = sorted(s.email for s in newsletter.senders)
+    return _make_validators(
+        [
+            feed_format,
+            newsletter.id,
+            newsletter.slug,
+            newsletter.name,
+            senders,
+            before.id if before else None,
+            count,
+        ],
+        newest,
+    )
+
+
+def get_master_feed_validators(
+    db: Session, before: Entry | None = None, feed_format: str = "atom"
+) -> FeedValidators:
+    """Compute the validators of the master feed.
+
+    The newest page uses the entry counters of the newsletters, archive pages need
+    an aggregate query.
+    """
+    if before is not None:
+        count, newest = get_entry_stats(db, before=before)
+        # Entry titles of the master feed contain the newsletter names.
+        return _make_validators(
+            [feed_format, get_newsletter_names(db), before.id, count], newest
+        )
+    stats = get_newsletter_stats(db)
+    newest = max((last for *_, last in stats if last is not None), default=None)
+    return _make_validators([feed_format, stats], newest)
+
+
+def _never_fresh(validators: FeedValidators) -> bool:
+    return False
+
+
+def _cache_key(feed_identifier: str, before: str | None, feed_format: str) -> str:
+    key = f"{feed_identifier}{FEED_FORMATS[feed_format].suffix}"
+    return key if before is None else f"{key}?before={before}"
+
+
+def _page_cache_key(page: _FeedPage) -> str:
+    """Return the key of a page, by newsletter ID whatever it was requested by."""
+    return _cache_key(
+        page.newsletter_id or MASTER_FEED_KEY,
+        page.before.id if page.before else None,
+        page.format.name,
+    )
+
+
+def _prepare_newsletter_feed(
+    db: Session, feed_identifier: str, before: str | None, feed_format: str
+) -> tuple[FeedValidators, _FeedPage] | None:
+    """Load a newsletter and return the validators and page of its feed."""
+    newsletter = get_newsletter_by_identifier(db, feed_identifier)
+    if not newsletter:
+        return None
+    cursor = _get_cursor(db, before, newsletter.id)
+    validators = get_feed_validators(db, newsletter, cursor, feed_format)
+    page = _newsletter_page(newsletter, cursor, feed_format)
+    page.cacheable = cursor is None or _is_page_boundary(db, cursor, newsletter.id)
+    return validators, page
+
+
+def _prepare_master_feed(
+    db: Session, before: str | None, feed_format: str
+) -> tuple[FeedValidators, _FeedPage]:
+    """Return the validators and page of the master feed."""
+    cursor = _get_cursor(db, before)
+    validators = get_master_feed_validators(db, cursor, feed_format)
+    page = _master_page(cursor, feed_format)
+    page.cacheable = cursor is None or _is_page_boundary(db, cursor, None)
+    return validators, page
+
+
+def _cache_page(
+    page: _FeedPage,
+    validators: FeedValidators,
+    content: list[bytes],
+    generation: int,
+    alias: str | None,
+) -> None:
+    archive_before = page.before.received_at if page.before else None
+    feed_cache.put(
+        _page_cache_key(page),
+        page.newsletter_id,
+        validators,
+        b"".join(content),
+        generation,
+        archive_before,
+        alias if alias != page.newsletter_id else None,
+    )
+
+
+def _stream_and_cache(
+    db: Session,
+    page: _FeedPage,
+    validators: FeedValidators,
+    generation: int,
+    alias: str | None,
+) -> Iterator[bytes]:
+    """Stream a feed, close its session, and cache the feed once it is complete."""
+    content: list[bytes] | None = [] if page.cacheable else None
+    size = 0
+    try:
+        for chunk in _iter_page(db, page):
+            if content is not None:
+                content.append(chunk)
+                size += len(chunk)
+                if size > FEED_CACHE_MAX_BYTES:
+                    content = None
+            yield chunk
+    finally:
+        db.close()
+    if content is not None:
+        _cache_page(page, validators, content, generation, alias)
+
+
+async def _astream_and_cache(
+    db: AsyncSession,
+    page: _FeedPage,
+    validators: FeedValidators,
+    generation: int,
+    alias: str | None,
+) -> AsyncIterator[bytes]:
+    """Stream a feed like _stream_and_cache, with an async session."""
+    content: list[bytes] | None = [] if page.cacheable else None
+    size = 0
+    try:
+        async for chunk in _aiter_page(db, page):
+            if content is not None:
+                content.append(chunk)
+                size += len(chunk)
+                if size > FEED_CACHE_MAX_BYTES:
+                    content = None
+            yield chunk
+    finally:
+        await db.close()
+    if content is not None:
+        _cache_page(page, validators, content, generation, alias)
+
+
+def _render(
+    key: str,
+    alias: str | None,
+    client_is_fresh: Callable[[FeedValidators], bool],
+    prepare,
+    *args,
+):
+    """Return a feed from the cache, or prepare it with a new session."""
+    cached = feed_cache.get(key)
+    if cached is not None:
+        return cached.validators, cached
+
+    generation = feed_cache.generation
+    db = SessionLocal()
+    try:
+        prepared = prepare(db, *args)
+        if prepared is None:
+            db.close()
+            return None
+        validators, page = prepared
+        if client_is_fresh(validators):
+            db.close()
+            return validators, None
+    except BaseException:
+        db.close()
+        raise
+    return validators, _stream_and_cache(db, page, validators, generation, alias)
+
+
+async def _render_async(
+    key: str,
+    alias: str | None,
+    client_is_fresh: Callable[[FeedValidators], bool],
+    prepare,
+    *args,
+):
+    """Return a feed like _render, querying the database with an async session."""
+    cached = feed_cache.get(key)
+    if cached is not None:
+        return cached.validators, cached
+
+    generation = feed_cache.generation
+    db = AsyncSessionLocal()
+    try:
+        prepared = await db.run_sync(prepare, *args)
+        if prepared is None:
+            await db.close()
+            return None
+        validators, page = prepared
+        if client_is_fresh(validators):
+            await db.close()
+            return validators, None
+    except BaseException:
+        await db.close()
+        raise
+    return validators, _astream_and_cache(db, page, validators, generation, alias)
 
-    _add_entries_to_feed(fg, entries, is_master_feed=True)
 
-    return fg.atom_str(pretty=True)
+def render_feed(
+    feed_identifier: str,
+    before: str | None = None,
+    client_is_fresh: Callable[[FeedValidators], bool] = _never_fresh,
+    feed_format: str = "atom",
+) -> tuple[FeedValidators, CachedFeed | Iterator[bytes] | None] | None:
+    """Return the validators and feed of a newsletter, cached if possible.
+
+    Cache hits return the cached feed without opening a database session. On a
+    miss, the feed is not generated at all if client_is_fresh accepts its
+    validators, and None is returned as content instead. Otherwise the content is
+    an iterator that streams the feed from the database and caches it when it has
+    been consumed. Raises FeedPageNotFoundError for an unknown archive page.
+    """
+    return _render(
+        _cache_key(feed_cache.resolve(feed_identifier), before, feed_format),
+        feed_identifier,
+        client_is_fresh,
+        _prepare_newsletter_feed,
+        feed_identifier,
+        before,
+        feed_format,
+    )
+
+
+def render_master_feed(
+    before: str | None = None,
+    client_is_fresh: Callable[[FeedValidators], bool] = _never_fresh,
+    feed_format: str = "atom",
+) -> tuple[FeedValidators, CachedFeed | Iterator[bytes] | None]:
+    """Return the validators and master feed, cached if possible.
+
+    The content is returned as by render_feed. Raises FeedPageNotFoundError for
+    an unknown archive page.
+    """
+    return _render(
+        _cache_key(MASTER_FEED_KEY, before, feed_format),
+        None,
+        client_is_fresh,
+        _prepare_master_feed,
+        before,
+        feed_format,
+    )
+
+
+async def render_feed_async(
+    feed_identifier: str,
+    before: str | None = None,
+    client_is_fresh: Callable[[FeedValidators], bool] = _never_fresh,
+    feed_format: str = "atom",
+) -> tuple[FeedValidators, CachedFeed | AsyncIterator[bytes] | None] | None:
+    """Return a newsletter feed like render_feed, without blocking the event loop.
+
+    A feed that is not cached is streamed as an async iterator.
+    """
+    return await _render_async(
+        _cache_key(feed_cache.resolve(feed_identifier), before, feed_format),
+        feed_identifier,
+        client_is_fresh,
+        _prepare_newsletter_feed,
+        feed_identifier,
+        before,
+        feed_format,
+    )
+
+
+async def render_master_feed_async(
+    before: str | None = None,
+    client_is_fresh: Callable[[FeedValidators], bool] = _never_fresh,
+    feed_format: str = "atom",
+) -> tuple[FeedValidators, CachedFeed | AsyncIterator[bytes] | None]:
+    """Return the master feed like render_master_feed, without blocking the event loop."""
+    return await _render_async(
+        _cache_key(MASTER_FEED_KEY, before, feed_format),
+        None,
+        client_is_fresh,
+        _prepare_master_feed,
+        before,
+        feed_format,
+    )
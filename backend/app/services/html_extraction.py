@@ -0,0 +1,81 @@
+import hashlib
+import json
+import quopri
+
+import nh3
+from bs4 import BeautifulSoup
+from readability import Document
+
+"""Readability extraction and sanitizing of newsletter HTML.
+
+This module runs in the extraction worker processes, so it must stay free of
+database and application state.
+"""
+
+# Bump when the extraction logic changes, so cached results are not reused.
+EXTRACTION_VERSION = 1
+
+ALLOWED_TAGS = {
+    "p",
+    "strong",
+    "em",
+    "u",
+    "h3",
+    "h4",
+    "ul",
+    "ol",
+    "li",
+    "a",
+    "img",
+    "br",
+    "div",
+    "span",
+    "figure",
+    "figcaption",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "width", "height"},
+    "*": {"style"},
+}
+
+_SETTINGS_FINGERPRINT = json.dumps(
+    [
+        EXTRACTION_VERSION,
+        sorted(ALLOWED_TAGS),
+        {tag: sorted(attrs) for tag, attrs in ALLOWED_ATTRIBUTES.items()},
+    ],
+    sort_keys=True,
+).encode()
+
+
+def extraction_cache_key(raw_html_content: str) -> str:
+    """Return the cache key of a body under the current extraction settings."""
+    digest = hashlib.sha256(_SETTINGS_FINGERPRINT)
+    digest.update(raw_html_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def extract_and_clean_html(raw_html_content: str) -> dict[str, str]:
+    """Decode, extract, and sanitize newsletter HTML."""
+    try:
+        decoded_bytes = quopri.decodestring(raw_html_content.encode("utf-8"))
+        clean_html_str = decoded_bytes.decode("utf-8", "ignore")
+    except Exception:
+        # If quopri fails, assume it's already decoded.
+        clean_html_str = raw_html_content
+
+    doc = Document(clean_html_str)
+    extracted_body = doc.summary(html_partial=True)
+
+    cleaned_body = nh3.clean(
+        extracted_body, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES
+    )
+
+    title = doc.title()
+    if not title or title == "no-title":
+        soup = BeautifulSoup(cleaned_body, "html.parser")
+        first_headline = soup.find(["h1", "h2", "h3"])
+        title = first_headline.get_text(strip=True) if first_headline else "Newsletter"
+
+    return {"title": title, "body": cleaned_body}
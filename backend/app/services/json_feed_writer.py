@@ -0,0 +1,49 @@
+import json
+
+from app.services.atom_writer import AtomEntry, AtomFeed, format_timestamp
+
+"""Streaming JSON Feed 1.1 writer.
+
+Takes the same feed metadata and entries as the Atom writer. Items are encoded one
+by one and the document is written around them, so it can be streamed.
+"""
+
+JSON_FEED_VERSION = "https://jsonfeed.org/version/1.1"
+JSON_FEED_FOOTER = "\n]}\n"
+JSON_FEED_SEPARATOR = ",\n"
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_json_feed_header(feed: AtomFeed) -> str:
+    """Return everything of the document up to the first item, as an open object."""
+    links = dict((rel, href) for href, rel in feed.links)
+    top_level = {
+        "version": JSON_FEED_VERSION,
+        "title": feed.title,
+        "home_page_url": links.get("alternate"),
+        "feed_url": links.get("self"),
+        "description": feed.subtitle,
+        "icon": feed.logo,
+        "favicon": feed.icon,
+    }
+    if "next" in links:
+        top_level["next_url"] = links["next"]
+    if "hub" in links:
+        top_level["hubs"] = [{"type": "WebSub", "url": links["hub"]}]
+    # Drop the closing brace, the items array follows.
+    return _dumps(top_level)[:-1] + ',"items":[\n'
+
+
+def write_json_feed_item(entry: AtomEntry) -> str:
+    """Return the serialized JSON Feed item."""
+    return _dumps(
+        {
+            "id": entry.id,
+            "title": entry.title,
+            "content_html": entry.content,
+            "date_published": format_timestamp(entry.published),
+        }
+    )
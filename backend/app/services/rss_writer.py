@@ -0,0 +1,77 @@
+import datetime
+import email.utils
+
+from app.services.atom_writer import (
+    ATOM_NS,
+    FEED_HISTORY_NS,
+    AtomEntry,
+    AtomFeed,
+    escape_attribute,
+    escape_text,
+)
+
+"""Streaming RSS 2.0 writer.
+
+Takes the same feed metadata and entries as the Atom writer. Links other than the
+alternate link, including the RFC 5005 paging links, are written as atom:link
+elements.
+"""
+
+RSS_FOOTER = "  </channel>\n</rss>\n"
+# Relations of the links to pages of the feed itself, which are RSS documents.
+RSS_PAGE_RELS = frozenset({"self", "current", "next", "prev-archive"})
+
+
+def _rfc822(value: datetime.datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.UTC)
+    return email.utils.format_datetime(value.astimezone(datetime.UTC), usegmt=True)
+
+
+def write_rss_header(feed: AtomFeed) -> str:
+    """Return everything of the document up to the first item."""
+    namespaces = f'xmlns:atom="{ATOM_NS}"'
+    if feed.archive:
+        namespaces += f' xmlns:fh="{FEED_HISTORY_NS}"'
+    home = next((href for href, rel in feed.links if rel == "alternate"), "")
+    updated = feed.updated or datetime.datetime.now(datetime.UTC)
+    parts = [
+        "<?xml version='1.0' encoding='UTF-8'?>\n",
+        f'<rss {namespaces} version="2.0">\n',
+        "  <channel>\n",
+        f"    <title>{escape_text(feed.title)}</title>\n",
+        f"    <link>{escape_text(home)}</link>\n",
+        f"    <description>{escape_text(feed.subtitle)}</description>\n",
+    ]
+    for href, rel in feed.links:
+        if rel == "alternate":
+            continue
+        media_type = ' type="application/rss+xml"' if rel in RSS_PAGE_RELS else ""
+        parts.append(
+            f'    <atom:link href="{escape_attribute(href)}"'
+            f' rel="{escape_attribute(rel)}"{media_type}/>\n'
+        )
+    parts += [
+        "    <generator>LetterFeed</generator>\n",
+        "    <image>\n",
+        f"      <url>{escape_text(feed.logo)}</url>\n",
+        f"      <title>{escape_text(feed.title)}</title>\n",
+        f"      <link>{escape_text(home)}</link>\n",
+        "    </image>\n",
+        f"    <lastBuildDate>{_rfc822(updated)}</lastBuildDate>\n",
+    ]
+    if feed.archive:
+        parts.append("    <fh:archive/>\n")
+    return "".join(parts)
+
+
+def write_rss_item(entry: AtomEntry) -> str:
+    """Return the serialized RSS item."""
+    return (
+        "    <item>\n"
+        f"      <title>{escape_text(entry.title)}</title>\n"
+        f"      <description>{escape_text(entry.content)}</description>\n"
+        f'      <guid isPermaLink="false">{escape_text(entry.id)}</guid>\n'
+        f"      <pubDate>{_rfc822(entry.published)}</pubDate>\n"
+        "    </item>\n"
+    )
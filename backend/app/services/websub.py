@@ -0,0 +1,301 @@
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import secrets
+import socket
+import threading
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.feed_cache import MASTER_FEED_KEY, CachedFeed
+from app.core.logging import get_logger
+from app.crud.newsletters import get_newsletters_by_ids
+from app.crud.websub import (
+    delete_expired_subscriptions,
+    delete_subscription,
+    get_active_subscriptions,
+    save_subscription,
+)
+from app.services.feed_generator import (
+    FEED_FORMATS,
+    FeedPageNotFoundError,
+    hub_url,
+    render_feed,
+    render_master_feed,
+)
+
+"""WebSub publisher and a minimal built-in hub.
+
+The feeds advertise the hub, and the hub is notified whenever entries are created.
+With the built-in hub, subscriptions are verified and stored in the database, and
+new feed content is delivered to the subscribers instead. All network requests are
+made from a bounded pool of background threads.
+
+The built-in hub is off by default. Anyone who can reach it can make it request
+callback URLs, so callbacks are only requested on public addresses, unless
+websub_allow_private_callbacks is set for subscribers on the local network.
+"""
+
+logger = get_logger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _submit(fn, *args) -> Future:
+    """Run a network task on the background pool, which is started on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(settings.websub_workers, 1),
+                thread_name_prefix="websub",
+            )
+        return _executor.submit(fn, *args)
+
+
+def shutdown_websub(wait: bool = True) -> None:
+    """Finish the queued WebSub tasks and stop the background pool.
+
+    Tasks can queue further tasks, which start a new pool, so this repeats until
+    no pool is left.
+    """
+    global _executor
+    while True:
+        with _executor_lock:
+            executor, _executor = _executor, None
+        if executor is None:
+            return
+        executor.shutdown(wait=wait)
+        if not wait:
+            return
+
+
+def _feeds_url() -> str:
+    return f"{settings.app_base_url}/feeds/"
+
+
+def parse_topic(topic: str) -> tuple[str, str] | None:
+    """Return the feed identifier and format of a feed URL, or None if it is none."""
+    if not topic.startswith(_feeds_url()):
+        return None
+    name = topic.removeprefix(_feeds_url())
+    if not name or "/" in name or "?" in name:
+        return None
+    for feed_format, fmt in FEED_FORMATS.items():
+        if fmt.suffix and name.endswith(fmt.suffix):
+            return name.removesuffix(fmt.suffix), feed_format
+    return name, "atom"
+
+
+def _topics(identifiers: list[str]) -> list[str]:
+    """Return the URLs of the feeds with the identifiers, in every format."""
+    return [
+        f"{_feeds_url()}{identifier}{fmt.suffix}"
+        for identifier in identifiers
+        for fmt in FEED_FORMATS.values()
+    ]
+
+
+def publish(newsletter_ids: list[str]) -> None:
+    """Announce new entries of the newsletters to the hub, in the background."""
+    if hub_url() is None or not newsletter_ids:
+        return
+    _submit(_publish, list(newsletter_ids))
+
+
+def _publish(newsletter_ids: list[str]) -> None:
+    with SessionLocal() as db:
+        identifiers = [MASTER_FEED_KEY]
+        for newsletter in get_newsletters_by_ids(db, newsletter_ids):
+            identifiers.append(newsletter.id)
+            if newsletter.slug:
+                identifiers.append(newsletter.slug)
+    topics = _topics(identifiers)
+    if settings.websub_hub:
+        _distribute(topics)
+        return
+    for topic in topics:
+        data = urlencode({"hub.mode": "publish", "hub.url": topic}).encode()
+        try:
+            _request(hub_url(), data=data)
+        except OSError as e:
+            logger.warning(f"Notifying WebSub hub of {topic} failed: {e}")
+    logger.info(f"Notified WebSub hub of {len(topics)} updated feeds")
+
+
+def _request(url: str, data: bytes | None = None):
+    """Make a request and return the response body, raising OSError on failure."""
+    request = urllib.request.Request(url, data=data)
+    with urllib.request.urlopen(request, timeout=settings.websub_timeout) as response:
+        return response.read()
+
+
+def is_public_address(address: str) -> bool:
+    """Check whether an IP address is globally reachable, and not e.g. loopback."""
+    ip = ipaddress.ip_address(address.partition("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _create_callback_connection(
+    address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None
+):
+    """Connect to a subscriber, refusing hosts that resolve to non-public addresses.
+
+    The addresses are checked right before connecting to them, so a host can not
+    resolve to a public address when its callback is validated and to a private
+    one when it is requested.
+    """
+    host, port = address
+    addresses = [
+        info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    ]
+    if not settings.websub_allow_private_callbacks and not all(
+        map(is_public_address, addresses)
+    ):
+        raise ConnectionRefusedError(f"{host} resolves to a non-public address")
+    error = OSError(f"Could not resolve {host}")
+    for ip in addresses:
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _CallbackHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_callback_connection
+
+
+class _CallbackHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_callback_connection
+
+
+class _CallbackHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_CallbackHTTPConnection, req)
+
+
+class _CallbackHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_CallbackHTTPSConnection, req, context=self._context)
+
+
+# Subscriber callbacks are requested without proxies, which would be connected to
+# instead, and redirects are checked like the callbacks themselves.
+_callback_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), _CallbackHTTPHandler, _CallbackHTTPSHandler
+)
+
+
+def _request_callback(url: str, data: bytes | None = None, headers: dict | None = None):
+    """Request a subscriber callback and return the response body.
+
+    Raises OSError on failure, or if the callback is not on a public address.
+    """
+    request = urllib.request.Request(url, data=data, headers=headers or {})
+    with _callback_opener.open(request, timeout=settings.websub_timeout) as response:
+        return response.read()
+
+
+def _render(topic: str) -> tuple[bytes, str] | None:
+    """Return the current content and media type of a feed."""
+    identifier, feed_format = parse_topic(topic)
+    try:
+        if identifier == MASTER_FEED_KEY:
+            result = render_master_feed(feed_format=feed_format)
+        else:
+            result = render_feed(identifier, feed_format=feed_format)
+    except FeedPageNotFoundError:
+        return None
+    if result is None:
+        return None
+    _, feed = result
+    content = feed.content if isinstance(feed, CachedFeed) else b"".join(feed)
+    return content, FEED_FORMATS[feed_format].media_type
+
+
+def _distribute(topics: list[str]) -> None:
+    """Deliver the new content of the topics to their subscribers."""
+    with SessionLocal() as db:
+        delete_expired_subscriptions(db)
+        subscriptions = [
+            (s.topic, s.callback, s.secret)
+            for s in get_active_subscriptions(db, topics)
+        ]
+    rendered = {}
+    for topic, callback, secret in subscriptions:
+        if topic not in rendered:
+            rendered[topic] = _render(topic)
+        if rendered[topic] is not None:
+            _submit(_deliver, topic, callback, secret, *rendered[topic])
+
+
+def _deliver(
+    topic: str, callback: str, secret: str | None, content: bytes, media_type: str
+) -> None:
+    """Send a content distribution request to a subscriber."""
+    headers = {
+        "Content-Type": media_type,
+        "Link": f'<{hub_url()}>; rel="hub", <{topic}>; rel="self"',
+    }
+    if secret:
+        signature = hmac.new(secret.encode(), content, hashlib.sha256).hexdigest()
+        headers["X-Hub-Signature"] = f"sha256={signature}"
+    try:
+        _request_callback(callback, data=content, headers=headers)
+        logger.info(f"Delivered {topic} to WebSub subscriber {callback}")
+    except OSError as e:
+        logger.warning(f"Delivering {topic} to {callback} failed: {e}")
+
+
+def request_subscription(
+    mode: str,
+    topic: str,
+    callback: str,
+    lease_seconds: int | None = None,
+    secret: str | None = None,
+) -> None:
+    """Verify a subscription request of the built-in hub in the background.
+
+    lease_seconds must be positive. Leases are capped at websub_lease_seconds,
+    which is also used if the subscriber did not ask for a lease.
+    """
+    if lease_seconds is None:
+        lease_seconds = settings.websub_lease_seconds
+    lease_seconds = min(lease_seconds, settings.websub_lease_seconds)
+    _submit(_verify_intent, mode, topic, callback, lease_seconds, secret)
+
+
+def _verify_intent(
+    mode: str, topic: str, callback: str, lease_seconds: int, secret: str | None
+) -> None:
+    """Confirm that the subscriber asked for the (un)subscription, then apply it."""
+    challenge = secrets.token_urlsafe(32)
+    params = {"hub.mode": mode, "hub.topic": topic, "hub.challenge": challenge}
+    if mode == "subscribe":
+        params["hub.lease_seconds"] = lease_seconds
+    separator = "&" if "?" in callback else "?"
+    try:
+        response = _request_callback(f"{callback}{separator}{urlencode(params)}")
+    except OSError as e:
+        logger.warning(f"Verifying WebSub {mode} of {callback} to {topic} failed: {e}")
+        return
+    if response.decode(errors="replace").strip() != challenge:
+        logger.warning(f"WebSub subscriber {callback} did not echo the challenge")
+        return
+    with SessionLocal() as db:
+        if mode == "subscribe":
+            save_subscription(db, topic, callback, secret, lease_seconds)
+        else:
+            delete_subscription(db, topic, callback)
@@ -8,6 +8,8 @@ from fastapi.testclient import TestClient
 from sqlalchemy.orm import sessionmaker
 
 from app.core.database import Base, engine, get_db
+from app.core.feed_cache import feed_cache
+from app.core.imap import imap_pool
 from app.main import app
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -24,6 +26,9 @@ def setup_and_teardown_db():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    # Pooled IMAP sessions are mocks that must not leak into other tests.
+    imap_pool.close_all()
+    feed_cache.clear()
 
 
 @pytest.fixture(name="db_session")
@@ -58,9 +63,10 @@ def cleanup_test_db(request):
     """
 
     def remove_test_db():
-        # The path is relative to the backend directory where pytest is run
-        db_file = "test.db"
-        if os.path.exists(db_file):
-            os.remove(db_file)
+        # The path is relative to the backend directory where pytest is run.
+        # WAL mode keeps the -wal and -shm files next to the database.
+        for db_file in ("test.db", "test.db-wal", "test.db-shm"):
+            if os.path.exists(db_file):
+                os.remove(db_file)
 
     request.addfinalizer(remove_test_db)
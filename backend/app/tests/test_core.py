@@ -1,9 +1,34 @@
+import asyncio
+import socket
+import threading
+import time
 from datetime import datetime
 from unittest.mock import ANY, MagicMock, patch
 
+import pytest
 from sqlalchemy.orm import Session
 
-from app.core.imap import _test_imap_connection, get_folders
+from app.core import body_store
+from app.core.body_store import (
+    DatabaseBodyStore,
+    FileBodyStore,
+    body_hash,
+    decode_body,
+    encode_body,
+    train_dictionary,
+)
+from app.core.compression import choose_encoding
+from app.core.config import settings
+from app.core.database import async_engine, engine
+from app.core.imap import (
+    ImapConnectionPool,
+    _test_imap_connection,
+    fetch_in_chunks,
+    format_uid_set,
+    get_folders,
+    idle_wait,
+    parse_fetch_response,
+)
 from app.crud.newsletters import create_newsletter
 from app.crud.settings import create_or_update_settings
 from app.schemas.newsletters import NewsletterCreate
@@ -11,6 +36,32 @@ from app.schemas.settings import SettingsCreate
 from app.services.email_processor import process_emails
 
 
+def _mock_uid_command(search_result: bytes, msg_bytes: bytes):
+    """Return a side effect for IMAP4.uid that serves a search and a fetch result."""
+
+    def uid(command, *args):
+        if command == "SEARCH":
+            return ("OK", [search_result])
+        if command == "FETCH":
+            return ("OK", [(b"1 (UID 1 BODY[] {%d}" % len(msg_bytes), msg_bytes), b")"])
+        return ("OK", [None])
+
+    return uid
+
+
+def test_choose_encoding():
+    """Test Accept-Encoding negotiation of the supported content codings."""
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("GZIP;q=0.5") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("br;q=0.5, gzip") == "gzip"
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("*, br;q=0") == "gzip"
+
+
 @patch("app.core.imap.imaplib.IMAP4_SSL")
 def test_test_imap_connection_success(mock_imap):
     """Test IMAP connection success."""
@@ -43,6 +94,171 @@ def test_get_folders(mock_imap):
     assert folders == ["INBOX", "Processed"]
 
 
+@patch("app.core.imap.imaplib.IMAP4_SSL")
+def test_imap_pool_reuses_sessions(mock_imap):
+    """Test that a released session is reused without logging in again."""
+    pool = ImapConnectionPool(max_idle_per_account=2)
+
+    with pool.connection("imap.test.com", "user", "pass") as first:
+        first.select("INBOX")
+    with pool.connection("imap.test.com", "user", "pass") as second:
+        second.select("Newsletters")
+
+    assert first is second
+    mock_imap.assert_called_once_with("imap.test.com", timeout=ANY)
+    first.login.assert_called_once_with("user", "pass")
+    first.logout.assert_not_called()
+
+
+@patch("app.core.imap.imaplib.IMAP4_SSL")
+def test_imap_pool_evicts_broken_sessions(mock_imap):
+    """Test that sessions failing NOOP are evicted and replaced."""
+    broken, fresh = MagicMock(), MagicMock()
+    broken.noop.side_effect = OSError("connection reset")
+    mock_imap.side_effect = [broken, fresh]
+    pool = ImapConnectionPool(max_idle_per_account=2)
+
+    pool.release(pool.acquire("imap.test.com", "user", "pass"))
+    pool.keepalive()
+    mail = pool.acquire("imap.test.com", "user", "pass")
+
+    assert mail is fresh
+    broken.logout.assert_called_once()
+
+
+@patch("app.core.imap.imaplib.IMAP4_SSL")
+def test_imap_pool_discards_on_connection_error(mock_imap):
+    """Test that a session is not returned to the pool after it aborted."""
+    pool = ImapConnectionPool(max_idle_per_account=2)
+
+    try:
+        with pool.connection("imap.test.com", "user", "pass"):
+            raise OSError("connection reset")
+    except OSError:
+        pass
+    pool.acquire("imap.test.com", "user", "pass")
+
+    assert mock_imap.call_count == 2
+
+
+def test_parse_fetch_response():
+    """Test splitting a multi-message UID FETCH response by UID."""
+    data = [
+        (b"1 (UID 10 BODY[] {5}", b"first"),
+        b")",
+        (b"2 (BODY[] {6}", b"second"),
+        b" UID 12)",
+        b"3 (UID 13 FLAGS (\\Seen))",
+    ]
+    assert parse_fetch_response(data) == {10: b"first", 12: b"second"}
+
+
+def test_format_uid_set():
+    """Test compressing UIDs into an IMAP sequence set."""
+    assert format_uid_set([9, 1, 2, 3, 7, 10, 2]) == "1:3,7,9:10"
+
+
+def test_fetch_in_chunks():
+    """Test that UIDs are fetched with one UID FETCH per chunk."""
+    mock_mail = MagicMock()
+    mock_mail.uid.side_effect = lambda command, message_set, items: (
+        "OK",
+        [
+            (b"1 (UID %s BODY[] {1}" % uid.encode(), b"x")
+            for uid in message_set.split(",")
+        ],
+    )
+
+    chunks = list(fetch_in_chunks(mock_mail, [1, 3, 5, 7, 9], "(BODY.PEEK[])", 2))
+
+    assert [sorted(chunk) for chunk in chunks] == [[1, 3], [5, 7], [9]]
+    assert [c.args[1] for c in mock_mail.uid.call_args_list] == ["1,3", "5,7", "9"]
+
+
+@patch("app.core.imap.select.select")
+def test_idle_wait_returns_on_exists(mock_select):
+    """Test that IDLE ends with DONE as soon as the server reports a new message."""
+    mock_select.side_effect = lambda r, w, x, timeout: (r, [], [])
+    mock_mail = MagicMock()
+    mock_mail.file.peek.return_value = b""
+    sent = []
+    mock_mail.send.side_effect = sent.append
+    lines = iter([b"+ idling\r\n", b"* OK Still here\r\n", b"* 4 EXISTS\r\n"])
+    mock_mail.readline.side_effect = lambda: next(
+        lines, sent[0].split(b" ")[0] + b" OK IDLE terminated\r\n"
+    )
+
+    assert idle_wait(mock_mail, 60)
+    assert sent[0].endswith(b" IDLE\r\n")
+    assert sent[1] == b"DONE\r\n"
+
+
+@patch("app.core.imap.select.select")
+def test_idle_wait_times_out(mock_select):
+    """Test that IDLE is ended without new mail once the timeout passes."""
+    mock_select.return_value = ([], [], [])
+    mock_mail = MagicMock()
+    mock_mail.file.peek.return_value = b""
+    sent = []
+    mock_mail.send.side_effect = sent.append
+    lines = iter([b"+ idling\r\n"])
+    mock_mail.readline.side_effect = lambda: next(
+        lines, sent[0].split(b" ")[0] + b" OK IDLE terminated\r\n"
+    )
+
+    assert not idle_wait(mock_mail, 60)
+    assert sent[1] == b"DONE\r\n"
+
+
+def test_idle_wait_reads_exists_buffered_with_continuation():
+    """Test that an EXISTS sent in the same packet as the continuation is seen."""
+    client, server = socket.socketpair()
+    mail = MagicMock()
+    mail.sock = client
+    mail.file = client.makefile("rb")
+    mail.readline.side_effect = mail.file.readline
+    mail.send.side_effect = client.sendall
+
+    def serve():
+        with server.makefile("rb") as lines:
+            tag = lines.readline().split(b" ")[0]
+            server.sendall(b"+ idling\r\n* 2 EXISTS\r\n")
+            assert lines.readline() == b"DONE\r\n"
+            server.sendall(tag + b" OK IDLE terminated\r\n")
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        started = time.monotonic()
+        assert idle_wait(mail, 5)
+        assert time.monotonic() - started < 1
+    finally:
+        thread.join()
+        mail.file.close()
+        client.close()
+        server.close()
+
+
+@patch("app.core.idle.ImapIdleListener")
+@patch("app.core.idle.get_search_folders")
+def test_sync_idle_listeners(mock_get_search_folders, mock_listener, db_session):
+    """Test that one IDLE listener runs per watched folder."""
+    from app.core import idle
+
+    mock_get_search_folders.return_value = ["INBOX", "Newsletters"]
+    with patch.object(
+        idle, "env_settings", idle.env_settings.model_copy(update={"imap_idle": True})
+    ):
+        idle.sync_idle_listeners(db_session)
+        idle.sync_idle_listeners(db_session)
+        assert sorted(c.args[0] for c in mock_listener.call_args_list) == [
+            "INBOX",
+            "Newsletters",
+        ]
+        idle.stop_idle_listeners()
+    assert mock_listener.return_value.stop.call_count == 2
+
+
 @patch("app.services.email_processor.imaplib.IMAP4_SSL")
 def test_process_emails(mock_imap, db_session: Session):
     """Test processing emails."""
@@ -68,24 +284,24 @@ def test_process_emails(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
 
     # Mock email content
     mock_msg_bytes = b"From: newsletter@example.com\nSubject: Test Subject\nMessage-ID: <test@test.com>\n\n<p>Test Body</p>"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command(b"1", mock_msg_bytes)
 
     process_emails(db_session)
 
     # Assertions
     mock_mail.login.assert_called_once_with("test@test.com", "password")
     mock_mail.select.assert_called_once_with("INBOX")
-    mock_mail.search.assert_called_once_with(None, "(UNSEEN)")
-    mock_mail.fetch.assert_called_once_with(b"1", "(BODY.PEEK[])")
-    mock_mail.store.assert_any_call(b"1", "+FLAGS", "\\Seen")
-    mock_mail.copy.assert_called_once_with(b"1", "Processed")
-    mock_mail.store.assert_any_call(b"1", "+FLAGS", "\\Deleted")
+    mock_mail.uid.assert_any_call("SEARCH", None, "(UNSEEN)")
+    mock_mail.uid.assert_any_call("FETCH", "1", "(BODY.PEEK[])")
+    mock_mail.uid.assert_any_call("STORE", "1", "+FLAGS", "\\Seen")
+    mock_mail.uid.assert_any_call("COPY", "1", "Processed")
+    mock_mail.uid.assert_any_call("STORE", "1", "+FLAGS", "\\Deleted")
     mock_mail.expunge.assert_called_once()
-    mock_mail.logout.assert_called_once()
+    # The session goes back to the pool instead of being logged out.
+    mock_mail.logout.assert_not_called()
 
     # Verify entry in DB
     from app.crud.entries import get_entries_by_newsletter
@@ -120,17 +336,24 @@ def test_start_scheduler_with_interval(
     )
     create_or_update_settings(db_session, settings_data)
 
-    from app.core.scheduler import start_scheduler_with_interval
+    from app.core.scheduler import render_fragments_job, start_scheduler_with_interval
 
     start_scheduler_with_interval()
 
-    mock_scheduler.add_job.assert_called_with(
+    mock_scheduler.add_job.assert_any_call(
         ANY,
         "date",
         run_date=fixed_now,
         id="initial_email_check",
         replace_existing=True,
     )
+    mock_scheduler.add_job.assert_any_call(
+        render_fragments_job,
+        "date",
+        run_date=fixed_now,
+        id="render_missing_fragments",
+        replace_existing=True,
+    )
     mock_scheduler.start.assert_called_once()
 
 
@@ -160,9 +383,8 @@ def test_process_emails_auto_add_sender(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
     mock_msg_bytes = b"From: New Sender <new@example.com>\nSubject: New Email\nMessage-ID: <new@new.com>\n\nHello"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command(b"1", mock_msg_bytes)
 
     process_emails(db_session)
 
@@ -207,14 +429,14 @@ def test_process_emails_no_move_or_read(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
     mock_msg_bytes = b"From: newsletter@example.com\nSubject: Test Subject\nMessage-ID: <test@test.com>\n\nTest Body"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command(b"1", mock_msg_bytes)
 
     process_emails(db_session)
 
-    mock_mail.store.assert_not_called()
-    mock_mail.copy.assert_not_called()
+    uid_commands = [c.args[0] for c in mock_mail.uid.call_args_list]
+    assert "STORE" not in uid_commands
+    assert "COPY" not in uid_commands
 
 
 @patch("app.services.email_processor.imaplib.IMAP4_SSL")
@@ -249,10 +471,9 @@ def test_process_emails_avoids_duplicates(mock_imap, db_session: Session):
     mock_imap.return_value = mock_mail
     mock_mail.login.return_value = ("OK", [b"Login successful"])
     mock_mail.select.return_value = ("OK", [b"1"])
-    mock_mail.search.return_value = ("OK", [b"1"])
     # This email has the same Message-ID as the one we just created
     mock_msg_bytes = b"From: newsletter@example.com\nSubject: Test Subject\nMessage-ID: <existing@message.com>\n\nTest Body"
-    mock_mail.fetch.return_value = ("OK", [(None, mock_msg_bytes)])
+    mock_mail.uid.side_effect = _mock_uid_command(b"1", mock_msg_bytes)
 
     process_emails(db_session)
 
@@ -262,3 +483,87 @@ def test_process_emails_avoids_duplicates(mock_imap, db_session: Session):
     entries = get_entries_by_newsletter(db_session, newsletter.id)
     assert len(entries) == 1
     assert entries[0].subject == "Existing Subject"
+
+
+def test_sqlite_connections_are_tuned():
+    """Test that both engines open their SQLite connections with the PRAGMAs."""
+    expected = {
+        "journal_mode": "wal",
+        # NORMAL
+        "synchronous": 1,
+        "busy_timeout": settings.sqlite_busy_timeout,
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+        # MEMORY
+        "temp_store": 2,
+    }
+    with engine.connect() as connection:
+        for name, value in expected.items():
+            assert connection.exec_driver_sql(f"PRAGMA {name}").scalar() == value
+
+    async def read_async_pragmas():
+        async with async_engine.connect() as connection:
+            return {
+                name: (await connection.exec_driver_sql(f"PRAGMA {name}")).scalar()
+                for name in expected
+            }
+
+    assert asyncio.run(read_async_pragmas()) == expected
+
+
+def test_body_stores(db_session: Session, tmp_path):
+    """Test that both body stores keep bodies by hash, once per distinct body."""
+    bodies = {body_hash(body): body for body in ["<p>One</p>", "<p>Two</p>" * 100]}
+    for store in [DatabaseBodyStore(), FileBodyStore(tmp_path)]:
+        store.put(db_session, bodies)
+        store.put(db_session, bodies)
+        db_session.commit()
+        assert store.get(db_session, list(bodies) + ["unknown"]) == bodies
+        store.delete(db_session, [body_hash("<p>One</p>")])
+        assert list(store.get(db_session, bodies)) == [body_hash("<p>Two</p>" * 100)]
+    assert len(list(tmp_path.rglob("*.zst"))) == 1
+
+    codec, data = encode_body("<p>Two</p>" * 100)
+    assert codec == "zstd"
+    assert len(data) < 100
+
+    # Bodies stored uncompressed by earlier versions stay readable.
+    one = tmp_path / body_hash("<p>One</p>")[:2] / f"{body_hash('<p>One</p>')}.html"
+    one.write_text("<p>One</p>")
+    assert FileBodyStore(tmp_path).get(None, bodies) == bodies
+    assert decode_body("identity", b"<p>One</p>") == "<p>One</p>"
+
+
+def test_body_stores_keep_dictionaries(db_session: Session, tmp_path):
+    """Test that bodies compressed with a dictionary are read back with it."""
+    samples = [
+        f"<html><style>.a{{color:red}}</style><p>Issue {i}</p>{'<p>Hi</p>' * i}</html>"
+        for i in range(200)
+    ]
+    dictionary = train_dictionary(samples, 2048)
+    bodies = {body_hash(body): body for body in samples[:5]}
+    for store in [DatabaseBodyStore(), FileBodyStore(tmp_path)]:
+        store.add_dictionary(db_session, dictionary)
+        store.put(db_session, bodies)
+        store.put(db_session, bodies, dictionary.dict_id(), replace=True)
+        db_session.commit()
+        # Dictionaries and decompressors are cached once loaded.
+        with (
+            patch.dict(body_store._dictionaries, clear=True),
+            patch.object(body_store, "_local", threading.local()),
+        ):
+            assert store.get(db_session, bodies) == bodies
+        assert dictionary.dict_id() in body_store._dictionaries
+    assert len(list(tmp_path.rglob("*.dict"))) == 1
+
+    _, data = encode_body(samples[0], dictionary)
+    assert len(data) < len(encode_body(samples[0])[1])
+    with patch.object(body_store, "_local", threading.local()):
+        # Loaded dictionaries decode bodies in any thread, without a session.
+        assert decode_body("zstd", data) == samples[0]
+    with (
+        patch.dict(body_store._dictionaries, clear=True),
+        patch.object(body_store, "_local", threading.local()),
+    ):
+        with pytest.raises(LookupError):
+            decode_body("zstd", data)
@@ -1,16 +1,44 @@
+import os
 import time
 import uuid
+from contextlib import contextmanager
+from datetime import datetime
 from unittest.mock import patch
 
+import pytest
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from app.crud.entries import create_entry, get_all_entries, get_entries_by_newsletter
+from app.core.body_store import (
+    DatabaseBodyStore,
+    FileBodyStore,
+    body_hash,
+    train_dictionary,
+)
+from app.core.config import settings as env_settings
+from app.core.database import SessionLocal
+from app.crud.entries import (
+    create_entries,
+    create_entry,
+    discard_unreferenced_bodies,
+    get_all_entries,
+    get_entries_by_newsletter,
+    get_entry_keys,
+    get_entry_stats,
+    get_existing_message_ids,
+    iter_feed_rows,
+    move_bodies,
+)
 from app.crud.newsletters import (
     create_newsletter,
+    delete_newsletter,
     get_newsletter_by_identifier,
     get_newsletters,
+    repair_entry_stats,
 )
 from app.crud.settings import create_or_update_settings, get_settings
+from app.models.entries import Entry
+from app.models.entry_bodies import EntryBody
 from app.schemas.entries import EntryCreate
 from app.schemas.newsletters import NewsletterCreate
 from app.schemas.settings import SettingsCreate
@@ -228,6 +256,32 @@ def test_create_entry(db_session: Session):
     assert entry.newsletter_id == newsletter.id
 
 
+def test_create_entries_and_get_existing_message_ids(db_session: Session):
+    """Test creating entries in one batch and looking up their message_ids at once."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(
+            name="Batch Newsletter", sender_emails=[f"batch_{uuid.uuid4()}@test.com"]
+        ),
+    )
+    entries = [
+        (
+            EntryCreate(subject=f"Entry {i}", body="Body", message_id=f"<{i}@test>"),
+            newsletter.id,
+        )
+        for i in range(3)
+    ]
+
+    with patch.object(db_session, "commit", wraps=db_session.commit) as mock_commit:
+        created = create_entries(db_session, entries)
+
+    mock_commit.assert_called_once()
+    assert [e.subject for e in created] == ["Entry 0", "Entry 1", "Entry 2"]
+    assert get_existing_message_ids(
+        db_session, ["<0@test>", "<2@test>", "<unknown@test>"]
+    ) == {"<0@test>", "<2@test>"}
+
+
 def test_get_entries_by_newsletter(db_session: Session):
     """Test getting entries for a newsletter."""
     unique_email = f"sender_{uuid.uuid4()}@test.com"
@@ -308,6 +362,57 @@ def test_delete_newsletter(db_session: Session):
     assert get_newsletter_by_identifier(db_session, newsletter.id) is None
 
 
+def test_entry_counters_follow_entries(db_session: Session):
+    """Test that the entry counters of newsletters are kept and can be repaired."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Counted", sender_emails=["counted@example.com"]),
+    )
+    assert (newsletter.entry_count, newsletter.last_received_at) == (0, None)
+
+    def entry(day: int) -> EntryCreate:
+        return EntryCreate(
+            subject=f"Day {day}",
+            body="b",
+            message_id=f"<counted-{day}@test.com>",
+            received_at=datetime(2024, 5, day),
+        )
+
+    create_entry(db_session, entry(2), newsletter.id)
+    create_entries(db_session, [(entry(1), newsletter.id), (entry(3), newsletter.id)])
+    newsletter = get_newsletter_by_identifier(db_session, newsletter.id)
+    assert newsletter.entry_count == 3
+    assert newsletter.entries_count == 3
+    assert newsletter.last_received_at == datetime(2024, 5, 3)
+
+    # An older entry does not move the timestamp back.
+    create_entry(
+        db_session,
+        entry(4).model_copy(
+            update={
+                "message_id": "<counted-old@test.com>",
+                "received_at": datetime(2024, 4, 1),
+            }
+        ),
+        newsletter.id,
+    )
+    db_session.refresh(newsletter)
+    assert (newsletter.entry_count, newsletter.last_received_at) == (
+        4,
+        datetime(2024, 5, 3),
+    )
+
+    assert repair_entry_stats(db_session) == []
+    newsletter.entry_count = 10
+    newsletter.last_received_at = None
+    db_session.commit()
+    assert repair_entry_stats(db_session) == [newsletter.id]
+    assert (newsletter.entry_count, newsletter.last_received_at) == (
+        4,
+        datetime(2024, 5, 3),
+    )
+
+
 def test_create_multiple_entries_have_different_timestamps(db_session: Session):
     """Test that multiple entries for the same newsletter have different timestamps."""
     import time
@@ -332,6 +437,163 @@ def test_create_multiple_entries_have_different_timestamps(db_session: Session):
     assert entry1.received_at != entry2.received_at
 
 
+@contextmanager
+def _statements(db: Session):
+    """Record the SQL statements that the session runs."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", record)
+
+
+def test_entry_bodies_are_stored_once_and_loaded_lazily(db_session: Session):
+    """Test that entries share stored bodies, which are only read when needed."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Bodies", sender_emails=["bodies@example.com"]),
+    )
+    shared, single = "<p>Shared</p>" * 100, "<p>Single</p>"
+    first = create_entry(
+        db_session,
+        EntryCreate(subject="1", body=shared, message_id="<bodies-1@test.com>"),
+        newsletter.id,
+    )
+    second, _ = create_entries(
+        db_session,
+        [
+            (
+                EntryCreate(subject="2", body=shared, message_id="<bodies-2@test.com>"),
+                newsletter.id,
+            ),
+            (
+                EntryCreate(subject="3", body=single, message_id="<bodies-3@test.com>"),
+                newsletter.id,
+            ),
+        ],
+    )
+    assert db_session.query(EntryBody).count() == 2
+    assert first.body_hash == second.body_hash
+    assert "body" not in {column.name for column in Entry.__table__.columns}
+    newsletter_id = newsletter.id
+
+    db_session.expunge_all()
+    with _statements(db_session) as statements:
+        entries = get_entries_by_newsletter(db_session, newsletter_id)
+    assert not any("entry_bodies" in statement for statement in statements)
+    with _statements(db_session) as statements:
+        assert [entry.body for entry in entries] == [single, shared, shared]
+    assert len(statements) == 3
+
+    # Stored bodies go once no entry refers to them anymore.
+    delete_newsletter(db_session, newsletter_id)
+    assert db_session.query(EntryBody).count() == 0
+
+
+@pytest.mark.parametrize(
+    "body_store, hook, statement_start",
+    # The entry is stored right before the bodies are deleted, or right after the
+    # references are checked.
+    [
+        ("database", "before_cursor_execute", "DELETE FROM entry_bodies"),
+        ("filesystem", "after_cursor_execute", "SELECT entries.body_hash"),
+    ],
+)
+def test_discard_keeps_bodies_of_concurrent_entries(
+    db_session: Session, tmp_path, body_store: str, hook: str, statement_start: str
+):
+    """Test that a body found by a concurrent put survives its discard."""
+    stored_in = env_settings.model_copy(
+        update={"body_store": body_store, "body_store_dir": str(tmp_path)}
+    )
+    with patch("app.core.body_store.settings", stored_in):
+        deleted, kept = (
+            create_newsletter(
+                db_session,
+                NewsletterCreate(name=name, sender_emails=[f"{name}@example.com"]),
+            )
+            for name in ("deleted", "kept")
+        )
+        body = "<p>Shared</p>"
+        entry = create_entry(
+            db_session,
+            EntryCreate(subject="Old", body=body, message_id="<old@test.com>"),
+            deleted.id,
+        )
+        for path in tmp_path.rglob("*.zst"):
+            # The file was written long before the discard.
+            os.utime(path, (0, 0))
+        db_session.delete(entry)
+        db_session.commit()
+        kept_id = kept.id
+
+        entered = []
+
+        def store_entry_concurrently(conn, cursor, statement, *args):
+            # A sync run stores an entry with the same body as the discard runs.
+            if not entered and statement.startswith(statement_start):
+                entered.append(True)
+                with SessionLocal() as other:
+                    create_entry(
+                        other,
+                        EntryCreate(
+                            subject="New", body=body, message_id="<new@test.com>"
+                        ),
+                        kept_id,
+                    )
+
+        event.listen(db_session.get_bind(), hook, store_entry_concurrently)
+        try:
+            discard_unreferenced_bodies(db_session, {body_hash(body)})
+        finally:
+            event.remove(db_session.get_bind(), hook, store_entry_concurrently)
+
+        assert entered
+        db_session.expunge_all()
+        assert [e.body for e in get_entries_by_newsletter(db_session, kept_id)] == [
+            body
+        ]
+
+
+def test_move_bodies_between_stores(db_session: Session, tmp_path):
+    """Test that bodies and their dictionaries move between body stores."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Moved", sender_emails=["moved@example.com"]),
+    )
+    bodies = [f"<p>Issue {number}</p>" * 20 for number in range(50)]
+    create_entries(
+        db_session,
+        [
+            (
+                EntryCreate(subject="Issue", body=body, message_id=f"<move-{i}@test>"),
+                newsletter.id,
+            )
+            for i, body in enumerate(bodies)
+        ],
+    )
+    database, files = DatabaseBodyStore(), FileBodyStore(tmp_path)
+    dictionary = train_dictionary(bodies, 1024)
+    database.add_dictionary(db_session, dictionary)
+    keys = {body_hash(body): body for body in bodies}
+    database.put(db_session, keys, dictionary.dict_id(), replace=True)
+    db_session.commit()
+
+    assert move_bodies(db_session, database, files) == len(bodies)
+    assert db_session.query(EntryBody).count() == 0
+    assert files.get(None, keys) == keys
+    assert (tmp_path / "dictionaries" / f"{dictionary.dict_id()}.dict").exists()
+
+    assert move_bodies(db_session, files, database) == len(bodies)
+    assert not list(tmp_path.rglob("*.zst"))
+    assert database.get(db_session, keys) == keys
+
+
 def test_get_all_entries(db_session: Session):
     """Test getting all entries from all newsletters."""
     # Create two newsletters
@@ -386,3 +648,81 @@ def test_get_all_entries(db_session: Session):
     # Check that newsletter relationship is loaded
     assert all_entries[0].newsletter.name == "Newsletter One"
     assert all_entries[1].newsletter.name == "Newsletter Two"
+
+
+@contextmanager
+def _query_plans(db: Session):
+    """Record the EXPLAIN QUERY PLAN of every SELECT that the session runs."""
+    plans = []
+    engine = db.get_bind()
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plans.append([row[3] for row in cursor.fetchall()])
+
+    event.listen(engine, "before_cursor_execute", explain)
+    try:
+        yield plans
+    finally:
+        event.remove(engine, "before_cursor_execute", explain)
+
+
+def test_entry_queries_use_received_at_indexes(db_session: Session):
+    """Test that entry listings seek an index instead of scanning and sorting."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Indexed", sender_emails=["indexed@example.com"]),
+    )
+    entries = create_entries(
+        db_session,
+        [
+            (
+                EntryCreate(
+                    subject=f"Entry {i}", body="b", message_id=f"<indexed-{i}@test>"
+                ),
+                newsletter.id,
+            )
+            for i in range(3)
+        ],
+    )
+    cursor, since = entries[0], entries[-1]
+    # Load the expired objects now, so that only the queries under test are run.
+    newsletter_id = newsletter.id
+    db_session.refresh(cursor)
+    db_session.refresh(since)
+    by_newsletter = "ix_entries_newsletter_id_received_at"
+    all_entries = "ix_entries_received_at"
+
+    queries = [
+        (lambda: get_entries_by_newsletter(db_session, newsletter_id), by_newsletter),
+        (
+            lambda: get_entries_by_newsletter(
+                db_session, newsletter_id, limit=2, before=cursor
+            ),
+            by_newsletter,
+        ),
+        (lambda: get_all_entries(db_session, limit=2, before=cursor), all_entries),
+        (lambda: get_entry_keys(db_session, newsletter_id, limit=2), by_newsletter),
+        (lambda: get_entry_keys(db_session, limit=2, before=cursor), all_entries),
+        (lambda: get_entry_stats(db_session, newsletter_id), by_newsletter),
+        (lambda: get_entry_stats(db_session), all_entries),
+        (
+            lambda: list(iter_feed_rows(db_session, newsletter_id, since=since)),
+            by_newsletter,
+        ),
+        (
+            lambda: list(
+                iter_feed_rows(db_session, since=since, master=True, newest_first=True)
+            ),
+            all_entries,
+        ),
+    ]
+    for query, index in queries:
+        with _query_plans(db_session) as plans:
+            query()
+        assert len(plans) == 1
+        entries_plan = [detail for detail in plans[0] if " entries " in detail]
+        assert entries_plan, plans[0]
+        assert all(f"INDEX {index}" in detail for detail in entries_plan), plans[0]
+        assert not any("TEMP B-TREE" in detail for detail in plans[0]), plans[0]
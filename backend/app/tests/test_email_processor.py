@@ -1,38 +1,67 @@
 import imaplib
+import threading
+import time
+from datetime import datetime
 from email.message import Message
 from unittest.mock import MagicMock, patch
 
+import pytest
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.core.process_pool import shutdown_process_pool, submit_to_process_pool
+from app.crud.entries import create_entry
+from app.crud.extraction_cache import (
+    evict_cached_extractions,
+    get_cached_extraction,
+    save_cached_extraction,
+)
+from app.crud.imap_folders import (
+    get_folder_state,
+    reset_folder_states,
+    save_folder_state,
+)
 from app.crud.newsletters import create_newsletter
 from app.crud.settings import create_or_update_settings
 from app.models.newsletters import Newsletter
+from app.schemas.entries import EntryCreate
 from app.schemas.newsletters import NewsletterCreate
 from app.schemas.settings import Settings, SettingsCreate
-from app.services.email_processor import _process_single_email, process_emails
+from app.services.email_processor import (
+    FolderResult,
+    _apply_pending_actions,
+    _extract_and_clean_html,
+    _PendingActions,
+    _prepare_entry,
+    _PreparedEntry,
+    _process_folders_concurrently,
+    _select_newsletter_emails,
+    _store_entries,
+    _submit_extractions,
+    process_emails,
+)
+from app.services.html_extraction import extraction_cache_key
 
 
 def _setup_test_email_processing(
     db_session: Session,
     newsletter_create_data: NewsletterCreate,
     settings_create_data: SettingsCreate,
-) -> tuple[MagicMock, Newsletter, Settings]:
-    """Help to set up mocks and data for email processing tests."""
+) -> tuple[bytes, Newsletter, Settings]:
+    """Help to set up data for email processing tests."""
     settings = create_or_update_settings(db_session, settings_create_data)
     newsletter = create_newsletter(db_session, newsletter_create_data)
 
-    mock_mail = MagicMock(spec=imaplib.IMAP4_SSL)
     msg = Message()
     msg["From"] = newsletter_create_data.sender_emails[0]
     msg["Subject"] = "Test Email"
     msg["Message-ID"] = "<test-message-id>"
     msg.set_payload("<html><body><p>Original Body</p></body></html>", "utf-8")
-    mock_mail.fetch.return_value = ("OK", [(b"1 (RFC822)", msg.as_bytes())])
 
-    return mock_mail, newsletter, settings
+    return msg.as_bytes(), newsletter, settings
 
 
-def test_process_single_email_with_newsletter_move_folder(db_session: Session):
+def test_store_entries_with_newsletter_move_folder(db_session: Session):
     """Test that the per-newsletter move_to_folder is used, overriding the global setting."""
     # 1. ARRANGE
     settings_data = SettingsCreate(
@@ -46,20 +75,21 @@ def test_process_single_email_with_newsletter_move_folder(db_session: Session):
         sender_emails=["test@example.com"],
         move_to_folder="NewsletterArchive",
     )
-    mock_mail, newsletter, settings = _setup_test_email_processing(
+    raw_email, newsletter, settings = _setup_test_email_processing(
         db_session, newsletter_data, settings_data
     )
-    sender_map = {newsletter.senders[0].email: newsletter}
+
+    actions = _PendingActions()
 
     # 2. ACT
-    _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    prepared = _prepare_entry(1, raw_email, db_session, newsletter)
+    _store_entries(db_session, [prepared], settings, actions)
 
     # 3. ASSERT
-    mock_mail.copy.assert_called_once_with("1", "NewsletterArchive")
-    mock_mail.store.assert_any_call("1", "+FLAGS", "\\Deleted")
+    assert actions.moves == {"NewsletterArchive": {1}}
 
 
-def test_process_single_email_with_global_move_folder(db_session: Session):
+def test_store_entries_with_global_move_folder(db_session: Session):
     """Test that the global move_to_folder is used when the per-newsletter one is not set."""
     # 1. ARRANGE
     settings_data = SettingsCreate(
@@ -71,17 +101,18 @@ def test_process_single_email_with_global_move_folder(db_session: Session):
     newsletter_data = NewsletterCreate(
         name="Test Newsletter", sender_emails=["test@example.com"]
     )
-    mock_mail, newsletter, settings = _setup_test_email_processing(
+    raw_email, newsletter, settings = _setup_test_email_processing(
         db_session, newsletter_data, settings_data
     )
-    sender_map = {newsletter.senders[0].email: newsletter}
+
+    actions = _PendingActions()
 
     # 2. ACT
-    _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    prepared = _prepare_entry(1, raw_email, db_session, newsletter)
+    _store_entries(db_session, [prepared], settings, actions)
 
     # 3. ASSERT
-    mock_mail.copy.assert_called_once_with("1", "GlobalArchive")
-    mock_mail.store.assert_any_call("1", "+FLAGS", "\\Deleted")
+    assert actions.moves == {"GlobalArchive": {1}}
 
 
 @patch("app.services.email_processor._connect_to_imap")
@@ -153,7 +184,7 @@ def test_process_emails_uses_global_search_folder(
 
 
 @patch("app.services.email_processor._extract_and_clean_html")
-def test_process_single_email_with_content_extraction(
+def test_prepare_entry_with_content_extraction(
     mock_extract_clean,
     db_session: Session,
 ):
@@ -171,23 +202,19 @@ def test_process_single_email_with_content_extraction(
         sender_emails=["test@example.com"],
         extract_content=True,
     )
-    mock_mail, newsletter, settings = _setup_test_email_processing(
+    raw_email, newsletter, _ = _setup_test_email_processing(
         db_session, newsletter_data, settings_data
     )
-    sender_map = {newsletter.senders[0].email: newsletter}
 
     # 2. ACT
-    with patch("app.services.email_processor.create_entry") as mock_create_entry:
-        _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    prepared = _prepare_entry(1, raw_email, db_session, newsletter)
 
     # 3. ASSERT
     mock_extract_clean.assert_called_once()
-    # Check that create_entry was called with the extracted body
-    mock_create_entry.assert_called_once()
-    entry_create_arg = mock_create_entry.call_args[0][1]
-    assert entry_create_arg.body == "Extracted Body"
+    # Check that the entry has the extracted body
+    assert prepared.entry.body == "Extracted Body"
     # Subject should still come from the email, not the extracted title
-    assert entry_create_arg.subject == "Test Email"
+    assert prepared.entry.subject == "Test Email"
 
 
 def test_process_single_email_with_encoded_from_header(db_session: Session):
@@ -209,12 +236,12 @@ def test_process_single_email_with_encoded_from_header(db_session: Session):
     msg["Subject"] = "Test Email"
     msg["Message-ID"] = "<test-message-id-encoded-from>"
     msg.set_payload("<html><body><p>Body</p></body></html>", "utf-8")
-    mock_mail.fetch.return_value = ("OK", [(b"1 (RFC822)", msg.as_bytes())])
+    mock_mail.uid.return_value = ("OK", [(b"1 (UID 1 BODY[])", msg.as_bytes())])
 
     sender_map = {}  # empty, to trigger auto-add
 
     # 2. ACT
-    _process_single_email("1", mock_mail, db_session, sender_map, settings)
+    _select_newsletter_emails([1], mock_mail, db_session, sender_map, settings)
 
     # 3. ASSERT
     from app.crud.newsletters import get_newsletters
@@ -223,3 +250,451 @@ def test_process_single_email_with_encoded_from_header(db_session: Session):
     assert len(newsletters) == 1
     assert newsletters[0].name == "Кирилл"
     assert newsletters[0].senders[0].email == "test@example.com"
+
+
+def _setup_uid_sync_mail(
+    search_results: list[bytes], uidvalidity: bytes, unfetched: tuple[int, ...] = ()
+) -> MagicMock:
+    """Help to set up an IMAP mock for UID sync tests.
+
+    Header fetches return emails without a Message-ID, which are skipped, except
+    for the UIDs in unfetched, which the server leaves out of its response.
+    """
+    mock_mail = MagicMock()
+    mock_mail.select.return_value = ("OK", [b"3"])
+    mock_mail.response.side_effect = lambda code: (
+        code,
+        [uidvalidity if code == "UIDVALIDITY" else b"4"],
+    )
+    searches = iter(search_results)
+
+    def uid(command, *args):
+        if command == "SEARCH":
+            return ("OK", [next(searches)])
+        response = []
+        for part in args[0].split(","):
+            first, _, last = part.partition(":")
+            for fetched_uid in range(int(first), int(last or first) + 1):
+                if fetched_uid not in unfetched:
+                    header = b"From: other@example.com\r\n\r\n"
+                    envelope = b"%d (UID %d BODY[HEADER] {1}" % ((fetched_uid,) * 2)
+                    response += [(envelope, header), b")"]
+        return ("OK", response)
+
+    mock_mail.uid.side_effect = uid
+    return mock_mail
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_resumes_from_uid_checkpoint(mock_imap, db_session: Session):
+    """Test that a second run only searches for UIDs above the stored checkpoint."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="test.com",
+            imap_username="test",
+            imap_password="password",
+            auto_add_new_senders=True,
+        ),
+    )
+    # The second search returns the highest UID, as servers do for "n:*" ranges.
+    mock_mail = _setup_uid_sync_mail([b"1 3", b"3"], uidvalidity=b"7")
+    mock_imap.return_value = mock_mail
+
+    process_emails(db_session)
+    process_emails(db_session)
+
+    searches = [c.args for c in mock_mail.uid.call_args_list if c.args[0] == "SEARCH"]
+    assert searches == [
+        ("SEARCH", None, "(UNSEEN)"),
+        ("SEARCH", None, "(UNSEEN UID 4:*)"),
+    ]
+    fetched = [c.args[1] for c in mock_mail.uid.call_args_list if c.args[0] == "FETCH"]
+    assert fetched == ["1,3"]
+    assert "(BODY.PEEK[])" not in [c.args[-1] for c in mock_mail.uid.call_args_list]
+
+    state = get_folder_state(db_session, "test@test.com", "INBOX")
+    assert state.uidvalidity == 7
+    assert state.last_uid == 3
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_rescans_on_uidvalidity_change(mock_imap, db_session: Session):
+    """Test that a changed UIDVALIDITY discards the checkpoint and rescans the folder."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="test.com",
+            imap_username="test",
+            imap_password="password",
+            auto_add_new_senders=True,
+        ),
+    )
+    save_folder_state(db_session, "test@test.com", "INBOX", uidvalidity=1, last_uid=10)
+    mock_mail = _setup_uid_sync_mail([b""], uidvalidity=b"2")
+    mock_imap.return_value = mock_mail
+
+    process_emails(db_session)
+
+    mock_mail.uid.assert_any_call("SEARCH", None, "(UNSEEN)")
+    state = get_folder_state(db_session, "test@test.com", "INBOX")
+    assert state.uidvalidity == 2
+    assert state.last_uid == 3
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_keeps_checkpoint_before_unfetched_uid(
+    mock_imap, db_session: Session
+):
+    """Test that the checkpoint stops before the first email whose headers failed."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="test.com",
+            imap_username="test",
+            imap_password="password",
+            auto_add_new_senders=True,
+        ),
+    )
+    mock_mail = _setup_uid_sync_mail(
+        [b"1 2 3", b"2 3"], uidvalidity=b"7", unfetched=(2,)
+    )
+    mock_imap.return_value = mock_mail
+
+    process_emails(db_session)
+    assert get_folder_state(db_session, "test@test.com", "INBOX").last_uid == 1
+
+    process_emails(db_session)
+
+    searches = [c.args for c in mock_mail.uid.call_args_list if c.args[0] == "SEARCH"]
+    assert searches[-1] == ("SEARCH", None, "(UNSEEN UID 2:*)")
+
+
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_does_not_undo_reset(mock_imap, db_session: Session):
+    """Test that a run does not save its checkpoint over a reset made meanwhile."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="test.com",
+            imap_username="test",
+            imap_password="password",
+            auto_add_new_senders=True,
+        ),
+    )
+    mock_mail = _setup_uid_sync_mail([b"1 3"], uidvalidity=b"7")
+    fetch = mock_mail.uid.side_effect
+
+    def uid(command, *args):
+        # A newsletter is created while the run is searching the folder.
+        if command == "SEARCH":
+            reset_folder_states(db_session)
+        return fetch(command, *args)
+
+    mock_mail.uid.side_effect = uid
+    mock_imap.return_value = mock_mail
+
+    process_emails(db_session)
+
+    assert get_folder_state(db_session, "test@test.com", "INBOX") is None
+
+
+def test_select_newsletter_emails_fetches_only_headers(db_session: Session):
+    """Test that emails are filtered on their headers before any body is downloaded."""
+    settings = create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="test.com", imap_username="test", imap_password="password"
+        ),
+    )
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Test Newsletter", sender_emails=["test@example.com"]),
+    )
+    create_entry(
+        db_session,
+        EntryCreate(subject="Old", body="Old", message_id="<known@example.com>"),
+        newsletter.id,
+    )
+    headers = {
+        1: b"From: test@example.com\r\nMessage-ID: <new@example.com>\r\n\r\n",
+        2: b"From: other@example.com\r\nMessage-ID: <other@example.com>\r\n\r\n",
+        3: b"From: test@example.com\r\nMessage-ID: <known@example.com>\r\n\r\n",
+        4: b"From: test@example.com\r\n\r\n",
+    }
+    mock_mail = MagicMock(spec=imaplib.IMAP4_SSL)
+    mock_mail.uid.return_value = (
+        "OK",
+        [
+            item
+            for uid, header in headers.items()
+            for item in ((b"%d (UID %d BODY[HEADER] {1}" % (uid, uid), header), b")")
+        ],
+    )
+    sender_map = {"test@example.com": newsletter}
+
+    selected, unfetched = _select_newsletter_emails(
+        [1, 2, 3, 4, 5], mock_mail, db_session, sender_map, settings
+    )
+
+    assert [(uid, nl.id) for uid, nl in selected] == [(1, newsletter.id)]
+    assert unfetched == {5}
+    mock_mail.uid.assert_called_once_with(
+        "FETCH",
+        "1:5",
+        "(BODY.PEEK[HEADER.FIELDS (FROM MESSAGE-ID SUBJECT DATE)])",
+    )
+
+
+def test_apply_pending_actions_uses_uid_move():
+    """Test that moves are grouped by folder and use UID MOVE when available."""
+    mock_mail = MagicMock()
+    mock_mail.capabilities = ("IMAP4REV1", "MOVE", "UIDPLUS")
+    actions = _PendingActions(
+        mark_as_read={1, 2, 3, 5},
+        moves={"Archive": {1, 2, 3}, "Other": {5}},
+    )
+
+    _apply_pending_actions(mock_mail, actions, "INBOX")
+
+    assert [c.args for c in mock_mail.uid.call_args_list] == [
+        ("STORE", "1:3,5", "+FLAGS", "\\Seen"),
+        ("MOVE", "1:3", "Archive"),
+        ("MOVE", "5", "Other"),
+    ]
+    mock_mail.expunge.assert_not_called()
+
+
+def test_apply_pending_actions_uses_uid_expunge_with_uidplus():
+    """Test that only the moved UIDs are expunged when UIDPLUS is available."""
+    mock_mail = MagicMock()
+    mock_mail.capabilities = ("IMAP4REV1", "UIDPLUS")
+    actions = _PendingActions(moves={"Archive": {4, 7}})
+
+    _apply_pending_actions(mock_mail, actions, "INBOX")
+
+    assert [c.args for c in mock_mail.uid.call_args_list] == [
+        ("COPY", "4,7", "Archive"),
+        ("STORE", "4,7", "+FLAGS", "\\Deleted"),
+        ("EXPUNGE", "4,7"),
+    ]
+    mock_mail.expunge.assert_not_called()
+
+
+def test_apply_pending_actions_without_extensions():
+    """Test the COPY, STORE and EXPUNGE fallback for basic IMAP4rev1 servers."""
+    mock_mail = MagicMock()
+    mock_mail.capabilities = ("IMAP4REV1",)
+    actions = _PendingActions(moves={"Archive": {4}})
+
+    _apply_pending_actions(mock_mail, actions, "INBOX")
+
+    mock_mail.uid.assert_any_call("COPY", "4", "Archive")
+    mock_mail.expunge.assert_called_once()
+
+
+@patch("app.services.email_processor._process_folder_in_worker")
+def test_process_folders_concurrently(mock_worker):
+    """Test that folders run in parallel and a hung folder is reported as timed out."""
+    release = threading.Event()
+    running = set()
+
+    def worker(settings, search_folder, newsletter_ids, generation):
+        running.add(search_folder)
+        if search_folder == "Hung":
+            release.wait(5)
+        else:
+            time.sleep(0.1)
+        return FolderResult(search_folder, new_entries=len(newsletter_ids))
+
+    mock_worker.side_effect = worker
+    env = MagicMock(imap_max_workers=3, imap_folder_timeout=0.5)
+    folder_groups = {
+        "INBOX": [MagicMock(id="a"), MagicMock(id="b")],
+        "Hung": [],
+        "Other": [MagicMock(id="c")],
+    }
+
+    started = time.monotonic()
+    with patch("app.services.email_processor.env_settings", env):
+        results = _process_folders_concurrently(MagicMock(), folder_groups, 0)
+    release.set()
+
+    assert time.monotonic() - started < 2
+    assert running == {"INBOX", "Hung", "Other"}
+    assert [r.folder for r in results] == ["INBOX", "Hung", "Other"]
+    assert [r.new_entries for r in results] == [2, 0, 1]
+    assert results[1].timed_out and results[1].error
+    assert not results[0].error and not results[2].error
+
+
+def test_extract_and_clean_html_in_process_pool(db_session: Session):
+    """Test that content extraction runs in the process pool and is cached."""
+    html = (
+        "<html><head><title>Weekly</title></head><body>"
+        "<article><p>Hello <script>alert(1)</script><strong>world</strong></p></article>"
+        "</body></html>"
+    )
+    try:
+        result = _extract_and_clean_html(db_session, html)
+    finally:
+        shutdown_process_pool()
+
+    assert result["title"] == "Weekly"
+    assert "<strong>world</strong>" in result["body"]
+    assert "script" not in result["body"]
+
+    with patch("app.services.email_processor.submit_to_process_pool") as mock_submit:
+        assert _extract_and_clean_html(db_session, html) == result
+    mock_submit.assert_not_called()
+
+
+def test_extraction_cache_evicts_least_recently_used(db_session: Session):
+    """Test that the extraction cache keeps only the most recently used entries."""
+    with patch("app.crud.extraction_cache.datetime") as mock_datetime:
+        for minute, key in enumerate(["a", "b", "c"]):
+            mock_datetime.datetime.now.return_value = datetime(2024, 1, 1, 0, minute)
+            save_cached_extraction(db_session, key, key.upper(), f"<p>{key}</p>")
+            save_cached_extraction(db_session, key, key.upper(), f"<p>{key}</p>")
+            db_session.commit()
+        mock_datetime.datetime.now.return_value = datetime(2024, 1, 1, 0, 5)
+        get_cached_extraction(db_session, "a")
+        db_session.commit()
+
+    # Cache hits and saves go with the caller's commit.
+    save_cached_extraction(db_session, "d", "D", "<p>d</p>")
+    db_session.rollback()
+    assert get_cached_extraction(db_session, "d") is None
+
+    assert evict_cached_extractions(db_session, max_entries=2) == 1
+    assert get_cached_extraction(db_session, "a") is not None
+    assert get_cached_extraction(db_session, "b") is None
+    assert get_cached_extraction(db_session, "c") is not None
+    assert evict_cached_extractions(db_session, max_entries=2) == 0
+
+
+def test_extraction_cache_key_depends_on_content():
+    """Test that equal bodies share a cache key and different bodies do not."""
+    assert extraction_cache_key("<p>a</p>") == extraction_cache_key("<p>a</p>")
+    assert extraction_cache_key("<p>a</p>") != extraction_cache_key("<p>b</p>")
+
+
+def test_submit_to_process_pool_runs_inline_when_disabled():
+    """Test that work runs in the calling process when the pool size is 0."""
+    with patch("app.core.process_pool.env_settings", MagicMock(extraction_workers=0)):
+        future = submit_to_process_pool(max, 1, 3)
+    assert future.done()
+    assert future.result() == 3
+
+
+@patch("app.services.email_processor._submit_extraction")
+def test_submit_extractions_only_for_extracting_newsletters(mock_submit):
+    """Test that only emails of extracting newsletters are submitted, once per body."""
+    msg = Message()
+    msg.set_payload("<p>Body</p>")
+    raw = msg.as_bytes()
+    newsletters = {
+        1: MagicMock(extract_content=True),
+        2: MagicMock(extract_content=False),
+        3: MagicMock(extract_content=True),
+    }
+    db = MagicMock()
+
+    extractions = _submit_extractions(db, {1: raw, 2: raw, 3: raw}, newsletters)
+
+    assert sorted(extractions) == [1, 3]
+    assert extractions[1] is extractions[3]
+    mock_submit.assert_called_once_with(db, "<p>Body</p>")
+
+
+def test_store_entries_skips_entries_stored_concurrently(db_session: Session):
+    """Test that only emails whose entry was committed get flagged and moved."""
+    settings_data = SettingsCreate(
+        imap_server="test.com",
+        imap_username="test",
+        imap_password="password",
+        mark_as_read=True,
+        move_to_folder="Archive",
+    )
+    newsletter_data = NewsletterCreate(name="Batch", sender_emails=["batch@test.com"])
+    _, newsletter, settings = _setup_test_email_processing(
+        db_session, newsletter_data, settings_data
+    )
+    create_entry(
+        db_session,
+        EntryCreate(subject="Existing", body="Body", message_id="<existing@test>"),
+        newsletter.id,
+    )
+    batch = [
+        _PreparedEntry(
+            uid,
+            newsletter,
+            "batch@test.com",
+            EntryCreate(subject="New", body="Body", message_id=message_id),
+        )
+        for uid, message_id in [(1, "<new@test>"), (2, "<existing@test>")]
+    ]
+    actions = _PendingActions()
+
+    assert _store_entries(db_session, batch, settings, actions) == 1
+    assert actions.mark_as_read == {1}
+    assert actions.moves == {"Archive": {1}}
+
+
+def test_store_entries_raises_other_integrity_errors(db_session: Session):
+    """Test that conflicts other than duplicate Message-IDs are not swallowed."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Conflict", sender_emails=["conflict@test.com"]),
+    )
+    batch = [
+        _PreparedEntry(
+            1,
+            newsletter,
+            "conflict@test.com",
+            EntryCreate(subject="New", body="Body", message_id="<conflict@test>"),
+        )
+    ]
+    error = IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed"))
+    settings = MagicMock(mark_as_read=False, move_to_folder=None)
+
+    with patch("app.services.email_processor.create_entries", side_effect=error):
+        with pytest.raises(IntegrityError):
+            _store_entries(db_session, batch, settings, _PendingActions())
+
+
+@patch("app.services.email_processor._store_entries")
+@patch("app.services.email_processor._prepare_entry")
+@patch("app.services.email_processor.fetch_in_chunks")
+@patch("app.services.email_processor._select_newsletter_emails")
+@patch("app.services.email_processor.imaplib.IMAP4_SSL")
+def test_process_emails_reports_error_that_stopped_folder(
+    mock_imap,
+    mock_select,
+    mock_fetch,
+    mock_prepare,
+    mock_store,
+    db_session: Session,
+):
+    """Test that a failure to store a partial batch does not hide the first error."""
+    create_or_update_settings(
+        db_session,
+        SettingsCreate(
+            imap_server="test.com", imap_username="test", imap_password="password"
+        ),
+    )
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Broken", sender_emails=["broken@test.com"]),
+    )
+    mock_imap.return_value = _setup_uid_sync_mail([b"1 2"], uidvalidity=b"7")
+    mock_select.return_value = [(1, newsletter), (2, newsletter)], set()
+    mock_fetch.return_value = [{1: b"first", 2: b"second"}]
+    mock_prepare.side_effect = [MagicMock(uid=1), ValueError("unparsable email")]
+    mock_store.side_effect = RuntimeError("session is broken")
+
+    results = process_emails(db_session)
+
+    assert [result.error for result in results] == ["unparsable email"]
+    mock_store.assert_called_once()
+    assert get_folder_state(db_session, "test@test.com", "INBOX").last_uid == 0
@@ -1,11 +1,25 @@
+import hashlib
+import hmac
+import json
+import threading
 import uuid
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
+from app.core.compression import compress
+from app.core.config import settings
+from app.core.feed_cache import feed_cache
 from app.crud.settings import create_or_update_settings
+from app.models.websub import WebSubSubscription
 from app.schemas.settings import SettingsCreate
+from app.services import feed_generator
+from app.services.websub import is_public_address, shutdown_websub
 
 
 def test_health_check(client: TestClient):
@@ -152,6 +166,36 @@ def test_get_nonexistent_newsletter(client: TestClient):
     assert response.json() == {"detail": "Newsletter not found"}
 
 
+def test_newsletter_entry_counts(client: TestClient):
+    """Test that listings report entry counts, which follow created entries."""
+    newsletter_id = client.post(
+        "/newsletters",
+        json={
+            "name": "Counted",
+            "slug": "counted",
+            "sender_emails": [f"counted_{uuid.uuid4()}@example.com"],
+        },
+    ).json()["id"]
+    for i in range(2):
+        client.post(
+            "/newsletters/counted/entries",
+            json={
+                "subject": f"Entry {i}",
+                "body": "<p>b</p>",
+                "message_id": f"<counted-{i}@test>",
+                "received_at": f"2024-05-0{i + 1}T08:30:00Z",
+            },
+        )
+
+    newsletter = client.get(f"/newsletters/{newsletter_id}").json()
+    assert newsletter["entries_count"] == 2
+    assert newsletter["last_received_at"].startswith("2024-05-02T08:30:00")
+    [listed] = [
+        nl for nl in client.get("/newsletters").json() if nl["id"] == newsletter_id
+    ]
+    assert listed["entries_count"] == 2
+
+
 def test_get_newsletter_feed(client: TestClient):
     """Test generating a newsletter feed."""
     unique_email = f"feed_test_{uuid.uuid4()}@example.com"
@@ -200,3 +244,424 @@ def test_get_newsletter_feed_nonexistent_newsletter(client: TestClient):
     response = client.get("/feeds/nonexistent")
     assert response.status_code == 404
     assert response.json() == {"detail": "Newsletter not found"}
+
+
+def test_feed_cache_serves_hits_without_database(client: TestClient):
+    """Test that cached feeds are served without a session and invalidated on writes."""
+    newsletter_data = {
+        "name": "Cached Newsletter",
+        "slug": "cached",
+        "sender_emails": [f"cached_{uuid.uuid4()}@example.com"],
+    }
+    newsletter_id = client.post("/newsletters", json=newsletter_data).json()["id"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "First", "body": "<p>1</p>", "message_id": "<first@test>"},
+    )
+    first = client.get("/feeds/cached")
+    master = client.get("/feeds/all")
+    # Feeds requested by slug are cached once, under the newsletter ID.
+    assert feed_cache.get("cached") is None
+    assert feed_cache.get(newsletter_id).content == first.content
+
+    with patch("app.services.feed_generator.AsyncSessionLocal") as mock_session_local:
+        assert client.get("/feeds/cached").content == first.content
+        assert client.get("/feeds/all").content == master.content
+        cached_bytes = feed_cache.size
+        assert client.get(f"/feeds/{newsletter_id}").content == first.content
+    mock_session_local.assert_not_called()
+    assert feed_cache.size == cached_bytes
+
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "Second", "body": "<p>2</p>", "message_id": "<second@test>"},
+    )
+    assert "Second" in client.get("/feeds/cached").text
+    assert "Second" in client.get("/feeds/all").text
+
+    client.put(
+        f"/newsletters/{newsletter_id}",
+        json={"name": "Renamed", "sender_emails": newsletter_data["sender_emails"]},
+    )
+    assert "<title>Renamed</title>" in client.get(f"/feeds/{newsletter_id}").text
+    # Updates forget the slugs of the newsletter, which may have changed.
+    assert feed_cache.resolve("cached") == "cached"
+    assert "<title>Renamed</title>" in client.get("/feeds/cached").text
+    assert "[Renamed] Second" in client.get("/feeds/all").text
+
+
+def test_feed_conditional_get(client: TestClient):
+    """Test ETag and Last-Modified validators and 304 responses on feeds."""
+    newsletter_data = {
+        "name": "Conditional Newsletter",
+        "sender_emails": [f"conditional_{uuid.uuid4()}@example.com"],
+    }
+    newsletter_id = client.post("/newsletters", json=newsletter_data).json()["id"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={
+            "subject": "Dated",
+            "body": "<p>1</p>",
+            "message_id": "<dated@test>",
+            "received_at": "2024-05-01T08:30:00Z",
+        },
+    )
+
+    response = client.get(f"/feeds/{newsletter_id}")
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"] == "Wed, 01 May 2024 08:30:00 GMT"
+
+    cached = client.get(f"/feeds/{newsletter_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+
+    # Without a cached feed, a fresh client copy is confirmed without rendering.
+    feed_cache.clear()
+    with patch("app.services.feed_generator.iter_newsletter_feed") as mock_generate:
+        response = client.get(
+            f"/feeds/{newsletter_id}",
+            headers={"If-Modified-Since": "Wed, 01 May 2024 09:00:00 GMT"},
+        )
+    assert response.status_code == 304
+    mock_generate.assert_not_called()
+
+    response = client.get(
+        f"/feeds/{newsletter_id}",
+        headers={"If-Modified-Since": "Wed, 01 May 2024 08:00:00 GMT"},
+    )
+    assert response.status_code == 200
+
+    master_etag = client.get("/feeds/all").headers["etag"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "Newer", "body": "<p>2</p>", "message_id": "<newer@test>"},
+    )
+    assert client.get(f"/feeds/{newsletter_id}").headers["etag"] != etag
+    response = client.get("/feeds/all", headers={"If-None-Match": master_etag})
+    assert response.status_code == 200
+
+
+def test_large_feeds_are_streamed_without_caching(client: TestClient):
+    """Test that feeds over the cache size limit are streamed but not cached."""
+    newsletter_id = client.post(
+        "/newsletters",
+        json={"name": "Large", "sender_emails": [f"large_{uuid.uuid4()}@example.com"]},
+    ).json()["id"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "Big", "body": "<p>x</p>" * 100, "message_id": "<big@test>"},
+    )
+
+    with patch("app.services.feed_generator.FEED_CACHE_MAX_BYTES", 100):
+        response = client.get(f"/feeds/{newsletter_id}")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/atom+xml")
+    assert response.text.endswith("</feed>\n")
+    assert feed_cache.get(newsletter_id) is None
+
+    client.get(f"/feeds/{newsletter_id}")
+    assert feed_cache.get(newsletter_id) is not None
+
+
+def test_feeds_are_served_precompressed(client: TestClient):
+    """Test that cached feeds are compressed once and negotiated per request."""
+    newsletter_id = client.post(
+        "/newsletters",
+        json={"name": "Zipped", "sender_emails": [f"zip_{uuid.uuid4()}@example.com"]},
+    ).json()["id"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "Zip", "body": "<p>zip</p>" * 50, "message_id": "<zip@test>"},
+    )
+
+    # The first request streams the freshly rendered feed uncompressed.
+    first = client.get(f"/feeds/{newsletter_id}", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in first.headers
+    assert "Accept-Encoding" in first.headers["vary"]
+
+    with patch("app.core.feed_cache.compress", wraps=compress) as mock_compress:
+        for _ in range(2):
+            response = client.get(
+                f"/feeds/{newsletter_id}", headers={"Accept-Encoding": "gzip"}
+            )
+            assert response.headers["content-encoding"] == "gzip"
+            assert "Accept-Encoding" in response.headers["vary"]
+            assert response.content == first.content
+    mock_compress.assert_called_once()
+
+    identity = client.get(
+        f"/feeds/{newsletter_id}", headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in identity.headers
+    assert identity.content == first.content
+
+    brotli = client.get(
+        f"/feeds/{newsletter_id}", headers={"Accept-Encoding": "gzip, br"}
+    )
+    assert brotli.headers["content-encoding"] == "br"
+    assert brotli.content == first.content
+
+
+def test_rss_and_json_feeds(client: TestClient):
+    """Test the RSS 2.0 and JSON Feed variants of the feeds."""
+    newsletter_id = client.post(
+        "/newsletters",
+        json={
+            "name": "Formats",
+            "slug": "formats",
+            "sender_emails": [f"formats_{uuid.uuid4()}@example.com"],
+        },
+    ).json()["id"]
+    for day in (1, 2):
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={
+                "subject": f"Day {day} & more",
+                "body": f"<p>{day}</p>",
+                "message_id": f"<formats-{day}@test>",
+                "received_at": f"2024-05-0{day}T08:30:00Z",
+            },
+        )
+
+    for url in ("/feeds/formats.json", f"/feeds/{newsletter_id}.json"):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/feed+json"
+        feed = response.json()
+        assert feed["version"] == "https://jsonfeed.org/version/1.1"
+        assert feed["title"] == "Formats"
+        assert feed["feed_url"].endswith("/feeds/formats.json")
+        assert [item["title"] for item in feed["items"]] == [
+            "Day 2 & more",
+            "Day 1 & more",
+        ]
+        assert feed["items"][0]["content_html"] == "<p>2</p>"
+        assert feed["items"][0]["date_published"] == "2024-05-02T08:30:00+00:00"
+
+    master = json.loads(client.get("/feeds/all.json").content)
+    assert master["items"][0]["title"] == "[Formats] Day 2 & more"
+
+    response = client.get("/feeds/formats.rss")
+    assert response.headers["content-type"].startswith("application/rss+xml")
+    channel = ET.fromstring(response.content).find("channel")
+    assert channel.find("title").text == "Formats"
+    items = channel.findall("item")
+    assert [item.find("title").text for item in items] == [
+        "Day 2 & more",
+        "Day 1 & more",
+    ]
+    assert items[0].find("pubDate").text == "Thu, 02 May 2024 08:30:00 GMT"
+    assert items[0].find("description").text == "<p>2</p>"
+    master_channel = ET.fromstring(client.get("/feeds/all.rss").content)
+    assert master_channel.find("channel/item/title").text == "[Formats] Day 2 & more"
+
+    assert client.get("/feeds/missing.json").status_code == 404
+
+    feed_cache.clear()
+    with patch(
+        "app.services.feed_generator.settings",
+        settings.model_copy(update={"feed_max_entries": 1}),
+    ):
+        feed = client.get("/feeds/formats.json").json()
+    assert [item["title"] for item in feed["items"]] == ["Day 2 & more"]
+    assert feed["next_url"].startswith(feed["feed_url"] + "?before=")
+
+
+def test_feed_rendering_does_not_block_other_endpoints(client: TestClient):
+    """Test that the API stays responsive while a feed is being rendered."""
+    newsletter_id = client.post(
+        "/newsletters",
+        json={"name": "Slow", "sender_emails": [f"slow_{uuid.uuid4()}@example.com"]},
+    ).json()["id"]
+    client.post(
+        f"/newsletters/{newsletter_id}/entries",
+        json={"subject": "Slow", "body": "<p>s</p>", "message_id": "<slow@test>"},
+    )
+    rendering, release = threading.Event(), threading.Event()
+    render_rows = feed_generator._render_rows
+
+    def slow_render_rows(*args):
+        rendering.set()
+        assert release.wait(5)
+        return render_rows(*args)
+
+    responses = []
+    with patch("app.services.feed_generator._render_rows", slow_render_rows):
+        thread = threading.Thread(
+            target=lambda: responses.append(client.get(f"/feeds/{newsletter_id}"))
+        )
+        thread.start()
+        try:
+            assert rendering.wait(5)
+            assert client.get("/newsletters").status_code == 200
+            assert client.get("/health").status_code == 200
+        finally:
+            release.set()
+            thread.join()
+    assert responses[0].status_code == 200
+    assert "<title>Slow</title>" in responses[0].text
+
+
+@contextmanager
+def _http_stand_in():
+    """Run a local HTTP server that records requests and echoes hub.challenge."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            requests.append(("GET", query, None, self.headers))
+            body = query.get("hub.challenge", [""])[0].encode()
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(("POST", None, body, self.headers))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/callback", requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def _websub_settings(**update):
+    patched = settings.model_copy(update=update)
+    with (
+        patch("app.services.feed_generator.settings", patched),
+        patch("app.services.websub.settings", patched),
+        patch("app.routers.websub.settings", patched),
+    ):
+        yield
+    shutdown_websub()
+
+
+def test_websub_publishes_new_entries_to_hub(client: TestClient):
+    """Test that feeds advertise the hub and new entries are announced to it."""
+    newsletter_id = client.post(
+        "/newsletters",
+        json={"name": "Pushed", "sender_emails": [f"push_{uuid.uuid4()}@example.com"]},
+    ).json()["id"]
+    with _http_stand_in() as (hub, requests), _websub_settings(websub_hub_url=hub):
+        feed = client.get(f"/feeds/{newsletter_id}").text
+        assert f'<link href="{hub}" rel="hub"/>' in feed
+        rss = client.get(f"/feeds/{newsletter_id}.rss").text
+        assert f'<atom:link href="{hub}" rel="hub"/>' in rss
+        assert 'rel="self" type="application/rss+xml"/>' in rss
+        assert client.get("/feeds/all.json").json()["hubs"] == [
+            {"type": "WebSub", "url": hub}
+        ]
+
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={"subject": "New", "body": "<p>n</p>", "message_id": "<push@test>"},
+        )
+        shutdown_websub()
+
+    topics = {parse_qs(body.decode())["hub.url"][0] for _, _, body, _ in requests}
+    assert all(
+        parse_qs(body.decode())["hub.mode"] == ["publish"] for _, _, body, _ in requests
+    )
+    assert f"{settings.app_base_url}/feeds/{newsletter_id}" in topics
+    assert f"{settings.app_base_url}/feeds/all.json" in topics
+
+
+def test_websub_builtin_hub(client: TestClient, db_session: Session):
+    """Test subscription verification and content distribution of the built-in hub."""
+    newsletter_id = client.post(
+        "/newsletters",
+        json={
+            "name": "Hub",
+            "slug": "hub",
+            "sender_emails": [f"hub_{uuid.uuid4()}@example.com"],
+        },
+    ).json()["id"]
+    topic = f"{settings.app_base_url}/feeds/hub.json"
+
+    response = client.post("/websub", data={"hub.mode": "subscribe"})
+    assert response.status_code == 404
+
+    with (
+        _http_stand_in() as (callback, requests),
+        _websub_settings(websub_hub=True, websub_allow_private_callbacks=True),
+    ):
+        subscription = {
+            "hub.mode": "subscribe",
+            "hub.topic": topic,
+            "hub.callback": callback,
+            "hub.secret": "s3cret",
+        }
+        bad_topic = {**subscription, "hub.topic": "http://elsewhere/feed"}
+        assert client.post("/websub", data=bad_topic).status_code == 400
+        for lease in ("-60", "0", "1.5", "soon"):
+            bad_lease = {**subscription, "hub.lease_seconds": lease}
+            response = client.post("/websub", data=bad_lease)
+            assert response.status_code == 400
+            assert response.json() == {"detail": "Invalid hub.lease_seconds"}
+        assert client.post("/websub", data=subscription).status_code == 202
+        shutdown_websub()
+        _, query, _, _ = requests[0]
+        assert query["hub.mode"] == ["subscribe"]
+        assert query["hub.topic"] == [topic]
+        assert db_session.query(WebSubSubscription).count() == 1
+
+        client.post(
+            f"/newsletters/{newsletter_id}/entries",
+            json={"subject": "Pushed", "body": "<p>p</p>", "message_id": "<hub@test>"},
+        )
+        shutdown_websub()
+        _, _, body, headers = requests[-1]
+        assert headers["Content-Type"] == "application/feed+json"
+        assert f'<{topic}>; rel="self"' in headers["Link"]
+        signature = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+        assert headers["X-Hub-Signature"] == f"sha256={signature}"
+        assert json.loads(body)["items"][0]["title"] == "Pushed"
+
+        subscription["hub.mode"] = "unsubscribe"
+        assert client.post("/websub", data=subscription).status_code == 202
+        shutdown_websub()
+        db_session.expire_all()
+        assert db_session.query(WebSubSubscription).count() == 0
+
+
+def test_websub_hub_refuses_private_callbacks(client: TestClient, db_session: Session):
+    """Test that the built-in hub does not request callbacks on private addresses."""
+    assert is_public_address("93.184.215.14")
+    for address in ("127.0.0.1", "10.0.0.1", "169.254.169.254", "::1", "fe80::1"):
+        assert not is_public_address(address)
+    assert not is_public_address("::ffff:192.168.0.1")
+
+    client.post(
+        "/newsletters",
+        json={
+            "name": "Private",
+            "slug": "private",
+            "sender_emails": [f"private_{uuid.uuid4()}@example.com"],
+        },
+    )
+    topic = f"{settings.app_base_url}/feeds/private"
+    with _http_stand_in() as (callback, requests), _websub_settings(websub_hub=True):
+        subscription = {
+            "hub.mode": "subscribe",
+            "hub.topic": topic,
+            "hub.callback": callback,
+        }
+        assert client.post("/websub", data=subscription).status_code == 400
+        # Host names are resolved and refused when the callback is requested.
+        subscription["hub.callback"] = callback.replace("127.0.0.1", "localhost")
+        assert client.post("/websub", data=subscription).status_code == 202
+        shutdown_websub()
+    assert requests == []
+    assert db_session.query(WebSubSubscription).count() == 0
@@ -1,13 +1,55 @@
+import asyncio
+import gzip
+import json
+import re
+import threading
 import uuid
 import xml.etree.ElementTree as ET
+from datetime import UTC, datetime, timedelta, timezone
+from functools import partial
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
+import pytest
+from feedgen.feed import FeedGenerator
 from sqlalchemy.orm import Session
 
-from app.crud.entries import create_entry
-from app.crud.newsletters import create_newsletter
+from app.core import body_store
+from app.core.body_store import decode_bodies
+from app.core.config import settings
+from app.core.feed_cache import MASTER_FEED_KEY, FeedCache, FeedValidators, feed_cache
+from app.crud.entries import (
+    create_entry,
+    render_missing_fragments,
+    stream_feed_rows,
+)
+from app.crud.newsletters import create_newsletter, update_newsletter
+from app.models.entries import Entry
+from app.models.entry_bodies import EntryBody
 from app.schemas.entries import EntryCreate
-from app.schemas.newsletters import NewsletterCreate
-from app.services.feed_generator import generate_feed, generate_master_feed
+from app.schemas.newsletters import NewsletterCreate, NewsletterUpdate
+from app.services import feed_export
+from app.services.atom_writer import (
+    ATOM_FOOTER,
+    FEED_HISTORY_NS,
+    AtomEntry,
+    AtomFeed,
+    iter_document,
+    write_atom_entry,
+    write_atom_header,
+)
+from app.services.body_compression import train_body_dictionaries
+from app.services.feed_export import export_feeds
+from app.services.feed_generator import (
+    FEED_FORMATS,
+    FeedPageNotFoundError,
+    generate_feed,
+    generate_master_feed,
+    render_feed,
+    render_feed_async,
+    render_master_feed_async,
+)
+from app.services.json_feed_writer import write_json_feed_item
 
 
 def test_generate_master_feed(db_session: Session):
@@ -114,3 +156,522 @@ def test_generate_feed_nonexistent_newsletter(db_session: Session):
     """Test feed generation for a non-existent newsletter."""
     feed_xml = generate_feed(db_session, "nonexistent-id")
     assert feed_xml is None
+
+
+def test_generate_feed_pages_with_archive_links(db_session: Session):
+    """Test that feeds are bounded and link to RFC 5005 archive pages."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Paged Newsletter", sender_emails=["paged@example.com"]),
+    )
+    for day in range(1, 6):
+        create_entry(
+            db_session,
+            EntryCreate(
+                subject=f"Day {day}",
+                body="<p>Body</p>",
+                message_id=f"<{uuid.uuid4()}@test.com>",
+                received_at=datetime(2024, 5, day, tzinfo=UTC),
+            ),
+            newsletter.id,
+        )
+    ns = {"atom": "http://www.w3.org/2005/Atom", "fh": FEED_HISTORY_NS}
+
+    def page(before=None):
+        root = ET.fromstring(generate_feed(db_session, newsletter.id, before))
+        titles = [e.find("atom:title", ns).text for e in root.findall("atom:entry", ns)]
+        links = {
+            link.get("rel"): link.get("href") for link in root.findall("atom:link", ns)
+        }
+        return root, titles, links
+
+    with patch(
+        "app.services.feed_generator.settings",
+        settings.model_copy(update={"feed_max_entries": 2}),
+    ):
+        root, titles, links = page()
+        assert sorted(titles) == ["Day 4", "Day 5"]
+        assert root.find("fh:archive", ns) is None
+        assert links["next"] == links["prev-archive"]
+
+        before = parse_qs(urlparse(links["next"]).query)["before"][0]
+        root, titles, links = page(before)
+        assert sorted(titles) == ["Day 2", "Day 3"]
+        assert root.find("fh:archive", ns) is not None
+        assert links["current"].endswith(f"/feeds/{newsletter.id}")
+        assert links["self"].endswith(f"?before={before}")
+
+        before = parse_qs(urlparse(links["next"]).query)["before"][0]
+        _, titles, links = page(before)
+        assert titles == ["Day 1"]
+        assert "next" not in links and "prev-archive" not in links
+
+        with pytest.raises(FeedPageNotFoundError):
+            generate_feed(db_session, newsletter.id, "unknown-entry")
+
+
+def test_feed_cache_only_keeps_linked_archive_pages(db_session: Session):
+    """Test that archive pages the feed does not link to are served uncached."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Cursors", sender_emails=["cursors@example.com"]),
+    )
+    for day in range(1, 6):
+        create_entry(
+            db_session,
+            EntryCreate(
+                subject=f"Day {day}",
+                body="<p>Body</p>",
+                message_id=f"<cursor-{day}@test.com>",
+                received_at=datetime(2024, 5, day, tzinfo=UTC),
+            ),
+            newsletter.id,
+        )
+    ids = {
+        entry.subject: entry.id
+        for entry in db_session.query(Entry).filter_by(newsletter_id=newsletter.id)
+    }
+
+    with patch(
+        "app.services.feed_generator.settings",
+        settings.model_copy(update={"feed_max_entries": 2}),
+    ):
+        for subject, linked in [("Day 4", True), ("Day 5", False), ("Day 3", False)]:
+            before = ids[subject]
+            _, chunks = render_feed(newsletter.id, before)
+            assert b"<entry>" in b"".join(chunks)
+            cached = feed_cache.get(f"{newsletter.id}?before={before}")
+            assert (cached is not None) == linked
+
+
+def test_feed_cache_stays_within_byte_budget():
+    """Test that the least recently used feeds and their variants are evicted."""
+    validators = FeedValidators(etag='W/"x"', last_modified=None)
+    cache = FeedCache(max_bytes=3000)
+    content = bytes(range(256)) * 4
+    cache.put("a", "a", validators, content, cache.generation)
+    cache.put("b", "b", validators, content, cache.generation)
+    assert cache.size == 2048
+
+    # Compressed variants count towards the budget.
+    cache.get("a").encode("gzip")
+    assert 2048 < cache.size <= 3000
+    cache.put("c", "c", validators, content, cache.generation)
+    assert cache.size <= 3000
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    cache.put("huge", None, validators, content * 3, cache.generation)
+    assert cache.get("huge") is None
+    cache.invalidate_newsletter("a")
+    assert cache.size == 1024
+
+
+def test_feed_cache_keeps_unaffected_archive_pages():
+    """Test that new entries only invalidate archive pages they fall into."""
+    validators = FeedValidators(etag='W/"x"', last_modified=None)
+    cache = FeedCache(max_bytes=1024)
+    cache.put("nl", "nl", validators, b"current", cache.generation)
+    cache.put(
+        "nl?before=a", "nl", validators, b"old", cache.generation, datetime(2024, 5, 3)
+    )
+    cache.put("other", "other", validators, b"other", cache.generation)
+
+    cache.invalidate_newsletter("nl", datetime(2024, 5, 4, tzinfo=UTC))
+    assert cache.get("nl") is None
+    assert cache.get("nl?before=a") is not None
+    assert cache.get("other") is not None
+
+    cache.invalidate_newsletter("nl", datetime(2024, 5, 1))
+    assert cache.get("nl?before=a") is None
+
+    cache.put("nl?before=a", "nl", validators, b"old", cache.generation)
+    cache.invalidate_newsletter("nl")
+    assert cache.get("nl?before=a") is None
+
+
+def test_atom_writer_matches_feedgen():
+    """Test that the streaming writer produces the document feedgen would."""
+    entries = [
+        AtomEntry(
+            id=f"urn:letterfeed:entry:{i}",
+            title=f"Issue {i} & <more>\r",
+            content=f'<p class="x">Body {i} \u00e9</p>',
+            published=datetime(2024, 5, i, 8, 30),
+        )
+        for i in range(1, 4)
+    ]
+    links = [
+        ('http://test/feeds/a?x="1"&y=2\t', "self"),
+        ("http://test/", "alternate"),
+    ]
+    feed = AtomFeed(
+        id="urn:letterfeed:newsletter:a",
+        title="A & B",
+        subtitle="A feed of newsletters from a@example.com",
+        icon="http://test/favicon.ico",
+        logo="http://test/logo.png",
+        links=links,
+    )
+    chunks = list(
+        iter_document(
+            write_atom_header(feed),
+            map(write_atom_entry, entries),
+            ATOM_FOOTER,
+            batch_size=1,
+        )
+    )
+    assert len(chunks) == len(entries) + 1
+
+    fg = FeedGenerator()
+    fg.id(feed.id)
+    fg.title(feed.title)
+    fg.logo(feed.logo)
+    fg.icon(feed.icon)
+    for href, rel in links:
+        fg.link(href=href, rel=rel)
+    fg.description(feed.subtitle)
+    for entry in reversed(entries):
+        fe = fg.add_entry()
+        fe.id(entry.id)
+        fe.title(entry.title)
+        fe.content(entry.content, type="html")
+        fe.published(entry.published.replace(tzinfo=UTC))
+        fe.updated(entry.published.replace(tzinfo=UTC))
+
+    def normalize(document: bytes) -> str:
+        document = document.decode()
+        document = re.sub(r"\n  <updated>[^<]*</updated>", "", document, count=1)
+        return re.sub(r"\n  <generator[^\n]*", "", document)
+
+    assert normalize(b"".join(chunks)) == normalize(fg.atom_str(pretty=True))
+
+
+def test_atom_writer_drops_invalid_xml_characters():
+    """Test that characters XML cannot carry do not break the document."""
+    feed = AtomFeed(id="urn:x", title="T", subtitle="S", icon="i", logo="l")
+    entry = AtomEntry(
+        id="urn:e",
+        title="Bell\x07",
+        content="<p>Tab\x0b</p>",
+        published=datetime(2024, 5, 1, tzinfo=UTC),
+    )
+    document = FEED_FORMATS["atom"].iter_document(feed, [write_atom_entry(entry)])
+    root = ET.fromstring(b"".join(document))
+    ns = {"atom": "http://www.w3.org/2005/Atom"}
+    assert root.find("atom:entry/atom:title", ns).text == "Bell"
+    assert root.find("atom:entry/atom:content", ns).text == "<p>Tab</p>"
+
+
+def test_feeds_use_pre_rendered_fragments(db_session: Session):
+    """Test that feeds are built from stored fragments, re-rendered on rename."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Before", sender_emails=["fragments@example.com"]),
+    )
+    entry = create_entry(
+        db_session,
+        EntryCreate(
+            subject="Issue", body="<p>Body</p>", message_id="<fragments@test.com>"
+        ),
+        newsletter.id,
+    )
+    assert "<title>Issue</title>" in entry.atom_fragment
+    assert "<title>[Before] Issue</title>" in entry.master_atom_fragment
+
+    with patch("app.services.feed_generator.feed_entry") as mock_render:
+        feed = generate_feed(db_session, newsletter.id)
+        master_feed = generate_master_feed(db_session)
+    mock_render.assert_not_called()
+    assert entry.atom_fragment.encode() in feed
+    assert entry.master_atom_fragment.encode() in master_feed
+
+    update_newsletter(
+        db_session,
+        newsletter.id,
+        NewsletterUpdate(name="After", sender_emails=["fragments@example.com"]),
+    )
+    db_session.refresh(entry)
+    assert "<title>[After] Issue</title>" in entry.master_atom_fragment
+    assert b"[After] Issue" in generate_master_feed(db_session)
+
+    # Entries stored before fragments existed are rendered on demand.
+    fragment = entry.atom_fragment
+    entry.atom_fragment = entry.master_atom_fragment = None
+    db_session.commit()
+    assert fragment.encode() in generate_feed(db_session, newsletter.id)
+    assert b"[After] Issue" in generate_master_feed(db_session)
+
+    # And backfilled once.
+    assert render_missing_fragments(db_session) == 1
+    db_session.refresh(entry)
+    assert entry.atom_fragment == fragment
+    assert "<title>[After] Issue</title>" in entry.master_atom_fragment
+    assert render_missing_fragments(db_session) == 0
+
+
+def test_fragments_use_utc_timestamps(db_session: Session):
+    """Test that fragments show received_at as stored, whatever the Date header."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(name="Zoned", sender_emails=["zoned@example.com"]),
+    )
+    entry = create_entry(
+        db_session,
+        EntryCreate(
+            subject="Issue",
+            body="<p>Body</p>",
+            message_id="<zoned@test.com>",
+            received_at=datetime(2024, 5, 1, 12, tzinfo=timezone(timedelta(hours=2))),
+        ),
+        newsletter.id,
+    )
+    assert "2024-05-01T10:00:00+00:00" in entry.atom_fragment
+    assert "+02:00" not in entry.atom_fragment
+
+    # Fragments rendered again from the stored entry are the same.
+    fragment = entry.atom_fragment
+    entry.atom_fragment = entry.master_atom_fragment = None
+    db_session.commit()
+    feed_cache.clear()
+    assert fragment.encode() in generate_feed(db_session, newsletter.id)
+    item = json.loads(generate_feed(db_session, newsletter.id, feed_format="json"))[
+        "items"
+    ][0]
+    assert item["date_published"] == "2024-05-01T10:00:00+00:00"
+
+
+def test_export_feeds_writes_changed_feeds(db_session: Session, tmp_path):
+    """Test that static feeds are exported atomically and incrementally."""
+    newsletter = create_newsletter(
+        db_session,
+        NewsletterCreate(
+            name="Static", slug="static", sender_emails=["static@example.com"]
+        ),
+    )
+    other = create_newsletter(
+        db_session, NewsletterCreate(name="Other", sender_emails=["o@example.com"])
+    )
+
+    def add_entry(message_id):
+        create_entry(
+            db_session,
+            EntryCreate(subject="Issue", body="<p>Body</p>", message_id=message_id),
+            newsletter.id,
+        )
+
+    add_entry("<static-1@test.com>")
+    feeds_dir = tmp_path / "feeds"
+    with patch(
+        "app.services.feed_export.settings",
+        settings.model_copy(update={"feed_export_dir": str(tmp_path)}),
+    ):
+        written = export_feeds(db_session)
+        names = ["all", newsletter.id, "static", other.id]
+        assert sorted(written) == sorted(
+            f"{name}{suffix}" for name in names for suffix in ("", ".rss", ".json")
+        )
+        plain = (feeds_dir / "static").read_bytes()
+        assert b"<title>Issue</title>" in plain
+        assert gzip.decompress((feeds_dir / "static.gz").read_bytes()) == plain
+        assert (feeds_dir / newsletter.id).read_bytes() == plain
+        assert not [p for p in feeds_dir.iterdir() if p.name.startswith(".")]
+
+        # The ETags are kept next to the feeds, so nothing is written again.
+        assert (tmp_path / feed_export.ETAGS_FILE).exists()
+        assert export_feeds(db_session) == []
+
+        (feeds_dir / "static.rss").unlink()
+        assert export_feeds(db_session) == [f"{newsletter.id}.rss", "static.rss"]
+        assert (feeds_dir / "static.rss").exists()
+
+        add_entry("<static-2@test.com>")
+        assert {name for name in export_feeds(db_session) if "." not in name} == {
+            "all",
+            newsletter.id,
+            "static",
+        }
+
+        update_newsletter(
+            db_session,
+            newsletter.id,
+            NewsletterUpdate(
+                name="Static", slug="renamed", sender_emails=["static@example.com"]
+            ),
+        )
+        assert "renamed" in export_feeds(db_session)
+        assert not (feeds_dir / "static").exists()
+        assert not (feeds_dir / "static.gz").exists()
+        assert (feeds_dir / "renamed.gz").exists()
+        assert not (feeds_dir / "static.json").exists()
+        assert (feeds_dir / "renamed.json").exists()
+
+
+@pytest.mark.parametrize("body_store", ["database", "filesystem"])
+def test_async_feed_rendering_matches_sync(
+    db_session: Session, tmp_path, body_store: str
+):
+    """Test that the async feed path writes the same documents as the sync one.
+
+    Bodies of entries without fragments are decompressed off the event loop.
+    """
+    stored_in = settings.model_copy(
+        update={"body_store": body_store, "body_store_dir": str(tmp_path)}
+    )
+    with patch("app.core.body_store.settings", stored_in):
+        newsletter = create_newsletter(
+            db_session,
+            NewsletterCreate(name="Async", sender_emails=["async@example.com"]),
+        )
+        for day in (1, 2, 3):
+            create_entry(
+                db_session,
+                EntryCreate(
+                    subject=f"Day {day}",
+                    body=f"<p>{day}</p>",
+                    message_id=f"<async-{day}@test.com>",
+                    received_at=datetime(2024, 5, day, tzinfo=UTC),
+                ),
+                newsletter.id,
+            )
+        db_session.query(Entry).filter(Entry.subject == "Day 1").update(
+            {"atom_fragment": None, "master_atom_fragment": None}
+        )
+        db_session.commit()
+
+        loop_threads, decode_threads = set(), set()
+
+        def recording_decode_bodies(stored):
+            decode_threads.add(threading.get_ident())
+            return decode_bodies(stored)
+
+        async def collect(render):
+            loop_threads.add(threading.get_ident())
+            with patch(
+                "app.services.feed_generator.decode_bodies", recording_decode_bodies
+            ):
+                _, chunks = await render
+                return b"".join([chunk async for chunk in chunks])
+
+        def without_timestamps(document: bytes) -> bytes:
+            # The documents state when they were generated.
+            return re.sub(rb"<(updated|lastBuildDate)>[^<]*</\1>", b"", document)
+
+        # Batches of one row put the item separators between batches.
+        with patch(
+            "app.services.feed_generator.stream_feed_rows",
+            partial(stream_feed_rows, batch_size=1),
+        ):
+            for feed_format in FEED_FORMATS:
+                feed_cache.clear()
+                _, chunks = render_feed(newsletter.id, feed_format=feed_format)
+                expected = b"".join(chunks)
+                feed_cache.clear()
+                document = asyncio.run(
+                    collect(render_feed_async(newsletter.id, feed_format=feed_format))
+                )
+                assert without_timestamps(document) == without_timestamps(expected)
+
+                feed_cache.clear()
+                expected = generate_master_feed(db_session, feed_format=feed_format)
+                document = asyncio.run(
+                    collect(render_master_feed_async(feed_format=feed_format))
+                )
+                assert without_timestamps(document) == without_timestamps(expected)
+        assert decode_threads and not decode_threads & loop_threads
+        assert feed_cache.get(f"{MASTER_FEED_KEY}.json") is not None
+        item = json.loads(document)["items"][0]
+        assert (item["title"], item["content_html"]) == ("[Async] Day 3", "<p>3</p>")
+
+
+def test_train_body_dictionaries(db_session: Session):
+    """Test that bodies are compressed with a dictionary of their newsletter."""
+    trained, untrained = (
+        create_newsletter(
+            db_session,
+            NewsletterCreate(name=name, sender_emails=[f"{name}@example.com"]),
+        )
+        for name in ("trained", "untrained")
+    )
+
+    def issue(number: int) -> str:
+        return (
+            "<html><style>.story{color:#333;font-family:Helvetica}</style>"
+            f"<h1>Issue {number}</h1>{'<p class=story>News</p>' * (number % 7)}</html>"
+        )
+
+    for number in range(60):
+        create_entry(
+            db_session,
+            EntryCreate(
+                subject=f"Issue {number}",
+                body=issue(number),
+                message_id=f"<trained-{number}@test.com>",
+            ),
+            trained.id,
+        )
+    create_entry(
+        db_session,
+        EntryCreate(subject="Once", body=issue(1), message_id="<once@test.com>"),
+        untrained.id,
+    )
+
+    def dictionary_ids() -> set[int]:
+        return {
+            body_store.zstandard.get_frame_parameters(data).dict_id
+            for (data,) in db_session.query(EntryBody.data)
+        }
+
+    assert dictionary_ids() == {0}
+    with patch(
+        "app.services.body_compression.settings",
+        settings.model_copy(update={"body_dictionary_size": 1024}),
+    ):
+        assert train_body_dictionaries(db_session) == [trained.id]
+        assert train_body_dictionaries(db_session) == []
+    db_session.refresh(trained)
+    assert dictionary_ids() == {trained.body_dictionary_id}
+
+    # New bodies are compressed with the dictionary too, and all read back.
+    create_entry(
+        db_session,
+        EntryCreate(subject="New", body=issue(60), message_id="<new@test.com>"),
+        trained.id,
+    )
+    assert dictionary_ids() == {trained.body_dictionary_id}
+    feed = json.loads(generate_feed(db_session, trained.id, feed_format="json"))
+    assert [item["content_html"] for item in feed["items"][:2]] == [
+        issue(60),
+        issue(59),
+    ]
+    assert json.loads(generate_master_feed(db_session, feed_format="json"))["items"]
+
+
+def test_json_feed_writer():
+    """Test that the JSON Feed writer writes a valid document around its items."""
+    feed = AtomFeed(
+        id="urn:x",
+        title="T \u00e9",
+        subtitle="S",
+        icon="i",
+        logo="l",
+        links=[("http://test/feeds/x.json", "self")],
+    )
+    entries = [
+        AtomEntry(
+            id=f"urn:e{i}",
+            title=f'"Quoted" {i}',
+            content="<p>\u2603</p>",
+            published=datetime(2024, 5, i, tzinfo=UTC),
+        )
+        for i in (1, 2)
+    ]
+    json_feed = FEED_FORMATS["json"]
+    items = [write_json_feed_item(entry) for entry in entries]
+    document = b"".join(json_feed.iter_document(feed, items))
+    assert "\u2603".encode() in document
+    parsed = json.loads(document)
+    assert parsed["title"] == "T \u00e9"
+    assert parsed["feed_url"] == "http://test/feeds/x.json"
+    assert [item["title"] for item in parsed["items"]] == ['"Quoted" 1', '"Quoted" 2']
+    assert json.loads(b"".join(json_feed.iter_document(feed, [])))["items"] == []
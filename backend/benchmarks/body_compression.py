@@ -0,0 +1,161 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.core import body_store
+from app.core.body_store import (
+    DatabaseBodyStore,
+    body_hash,
+    decode_body,
+    encode_body,
+    train_dictionary,
+)
+from app.core.database import Base
+from app.models.entry_bodies import EntryBody
+
+"""Benchmark the compression of stored entry bodies against the I/O it saves.
+
+Every profile stores the same newsletter-like bodies in a fresh SQLite database:
+uncompressed, zstd, and zstd with a dictionary per newsletter, trained on its
+first issues. Reading all bodies back is timed in two parts, fetching the stored
+bytes and decoding them, after a first read has put the database into the page
+cache. The break-even column is the read throughput below which reading the bytes
+saved would take longer than the extra decoding: on storage slower than that, the
+profile reads uncached bodies faster than storing them uncompressed does. Run
+from the backend directory:
+
+    python -m benchmarks.body_compression --newsletters 5 --issues 400
+"""
+
+PROFILES = ("identity", "zstd", "zstd+dictionary")
+WORDS = (
+    "the of and to in is that for on with as newsletter week update release "
+    "team product launch community design data open source python database"
+).split()
+
+
+def _newsletter(number: int, rng: random.Random):
+    """Return a function that writes issues of a newsletter with its own template."""
+    style = "".join(
+        f".n{number}-{i}{{color:#{rng.randrange(1 << 24):06x};padding:{i}px;"
+        f"font-family:Helvetica,Arial,sans-serif;line-height:1.{i % 9}}}"
+        for i in range(60)
+    )
+    header = (
+        f"<html><head><style>{style}</style></head><body>"
+        f'<table role="presentation" width="100%" cellpadding="0" cellspacing="0">'
+        f'<tr><td align="center"><img src="https://cdn.example.com/{number}/logo.png"'
+        f' alt="Newsletter {number}" width="600"></td></tr>'
+    )
+    footer = (
+        '<tr><td class="footer">You are receiving this email because you subscribed'
+        f' to newsletter {number}. <a href="https://example.com/{number}/unsubscribe">'
+        'Unsubscribe</a> | <a href="https://example.com/preferences">Preferences'
+        "</a></td></tr></table></body></html>"
+    )
+
+    def issue() -> str:
+        stories = "".join(
+            f'<tr><td class="n{number}-{rng.randrange(60)}"><h2><a href="https://'
+            f'example.com/{number}/p/{rng.randrange(10**6)}">'
+            f"{' '.join(rng.choices(WORDS, k=7))}</a></h2>"
+            f"<p>{' '.join(rng.choices(WORDS, k=rng.randint(30, 120)))}</p></td></tr>"
+            for _ in range(rng.randint(4, 16))
+        )
+        return header + stories + footer
+
+    return issue
+
+
+def _store(path: Path, profile: str, newsletters: list[list[str]], samples: int):
+    """Write the bodies of every newsletter to a new database with a profile."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    store = DatabaseBodyStore()
+    with Session(engine) as db:
+        for bodies in newsletters:
+            dictionary = None
+            if profile == "zstd+dictionary":
+                dictionary = train_dictionary(
+                    bodies[:samples], body_store.settings.body_dictionary_size
+                )
+                store.add_dictionary(db, dictionary)
+            for body in bodies:
+                if profile == "identity":
+                    codec, data = "identity", body.encode("utf-8")
+                else:
+                    codec, data = encode_body(body, dictionary)
+                db.merge(EntryBody(hash=body_hash(body), codec=codec, data=data))
+        db.commit()
+    engine.dispose()
+
+
+def _read(path: Path) -> tuple[float, float, int]:
+    """Return the seconds to fetch and to decode all bodies, and their bytes."""
+    engine = create_engine(f"sqlite:///{path}")
+    store = DatabaseBodyStore()
+    with Session(engine) as db:
+        start = time.perf_counter()
+        rows = db.execute(select(EntryBody.codec, EntryBody.data)).all()
+        fetched = time.perf_counter()
+
+        def load_dictionary(dictionary_id: int):
+            return store.load_dictionary(db, dictionary_id)
+
+        for codec, data in rows:
+            decode_body(codec, data, load_dictionary)
+        decoded = time.perf_counter()
+    engine.dispose()
+    return fetched - start, decoded - fetched, sum(len(data) for _, data in rows)
+
+
+def run(newsletters: int, issues: int, samples: int, seed: int):
+    """Print the stored size and read times of every profile."""
+    rng = random.Random(seed)
+    writers = [_newsletter(number, rng) for number in range(newsletters)]
+    corpus = [[write() for _ in range(issues)] for write in writers]
+    raw = sum(len(body.encode("utf-8")) for bodies in corpus for body in bodies)
+    print(
+        f"{newsletters} newsletters of {issues} issues, {raw / 1e6:.1f} MB of HTML, "
+        f"dictionaries trained on {samples} issues each"
+    )
+    print(
+        f"{'profile':>16}  {'stored MB':>9}  {'file MB':>8}  {'fetch ms':>8}  "
+        f"{'decode ms':>9}  {'us/body':>7}  {'break-even MB/s':>15}"
+    )
+    baseline = None  # The file size and decode time of uncompressed bodies
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in PROFILES:
+            path = Path(directory) / f"{profile}.db"
+            _store(path, profile, corpus, samples)
+            _read(path)
+            fetch, decode, stored = _read(path)
+            size = os.path.getsize(path)
+            if baseline is None:
+                baseline = size, decode
+            saved, extra_decode = baseline[0] - size, decode - baseline[1]
+            break_even = saved / extra_decode / 1e6 if extra_decode > 0 else 0
+            print(
+                f"{profile:>16}  {stored / 1e6:>9.2f}  {size / 1e6:>8.2f}  "
+                f"{fetch * 1000:>8.1f}  {decode * 1000:>9.1f}  "
+                f"{decode / (newsletters * issues) * 1e6:>7.1f}  "
+                f"{'-' if profile == 'identity' else f'{break_even:.0f}':>15}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark compression of stored entry bodies."
+    )
+    parser.add_argument("--newsletters", type=int, default=5)
+    parser.add_argument("--issues", type=int, default=400)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    run(args.newsletters, args.issues, args.samples, args.seed)
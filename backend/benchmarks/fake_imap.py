@@ -0,0 +1,194 @@
+import re
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+"""A minimal in-process IMAP4rev1 server for benchmarks.
+
+It implements just enough of the protocol for imaplib and the email processor:
+LOGIN, SELECT, UID SEARCH, UID FETCH, UID STORE/COPY/MOVE/EXPUNGE, NOOP and
+LOGOUT. Every command is delayed by a fixed latency to emulate the round trip
+to a remote server.
+"""
+
+_HEADER_FIELDS_RE = re.compile(r"HEADER\.FIELDS \(([^)]*)\)", re.IGNORECASE)
+
+
+def make_message(uid: int, sender: str, body_size: int) -> bytes:
+    """Build a newsletter-like email with an HTML body of roughly body_size bytes."""
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["Subject"] = f"Issue #{uid}"
+    msg["Message-ID"] = f"<bench-{uid}@example.com>"
+    msg["Date"] = "Mon, 20 Oct 2025 12:00:00 +0000"
+    paragraph = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>"
+    msg.set_content(
+        "<html><body>"
+        + paragraph * (body_size // len(paragraph) + 1)
+        + "</body></html>",
+        subtype="html",
+    )
+    return msg.as_bytes()
+
+
+def _parse_uid_set(message_set: str, max_uid: int) -> set[int]:
+    uids = set()
+    for part in message_set.split(","):
+        start, _, end = part.partition(":")
+        start = max_uid if start == "*" else int(start)
+        end = start if not end else (max_uid if end == "*" else int(end))
+        uids.update(range(min(start, end), max(start, end) + 1))
+    return uids
+
+
+def _header_fields(raw: bytes, fields: list[str]) -> bytes:
+    head = raw.split(b"\n\n", 1)[0].replace(b"\r\n", b"\n")
+    wanted = {f.lower().encode() for f in fields}
+    lines = [
+        line
+        for line in head.split(b"\n")
+        if line.split(b":", 1)[0].strip().lower() in wanted
+    ]
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def _send(self, line: str | bytes):
+        if isinstance(line, str):
+            line = line.encode()
+        self.wfile.write(line + b"\r\n")
+
+    def handle(self):
+        server: FakeImapServer = self.server.fake  # type: ignore[attr-defined]
+        self._send(f"* OK [CAPABILITY {server.capabilities}] Fake IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            time.sleep(server.latency)
+            server.commands.append(f"{command} {args}".strip())
+            if command == "UID":
+                command, _, args = args.partition(" ")
+                self._uid_command(server, tag, command.upper(), args)
+            elif command == "CAPABILITY":
+                self._send(f"* CAPABILITY {server.capabilities}")
+                self._send(f"{tag} OK CAPABILITY completed")
+            elif command == "SELECT":
+                uids = sorted(server.messages)
+                self._send(f"* {len(uids)} EXISTS")
+                self._send(f"* OK [UIDVALIDITY {server.uidvalidity}] UIDs valid")
+                self._send(f"* OK [UIDNEXT {(uids[-1] if uids else 0) + 1}] next")
+                self._send(f"{tag} OK [READ-WRITE] SELECT completed")
+            elif command == "IDLE":
+                self._send("+ idling")
+                with server.lock:
+                    server.idle_handlers.add(self)
+                server.idle_started.set()
+                while True:
+                    done = self.rfile.readline()
+                    if not done or done.strip().upper() == b"DONE":
+                        break
+                with server.lock:
+                    server.idle_handlers.discard(self)
+                self._send(f"{tag} OK IDLE terminated")
+            elif command == "LOGOUT":
+                self._send("* BYE logging out")
+                self._send(f"{tag} OK LOGOUT completed")
+                return
+            else:
+                # LOGIN, NOOP, EXPUNGE, LIST and friends simply succeed.
+                self._send(f"{tag} OK {command} completed")
+
+    def _uid_command(self, server: "FakeImapServer", tag: str, command: str, args: str):
+        max_uid = max(server.messages, default=0)
+        if command == "SEARCH":
+            match = re.search(r"UID (\S+?)\)?$", args)
+            uids = sorted(server.messages)
+            if match:
+                wanted = _parse_uid_set(match.group(1), max_uid)
+                uids = [uid for uid in uids if uid in wanted]
+            self._send("* SEARCH " + " ".join(map(str, uids)))
+        elif command == "FETCH":
+            message_set, _, items = args.partition(" ")
+            header_match = _HEADER_FIELDS_RE.search(items)
+            uids = sorted(_parse_uid_set(message_set, max_uid) & set(server.messages))
+            seqs = {uid: seq for seq, uid in enumerate(sorted(server.messages), 1)}
+            for uid in uids:
+                raw = server.messages[uid]
+                if header_match:
+                    literal = _header_fields(raw, header_match.group(1).split())
+                    section = f"BODY[HEADER.FIELDS ({header_match.group(1)})]"
+                else:
+                    literal = raw
+                    section = "BODY[]"
+                self.wfile.write(
+                    f"* {seqs[uid]} FETCH (UID {uid} {section} {{{len(literal)}}}\r\n".encode()
+                    + literal
+                    + b")\r\n"
+                )
+        self._send(f"{tag} OK UID {command} completed")
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeImapServer:
+    """A fake IMAP server that serves a fixed set of messages on localhost."""
+
+    def __init__(
+        self,
+        messages: dict[int, bytes],
+        latency: float = 0.0,
+        capabilities: str = "IMAP4rev1 UIDPLUS MOVE IDLE",
+        uidvalidity: int = 1,
+    ):
+        """Create the server; call start() to begin accepting connections."""
+        self.messages = messages
+        self.latency = latency
+        self.capabilities = capabilities
+        self.uidvalidity = uidvalidity
+        self.commands: list[str] = []
+        self.idle_started = threading.Event()
+        self.idle_handlers: set[_Handler] = set()
+        self.lock = threading.Lock()
+        self._server = _ThreadingServer(("127.0.0.1", 0), _Handler)
+        self._server.fake = self  # type: ignore[attr-defined]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def deliver(self, uid: int, raw: bytes):
+        """Add a message and notify all clients that are currently in IDLE."""
+        with self.lock:
+            self.messages[uid] = raw
+            for handler in self.idle_handlers:
+                handler._send(f"* {len(self.messages)} EXISTS")
+
+    @property
+    def port(self) -> int:
+        """Return the port the server listens on."""
+        return self._server.server_address[1]
+
+    def start(self) -> "FakeImapServer":
+        """Start serving in a background thread."""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeImapServer":
+        """Start the server when used as a context manager."""
+        return self.start()
+
+    def __exit__(self, *exc):
+        """Stop the server when leaving the context."""
+        self.stop()
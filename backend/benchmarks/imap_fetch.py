@@ -0,0 +1,51 @@
+import argparse
+import imaplib
+import time
+
+from app.core.imap import fetch_in_chunks
+from app.services.email_processor import BODY_FETCH_ITEMS
+from benchmarks.fake_imap import FakeImapServer, make_message
+
+"""Benchmark batched UID FETCH against a local fake IMAP server.
+
+Run from the backend directory:
+
+    python -m benchmarks.imap_fetch --messages 1000 --latency 0.005
+"""
+
+
+def run(messages: int, latency: float, body_size: int, chunk_sizes: list[int]):
+    """Print messages per second for every chunk size."""
+    store = {
+        uid: make_message(uid, "news@example.com", body_size)
+        for uid in range(1, messages + 1)
+    }
+    uids = sorted(store)
+    print(f"{messages} messages of ~{body_size} bytes, {latency * 1000:.1f} ms latency")
+    print(f"{'chunk size':>10}  {'seconds':>8}  {'msgs/s':>9}")
+    with FakeImapServer(store, latency=latency) as server:
+        for chunk_size in chunk_sizes:
+            mail = imaplib.IMAP4("127.0.0.1", server.port)
+            mail.login("bench", "bench")
+            mail.select("INBOX")
+            started = time.perf_counter()
+            fetched = sum(
+                len(chunk)
+                for chunk in fetch_in_chunks(mail, uids, BODY_FETCH_ITEMS, chunk_size)
+            )
+            elapsed = time.perf_counter() - started
+            mail.logout()
+            assert fetched == messages
+            print(f"{chunk_size:>10}  {elapsed:>8.2f}  {messages / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched UID FETCH.")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--body-size", type=int, default=20_000)
+    parser.add_argument(
+        "--chunk-sizes", type=int, nargs="+", default=[1, 10, 50, 200, 500]
+    )
+    args = parser.parse_args()
+    run(args.messages, args.latency, args.body_size, args.chunk_sizes)
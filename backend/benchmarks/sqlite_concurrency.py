@@ -0,0 +1,147 @@
+import argparse
+import itertools
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, configure_sqlite, sqlite_pragmas
+from app.crud.entries import create_entries, create_entry
+from app.crud.newsletters import create_newsletter
+from app.schemas.entries import EntryCreate
+from app.schemas.newsletters import NewsletterCreate
+from app.services.feed_generator import generate_master_feed
+
+"""Benchmark concurrent feed reads and entry writes on SQLite.
+
+Readers render the master feed while writers add entries one commit at a time,
+like the scheduler does. Every profile runs on a fresh database file: "default"
+is SQLite's rollback journal as it was used before, "tuned" applies the PRAGMAs
+from the settings. Run from the backend directory:
+
+    python -m benchmarks.sqlite_concurrency --readers 4 --writers 2 --seconds 5
+"""
+
+PROFILES = {"default": {}, "tuned": sqlite_pragmas()}
+
+
+def _entry(number: int, body_size: int) -> EntryCreate:
+    paragraph = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>"
+    return EntryCreate(
+        subject=f"Issue #{number}",
+        body=paragraph * (body_size // len(paragraph) + 1),
+        message_id=f"<bench-{number}@example.com>",
+    )
+
+
+def _worker(session_factory, operation, stop: threading.Event, results: list):
+    """Repeat operation with a new session until stopped, counting the outcomes."""
+    done = locked = 0
+    while not stop.is_set():
+        with session_factory() as db:
+            try:
+                operation(db)
+                done += 1
+            except OperationalError:
+                # "database is locked" once the busy timeout has passed.
+                db.rollback()
+                locked += 1
+    results.append((done, locked))
+
+
+def run_profile(
+    pragmas: dict,
+    readers: int,
+    writers: int,
+    seconds: float,
+    entries: int,
+    body_size: int,
+):
+    """Return reads, writes and lock errors per second for a connection profile."""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{Path(directory) / 'bench.db'}",
+            connect_args={"check_same_thread": False},
+        )
+        configure_sqlite(engine, pragmas)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autoflush=False, bind=engine)
+
+        with session_factory() as db:
+            newsletter = create_newsletter(
+                db, NewsletterCreate(name="Bench", sender_emails=["bench@example.com"])
+            )
+            newsletter_id = newsletter.id
+            create_entries(
+                db, [(_entry(n, body_size), newsletter_id) for n in range(entries)]
+            )
+
+        numbers = itertools.count(entries)
+        stop = threading.Event()
+        reads: list = []
+        writes: list = []
+        threads = [
+            threading.Thread(
+                target=_worker,
+                args=(session_factory, generate_master_feed, stop, reads),
+            )
+            for _ in range(readers)
+        ] + [
+            threading.Thread(
+                target=_worker,
+                args=(
+                    session_factory,
+                    lambda db: create_entry(
+                        db, _entry(next(numbers), body_size), newsletter_id
+                    ),
+                    stop,
+                    writes,
+                ),
+            )
+            for _ in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    locked = sum(n for _, n in reads + writes)
+    return (
+        sum(n for n, _ in reads) / seconds,
+        sum(n for n, _ in writes) / seconds,
+        locked / seconds,
+    )
+
+
+def run(readers: int, writers: int, seconds: float, entries: int, body_size: int):
+    """Print the throughput of every connection profile."""
+    print(
+        f"{readers} readers, {writers} writers, {seconds:.0f} s, "
+        f"{entries} entries of ~{body_size} bytes"
+    )
+    print(f"{'profile':>8}  {'reads/s':>8}  {'writes/s':>8}  {'locked/s':>8}")
+    for name, pragmas in PROFILES.items():
+        reads, writes, locked = run_profile(
+            pragmas, readers, writers, seconds, entries, body_size
+        )
+        print(f"{name:>8}  {reads:>8.1f}  {writes:>8.1f}  {locked:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark concurrent SQLite reads and writes."
+    )
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--entries", type=int, default=500)
+    parser.add_argument("--body-size", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.readers, args.writers, args.seconds, args.entries, args.body_size)